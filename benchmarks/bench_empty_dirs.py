@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+空ディレクトリ掃除（後行順の1パス走査）のベンチマーク
+
+大量のディレクトリ（デフォルト 50,000）を持つツリーを生成し、同じ内容のコピー2つに対して
+  - 従来版: rglob で全ディレクトリを列挙 → 深さでソート → ディレクトリごとに iterdir し直す
+  - 1パス版: sweep_empty_directories（後行順の os.scandir 走査で、子の結果から空を判定）
+を実行し、削除数と残ったツリーが一致することを確認してから所要時間を比較する。
+ツリーは「空ディレクトリの連鎖」「.gitkeep / .DS_Store だけのディレクトリ」「ファイルを持つディレクトリ」を混ぜる。
+
+使用例:
+  python benchmarks/bench_empty_dirs.py
+  python benchmarks/bench_empty_dirs.py --dirs 10000 --roots 4
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_script():
+    """scripts/update_agent_master.py をモジュールとして読み込む"""
+    spec = importlib.util.spec_from_file_location("update_agent_master", ROOT / "scripts" / "update_agent_master.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_tree(base: Path, roots: int, dirs: int, seed: int = 0) -> list[Path]:
+    """roots 個の掃除対象ディレクトリ配下に、合計 dirs 個のディレクトリを生成する"""
+    rnd = random.Random(seed)
+    root_dirs = [base / f"root_{r}" for r in range(roots)]
+    for root in root_dirs:
+        root.mkdir(parents=True)
+    created = 0
+    while created < dirs:
+        # 深さ 1〜6 の枝を1本作り、末端と途中に何を置くかをランダムに決める
+        parent = rnd.choice(root_dirs) / f"branch_{created}"
+        depth = rnd.randint(1, 6)
+        for level in range(depth):
+            current = parent / f"d{level}" if level else parent
+            current.mkdir()
+            created += 1
+            kind = rnd.random()
+            if kind < 0.1:
+                (current / ".gitkeep").write_bytes(b"")
+            elif kind < 0.15:
+                (current / ".DS_Store").write_bytes(b"\0" * 16)
+            elif kind < 0.25:
+                (current / f"file_{level}.md").write_text("content\n", encoding="utf-8")
+            parent = current
+    return root_dirs
+
+
+def legacy_remove_empty_directories(target_dir: Path) -> int:
+    """従来版（全ディレクトリを列挙し、深い順にディレクトリごとに列挙し直す）"""
+    if not target_dir.exists() or not target_dir.is_dir():
+        return 0
+    ignorable_files = {".gitkeep", ".DS_Store"}
+    removed = 0
+    dirs = [p for p in target_dir.rglob("*") if p.is_dir()]
+    dirs.sort(key=lambda p: len(p.parts), reverse=True)
+    for d in dirs:
+        try:
+            entries = list(d.iterdir())
+        except Exception:
+            continue
+        if any(e.name not in ignorable_files or not e.is_file() for e in entries):
+            continue
+        for e in entries:
+            try:
+                e.unlink()
+            except Exception:
+                pass
+        try:
+            d.rmdir()
+            removed += 1
+        except Exception:
+            pass
+    return removed
+
+
+def snapshot(base: Path) -> list[str]:
+    """残ったツリー（ディレクトリとファイルの相対パス）"""
+    entries = []
+    for current, dirnames, filenames in os.walk(base):
+        rel = os.path.relpath(current, base)
+        entries.extend(os.path.join(rel, name) + "/" for name in dirnames)
+        entries.extend(os.path.join(rel, name) for name in filenames)
+    return sorted(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="空ディレクトリ掃除のベンチマーク")
+    parser.add_argument("--dirs", type=int, default=50000, help="生成するディレクトリ数")
+    parser.add_argument("--roots", type=int, default=10, help="掃除対象のルート数")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    uam = load_script()
+    work_dir = Path(tempfile.mkdtemp(prefix="agent-empty-dirs-bench-"))
+    try:
+        legacy_base, sweep_base = work_dir / "legacy", work_dir / "sweep"
+        started = time.perf_counter()
+        legacy_roots = generate_tree(legacy_base, args.roots, args.dirs, args.seed)
+        shutil.copytree(legacy_base, sweep_base)
+        sweep_roots = [sweep_base / root.name for root in legacy_roots]
+        print(f"🌲 生成: {args.dirs} ディレクトリ / ルート {args.roots} 個"
+              f"（{time.perf_counter() - started:.1f}s）")
+
+        started = time.perf_counter()
+        legacy_removed = sum(legacy_remove_empty_directories(root) for root in legacy_roots)
+        legacy_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        sweep_removed = uam.sweep_empty_directories(sweep_base, sweep_roots)
+        sweep_time = time.perf_counter() - started
+
+        same = legacy_removed == sweep_removed and snapshot(legacy_base) == snapshot(sweep_base)
+        speedup = legacy_time / sweep_time if sweep_time else float("inf")
+        status = "✅" if same else "❌"
+        print(f"{status} 従来版 {legacy_time * 1000:.1f} ms（削除 {legacy_removed}）/ "
+              f"1パス版 {sweep_time * 1000:.1f} ms（削除 {sweep_removed}）(×{speedup:.2f})")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
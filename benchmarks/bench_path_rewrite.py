@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+パス書き換え（1パス置換エンジン）のマイクロベンチマーク
+
+リポジトリ内の skills / rules / commands の Markdown を入力に、
+逐次 re.sub 版（_apply_rewrite_rules_sequential）と1パス版の結果が一致することを確認し、
+それぞれの処理時間を比較する。
+
+使用例:
+  python benchmarks/bench_path_rewrite.py
+  python benchmarks/bench_path_rewrite.py --repeat 50
+"""
+import sys
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CORPUS_DIRS = [".cursor", ".claude", ".codex", ".github", ".opencode", ".gemini", ".kiro"]
+
+
+def load_script():
+    """scripts/update_agent_master.py をモジュールとして読み込む"""
+    spec = importlib.util.spec_from_file_location("update_agent_master", ROOT / "scripts" / "update_agent_master.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_corpus() -> list[str]:
+    """ベンチマーク入力（リポジトリ内の .md / .mdc）を読み込む"""
+    texts = []
+    for name in CORPUS_DIRS:
+        base = ROOT / name
+        if not base.is_dir():
+            continue
+        for path in sorted(base.rglob("*")):
+            if path.is_file() and path.suffix in (".md", ".mdc"):
+                texts.append(path.read_text(encoding="utf-8", errors="replace"))
+    return texts
+
+
+def measure(fn, texts: list[str], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パス書き換えエンジンのベンチマーク")
+    parser.add_argument("--repeat", type=int, default=20, help="コーパス全体を処理する回数")
+    args = parser.parse_args()
+
+    uam = load_script()
+    texts = load_corpus()
+    if not texts:
+        print("❌ ベンチマーク入力が見つかりません")
+        return 1
+    total_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"📚 入力: {len(texts)} ファイル / {total_bytes / 1024:.0f} KiB × {args.repeat} 回")
+
+    cases = [
+        ("convert_mdc_paths_to_agent_paths", uam.convert_mdc_paths_to_agent_paths, uam._rewrite_mdc_to_agent,
+         lambda text: uam._apply_rewrite_rules_sequential(uam.MDC_TO_AGENT_RULES, text)),
+        ("convert_agent_paths_to_mdc_paths", uam.convert_agent_paths_to_mdc_paths, uam._rewrite_agent_to_mdc,
+         lambda text: uam._apply_rewrite_rules_sequential(uam.AGENT_TO_MDC_RULES, text)),
+    ]
+    for env in ("claude", "codex", "cursor"):
+        rules, rewrite = uam._skill_text_rules(env)
+        cases.append((
+            f"transform_skill_text[{env}]",
+            lambda text, env=env: uam.transform_skill_text(text, env),
+            rewrite,
+            lambda text, rules=rules: uam._apply_rewrite_rules_sequential(rules, text),
+        ))
+
+    failed = False
+    for label, fast, single_pass, sequential in cases:
+        mismatches = sum(fast(text) != sequential(text) for text in texts)
+        fallbacks = sum(single_pass(text) is None for text in texts)
+        seq_time = measure(sequential, texts, args.repeat)
+        fast_time = measure(fast, texts, args.repeat)
+        speedup = seq_time / fast_time if fast_time else float("inf")
+        status = "✅" if mismatches == 0 else "❌"
+        print(f"{status} {label}: 逐次 {seq_time * 1000:.1f} ms / 1パス {fast_time * 1000:.1f} ms "
+              f"(×{speedup:.2f}, フォールバック {fallbacks} 件, 不一致 {mismatches} 件)")
+        failed = failed or mismatches > 0
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+大きなテキストのパス参照変換（ストリーム変換）のベンチマーク
+
+パス参照（path_reference / .claude/skills/ 等）を含む大きな Markdown（デフォルト 32 MB、CRLF 混在）を生成し、
+  - 従来版: バイト列を読み込み → str にデコード → transform_skill_text → エンコードして書き込み
+  - ストリーム版: mmap して _stream_skill_bytes でチャンクごとに変換しながら書き込み（_write_stream）
+を環境ごとに実行し、出力が一致することを確認してから所要時間と Python のピークメモリ（tracemalloc）を比較する。
+mmap したページはファイルのページキャッシュなので tracemalloc には含まれない。
+
+使用例:
+  python benchmarks/bench_stream_transform.py
+  python benchmarks/bench_stream_transform.py --size-mb 256 --envs codex
+"""
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_script():
+    """scripts/update_agent_master.py をモジュールとして読み込む"""
+    spec = importlib.util.spec_from_file_location("update_agent_master", ROOT / "scripts" / "update_agent_master.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_text(path: Path, size: int, seed: int = 0) -> None:
+    """パス参照・日本語・CRLF を混ぜたテキストを size バイト程度まで書き出す"""
+    rnd = random.Random(seed)
+    lines = [
+        'path_reference: "CLAUDE.md"\r\n',
+        "- resource: .claude/skills/skill-{i}/assets/item_{i}.md\n",
+        "- 参照: `.cursor/skills/skill-{i}/SKILL.md` と .codex/skills/skill-{i}/questions/q.md\n",
+        "本文 {i}: テキストテキストテキスト　全角空白を含む行\n",
+        "plain line {i} without references\r\n",
+    ]
+    written = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        i = 0
+        while written < size:
+            block = "".join(rnd.choice(lines).format(i=i + n) for n in range(1000))
+            f.write(block)
+            written += len(block.encode("utf-8"))
+            i += 1000
+
+
+def run_legacy(uam, src: Path, dst: Path, env: str) -> None:
+    text = uam._decode_text(src.read_bytes())
+    dst.write_bytes(uam._encode_text(uam.transform_skill_text(text, env)))
+
+
+def run_stream(uam, src: Path, dst: Path, env: str) -> None:
+    view = uam._map_text_file(src)
+    try:
+        uam._write_stream(dst, uam._stream_skill_bytes(view, env))
+    finally:
+        view.close()
+
+
+def measure(fn) -> tuple[float, int]:
+    """
+    (所要時間, Python のピークメモリ) を返す。
+    tracemalloc は割り当てごとに遅くなるため、時間とメモリは別々の実行で測る
+    """
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大きなテキストのストリーム変換のベンチマーク")
+    parser.add_argument("--size-mb", type=int, default=32, help="生成するテキストのサイズ（MB）")
+    parser.add_argument("--envs", default="claude,cursor,codex", help="変換先の環境（カンマ区切り）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    uam = load_script()
+    work_dir = Path(tempfile.mkdtemp(prefix="agent-stream-bench-"))
+    ok = True
+    try:
+        src = work_dir / "large.md"
+        started = time.perf_counter()
+        generate_text(src, args.size_mb * 1024 * 1024, args.seed)
+        print(f"📄 生成: {src.stat().st_size / 1e6:.1f} MB（{time.perf_counter() - started:.1f}s）")
+
+        for env in [e for e in args.envs.split(",") if e]:
+            legacy_out, stream_out = work_dir / f"legacy-{env}.md", work_dir / f"stream-{env}.md"
+            legacy_time, legacy_peak = measure(lambda: run_legacy(uam, src, legacy_out, env))
+            stream_time, stream_peak = measure(lambda: run_stream(uam, src, stream_out, env))
+            same = uam._file_sha256(legacy_out) == uam._file_sha256(stream_out)
+            ok = ok and same
+            status = "✅" if same else "❌"
+            print(f"{status} {env:<6} 従来版 {legacy_time:.2f}s / ピーク {legacy_peak / 1e6:.1f} MB  "
+                  f"ストリーム版 {stream_time:.2f}s / ピーク {stream_peak / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
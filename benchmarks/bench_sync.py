@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+update_agent_master.py のエンドツーエンド・ベンチマーク
+
+合成プロジェクトルート（synthetic_repo.py）を規模別に生成し、起点（--source）ごとに
+  - cold   : 初回同期（出力なしの状態から）
+  - warm   : 変更なしでの再同期
+  - dry-run: --dry-run
+を実行して、所要時間・ピーク RSS・読み込み/書き込みファイル数・転送バイト数を計測する。
+結果は JSON に保存し、--compare で以前の結果（別リビジョン）と比較できる。
+
+使用例:
+  python benchmarks/bench_sync.py
+  python benchmarks/bench_sync.py --sizes 1000,10000 --sources claude --output /tmp/after.json
+  python benchmarks/bench_sync.py --compare /tmp/before.json
+"""
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+ROOT = Path(__file__).resolve().parent.parent
+SCRIPT = ROOT / "scripts" / "update_agent_master.py"
+PROBE = Path(__file__).resolve().parent / "sync_probe.py"
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synthetic_repo import generate_repo  # noqa: E402
+
+SCENARIOS = {
+    "cold": ["--force"],
+    "warm": ["--force"],
+    "dry-run": ["--dry-run"],
+}
+FILES_PER_SKILL = 10
+
+
+def run_probe(project_root: Path, args: list[str]) -> dict:
+    """計測ラッパー経由でスクリプトを1回実行し、計測値を返す"""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        result_path = Path(f.name)
+    try:
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(PROBE), str(result_path), str(SCRIPT), *args],
+            cwd=project_root,
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+        elapsed = time.perf_counter() - started
+        stats = json.loads(result_path.read_text(encoding="utf-8"))
+    finally:
+        result_path.unlink(missing_ok=True)
+    stats["seconds"] = round(elapsed, 4)
+    return stats
+
+
+def git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(current: list[dict], baseline_path: Path) -> None:
+    """以前の結果との比較を表示する（同じ size / source / scenario 同士）"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    previous = {(r["skill_files"], r["source"], r["scenario"]): r for r in baseline["results"]}
+    print(f"\n📊 比較: {baseline_path}（rev {baseline['meta'].get('revision')}）")
+    for r in current:
+        old = previous.get((r["skill_files"], r["source"], r["scenario"]))
+        if old is None:
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        print(
+            f"  {r['skill_files']:>6} {r['source']:<6} {r['scenario']:<7} "
+            f"{old['seconds']:.3f}s → {r['seconds']:.3f}s (×{ratio:.2f}) "
+            f"書き込み {old['files_written']} → {r['files_written']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="update_agent_master.py のエンドツーエンド・ベンチマーク")
+    parser.add_argument("--sizes", default="500,2000,10000",
+                        help="スキル配下の総ファイル数（カンマ区切り、デフォルト: 500,2000,10000）")
+    parser.add_argument("--sources", default="claude,cursor,codex", help="計測する起点（カンマ区切り）")
+    parser.add_argument("--rules", type=int, default=40, help=".cursor/rules/*.mdc の数")
+    parser.add_argument("--commands", type=int, default=40, help="コマンド数")
+    parser.add_argument("--scripts", type=int, default=10, help="scripts/ のスクリプト数")
+    parser.add_argument("--plain-ratio", type=float, default=0.0,
+                        help="スキル配下の Markdown のうち、パス参照を含まないものの割合（0〜1）")
+    parser.add_argument("--output", type=Path, default=None,
+                        help="結果 JSON の保存先（デフォルト: benchmarks/results/sync-<rev>.json）")
+    parser.add_argument("--compare", type=Path, default=None, help="比較対象の結果 JSON")
+    parser.add_argument("--keep", action="store_true", help="生成したプロジェクトルートを削除しない")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    sources = [s for s in args.sources.split(",") if s]
+    revision = git_revision()
+    output = args.output or ROOT / "benchmarks" / "results" / f"sync-{revision or 'unknown'}.json"
+
+    results = []
+    work_dir = Path(tempfile.mkdtemp(prefix="agent-sync-bench-"))
+    try:
+        for size in sizes:
+            for source in sources:
+                project_root = work_dir / f"{source}-{size}"
+                counts = generate_repo(
+                    project_root, source, rules=args.rules, skills=max(size // FILES_PER_SKILL, 1),
+                    files_per_skill=FILES_PER_SKILL, commands=args.commands, scripts=args.scripts,
+                    plain_ratio=args.plain_ratio,
+                )
+                for scenario, extra in SCENARIOS.items():
+                    stats = run_probe(project_root, ["--source", source, *extra])
+                    result = {"skill_files": counts["skill_files"], "source": source, "scenario": scenario, **stats}
+                    results.append(result)
+                    status = "✅" if stats["returncode"] == 0 else "❌"
+                    print(
+                        f"{status} {counts['skill_files']:>6} files {source:<6} {scenario:<7} "
+                        f"{stats['seconds']:.3f}s  RSS {stats['peak_rss_kb']} KiB  "
+                        f"読み込み {stats['files_read']} / 書き込み {stats['files_written']} ファイル  "
+                        f"{(stats['bytes_read'] or 0) / 1e6:.1f} MB / {(stats['bytes_written'] or 0) / 1e6:.1f} MB"
+                    )
+                    if stats["returncode"]:
+                        print(stats.get("output_tail", ""))
+                if not args.keep:
+                    shutil.rmtree(project_root, ignore_errors=True)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "revision": revision,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rules": args.rules,
+            "commands": args.commands,
+            "scripts": args.scripts,
+            "plain_ratio": args.plain_ratio,
+        },
+        "results": results,
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n💾 結果を保存しました: {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    return 1 if any(r["returncode"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
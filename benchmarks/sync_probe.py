@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+update_agent_master.py を計測付きで実行するラッパー（bench_sync.py から子プロセスとして起動する）
+
+open() をフックしてファイルの読み込み/書き込みオープン数を数え、終了時に
+/proc/self/io のバイト数（Linux のみ）とピーク RSS を JSON に書き出す。
+スクリプトの標準出力はメモリに捨てる（表示の書き込みをバイト数に含めないため）。
+失敗時は出力の末尾を結果に残す。
+
+使用例:
+  python benchmarks/sync_probe.py result.json scripts/update_agent_master.py --source claude --force
+"""
+import io
+import sys
+import json
+import runpy
+import builtins
+
+
+def _read_proc_io() -> dict:
+    """/proc/self/io の値（読めない環境では空）"""
+    try:
+        with _original_open("/proc/self/io", encoding="ascii") as f:
+            return {key: int(value) for key, value in (line.split(": ") for line in f.read().splitlines())}
+    except OSError:
+        return {}
+
+
+def _peak_rss_kb() -> int | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS はバイト、Linux は KiB
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+_original_open = builtins.open
+counts = {"files_read": 0, "files_written": 0}
+
+
+def _counting_open(file, mode="r", *args, **kwargs):
+    if isinstance(file, int):
+        return _original_open(file, mode, *args, **kwargs)
+    if any(flag in mode for flag in "wax+"):
+        counts["files_written"] += 1
+    else:
+        counts["files_read"] += 1
+    return _original_open(file, mode, *args, **kwargs)
+
+
+def main():
+    result_path, script, *script_args = sys.argv[1:]
+    builtins.open = _counting_open
+    io.open = _counting_open
+    before = _read_proc_io()
+    sys.argv = [script, *script_args]
+    captured = io.StringIO()
+    real_stdout, sys.stdout = sys.stdout, captured
+    returncode = 0
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        returncode = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException as e:
+        print(f"💥 {type(e).__name__}: {e}", file=captured)
+        returncode = 1
+    finally:
+        sys.stdout = real_stdout
+        builtins.open = _original_open
+        io.open = _original_open
+        after = _read_proc_io()
+        stats = dict(counts)
+        stats["bytes_read"] = after["rchar"] - before["rchar"] if after and before else None
+        stats["bytes_written"] = after["wchar"] - before["wchar"] if after and before else None
+        stats["peak_rss_kb"] = _peak_rss_kb()
+        stats["returncode"] = returncode
+        if returncode:
+            stats["output_tail"] = captured.getvalue()[-2000:]
+        with _original_open(result_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク用の合成プロジェクトルートを生成する
+
+起点環境（claude / cursor / codex）の skills・commands と、.cursor/rules/*.mdc、
+マスターファイル、scripts/・commons_scripts/ を指定した件数で作成する。
+各スキルは SKILL.md と questions/ assets/ evaluation/ triggers/ scripts/ を持つ。
+
+使用例:
+  python benchmarks/synthetic_repo.py /tmp/bench-root --source claude --skill-files 10000
+  python benchmarks/synthetic_repo.py /tmp/bench-root --rules 40 --skills 200 --files-per-skill 10
+"""
+import sys
+import random
+import argparse
+from pathlib import Path
+
+SKILL_SUBDIRS = ["questions", "assets", "evaluation", "triggers"]
+
+# 起点環境ごとの skills / commands ディレクトリ
+ORIGIN_DIRS = {
+    "claude": (".claude/skills", ".claude/commands"),
+    "cursor": (".cursor/skills", ".cursor/commands"),
+    "codex": (".codex/skills", ".codex/prompts"),
+}
+
+MASTER_FILES = {
+    "claude": "CLAUDE.md",
+    "cursor": ".cursor/rules/master_rules.mdc",
+    "codex": "AGENTS.md",
+}
+
+
+def _rule_text(index: int, scripts: int, rnd: random.Random) -> str:
+    """YAML形式セクションを持つ .mdc ルール本文"""
+    script = f"scripts/tool_{index % max(scripts, 1)}.py"
+    steps = "".join(
+        f'  - name: step {s}\n    action: "call {index:02d}_helper_{s}.mdc => run"\n'
+        f'    rule: ".cursor/rules/{index:02d}_rule_{s}.mdc"\n    prompt: {rnd.choice(["確認", "集計", "生成"])} step {s}\n'
+        for s in range(rnd.randint(3, 8))
+    )
+    return (
+        f'---\ndescription: "Synthetic rule {index}"\nglobs:\nalwaysApply: false\n---\n'
+        'path_reference: "00_master_rules.mdc"\n\n'
+        f'# ======== 基本 ========\nworkflow_{index}:\n{steps}'
+        f'  - step: run\n    action: execute_shell\n    command: "python {script}"\n\n'
+        f'# ======== 質問 ========\nintake_questions_{index}:\n'
+        + "".join(f'  - key: q{q}\n    prompt: 質問 {q} の内容を入力してください\n' for q in range(5))
+        + f'\n# ======== テンプレート ========\nreport_template_{index}: |\n'
+        + "".join(f'  ## Section {t}\n  See .cursor/commands/cmd_{t}.md and commons_scripts/common_{t % 3}.py\n' for t in range(6))
+        + f'\nsuccess_metrics_{index}:\n  - 完了率\n  - 所要時間\n'
+    )
+
+
+def _skill_file_text(skill: str, name: str, lines: int, rnd: random.Random, plain: bool = False) -> str:
+    """path_reference・skills パス参照を含むスキル配下の Markdown（plain なら参照を含まない本文だけ）"""
+    if plain:
+        return f"# {skill} / {name}\n" + "".join(
+            f"本文 {i}: " + "テキスト" * rnd.randint(2, 12) + "\n" for i in range(lines)
+        )
+    body = [f"# {skill} / {name}\n", 'path_reference: "CLAUDE.md"\n']
+    for i in range(lines):
+        kind = rnd.random()
+        if kind < 0.15:
+            body.append(f"- resource: .claude/skills/{skill}/assets/item_{i}.md\n")
+        elif kind < 0.2:
+            body.append(f"- command: .cursor/commands/cmd_{i}.md\n")
+        else:
+            body.append(f"本文 {i}: " + "テキスト" * rnd.randint(2, 12) + "\n")
+    return "".join(body)
+
+
+def generate_repo(
+    root: Path,
+    source: str = "claude",
+    rules: int = 20,
+    skills: int = 50,
+    files_per_skill: int = 10,
+    commands: int = 20,
+    scripts: int = 10,
+    lines_per_file: int = 40,
+    plain_ratio: float = 0.0,
+    seed: int = 0,
+) -> dict:
+    """
+    合成プロジェクトルートを生成し、生成件数を返す。
+
+    Args:
+        root: 生成先（既存ファイルは上書き）
+        source: 起点環境（skills/commands を置く環境）
+        rules: .cursor/rules/*.mdc の数（master_rules.mdc / 00_paths.mdc は別）
+        skills: スキル数
+        files_per_skill: スキルあたりのファイル数（SKILL.md と scripts/ を含む）
+        commands: コマンド数
+        scripts: scripts/ のスクリプト数（commons_scripts/ は固定で3件）
+        lines_per_file: Markdown 1ファイルあたりの行数
+        plain_ratio: SKILL.md 以外の Markdown のうち、パス参照を含まないもの（evaluation/ 等）の割合
+        seed: 乱数シード（同じ値なら同じ内容を生成する）
+    """
+    rnd = random.Random(seed)
+    skills_rel, commands_rel = ORIGIN_DIRS[source]
+
+    scripts_dir = root / "scripts"
+    commons_dir = root / "commons_scripts"
+    rules_dir = root / ".cursor" / "rules"
+    for d in (scripts_dir, commons_dir, rules_dir):
+        d.mkdir(parents=True, exist_ok=True)
+    for i in range(scripts):
+        (scripts_dir / f"tool_{i}.py").write_text(f"print('tool {i}')\n" * 20, encoding="utf-8")
+    for i in range(3):
+        (commons_dir / f"common_{i}.py").write_text(f"print('common {i}')\n" * 20, encoding="utf-8")
+
+    master_body = (
+        '---\ndescription: master\nalwaysApply: true\n---\npath_reference: "CLAUDE.md"\n# Master\n'
+        + "".join(f"- .claude/skills/skill-{i}/SKILL.md\n" for i in range(min(skills, 50)))
+    )
+    for name in ("CLAUDE.md", "AGENTS.md"):
+        (root / name).write_text(master_body, encoding="utf-8")
+    (rules_dir / "master_rules.mdc").write_text(master_body, encoding="utf-8")
+    (rules_dir / "00_paths.mdc").write_text(
+        '---\ndescription: paths\n---\npath_reference: "pmbok_paths.mdc"\nroot: .\n', encoding="utf-8"
+    )
+    for i in range(rules):
+        (rules_dir / f"{i + 1:02d}_rule_{i}.mdc").write_text(_rule_text(i, scripts, rnd), encoding="utf-8")
+
+    skills_dir = root / skills_rel
+    skill_files = 0
+    for s in range(skills):
+        skill = f"skill-{s}"
+        skill_dir = skills_dir / skill
+        for sub in SKILL_SUBDIRS + ["scripts"]:
+            (skill_dir / sub).mkdir(parents=True, exist_ok=True)
+        (skill_dir / "SKILL.md").write_text(
+            f'---\nname: {skill}\ndescription: "synthetic {s}"\n---\n'
+            + _skill_file_text(skill, "SKILL", lines_per_file, rnd),
+            encoding="utf-8",
+        )
+        (skill_dir / "scripts" / f"tool_{s % max(scripts, 1)}.py").write_text("old\n", encoding="utf-8")
+        skill_files += 2
+        for f in range(max(files_per_skill - 2, 0)):
+            sub = SKILL_SUBDIRS[f % len(SKILL_SUBDIRS)]
+            if f % 17 == 16:
+                # 一部はバイナリ（テキスト変換しないファイル）
+                (skill_dir / sub / f"blob_{f}.bin").write_bytes(rnd.randbytes(2048))
+            else:
+                plain = plain_ratio > 0 and rnd.random() < plain_ratio
+                (skill_dir / sub / f"item_{f}.md").write_text(
+                    _skill_file_text(skill, f"item_{f}", lines_per_file, rnd, plain), encoding="utf-8"
+                )
+            skill_files += 1
+
+    commands_dir = root / commands_rel
+    commands_dir.mkdir(parents=True, exist_ok=True)
+    for c in range(commands):
+        (commands_dir / f"cmd_{c}.md").write_text(
+            f"# ・最終更新: 2024-01-01\n" + _skill_file_text(f"cmd-{c}", "command", lines_per_file // 2, rnd),
+            encoding="utf-8",
+        )
+
+    agents_dir = root / ".claude" / "agents"
+    agents_dir.mkdir(parents=True, exist_ok=True)
+    (agents_dir / "reviewer.md").write_text(
+        '---\nname: reviewer\ndescription: review agent\n---\npath_reference: "CLAUDE.md"\n', encoding="utf-8"
+    )
+
+    return {
+        "source": source,
+        "rules": rules,
+        "skills": skills,
+        "skill_files": skill_files,
+        "commands": commands,
+        "scripts": scripts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成プロジェクトルートを生成")
+    parser.add_argument("root", type=Path, help="生成先ディレクトリ")
+    parser.add_argument("--source", choices=list(ORIGIN_DIRS), default="claude")
+    parser.add_argument("--rules", type=int, default=20)
+    parser.add_argument("--skills", type=int, default=50)
+    parser.add_argument("--files-per-skill", type=int, default=10)
+    parser.add_argument("--skill-files", type=int, default=None,
+                        help="スキル配下の総ファイル数（指定時は --skills を files-per-skill から逆算）")
+    parser.add_argument("--commands", type=int, default=20)
+    parser.add_argument("--scripts", type=int, default=10)
+    parser.add_argument("--plain-ratio", type=float, default=0.0,
+                        help="SKILL.md 以外の Markdown のうち、パス参照を含まないものの割合（0〜1）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    skills = args.skills
+    if args.skill_files is not None:
+        skills = max(args.skill_files // args.files_per_skill, 1)
+    counts = generate_repo(
+        args.root, args.source, rules=args.rules, skills=skills, files_per_skill=args.files_per_skill,
+        commands=args.commands, scripts=args.scripts, plain_ratio=args.plain_ratio, seed=args.seed,
+    )
+    print(f"✅ 生成完了: {args.root} {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,16 +13,189 @@
   python scripts/update_agent_master.py --source codex --force
   python scripts/update_agent_master.py --source cursor --force
   python scripts/update_agent_master.py --source cursor --dry-run
+  python scripts/update_agent_master.py --source claude --force --full-refresh
+  python scripts/update_agent_master.py --source claude --force --refresh-mode replace
+  python scripts/update_agent_master.py --source claude --force --refresh-mode staged
+  python scripts/update_agent_master.py --source claude --force --jobs 8
+  python scripts/update_agent_master.py --source claude --force --link-mode reflink
+  python scripts/update_agent_master.py --source claude --force --watch
+  python scripts/update_agent_master.py --source claude --check
+  python scripts/update_agent_master.py --source claude --force --since HEAD~1
+  python scripts/update_agent_master.py --source claude --force --changed-only
+  python scripts/update_agent_master.py --source claude --force --profile
+  python scripts/update_agent_master.py --source claude --plan
+  python scripts/update_agent_master.py --source claude --force --apply .sync-plan.json
+  python scripts/update_agent_master.py --source claude --force --batch ~/agents/* --batch-report batch.json
+
+差分同期:
+  skills/commands の同期結果はプロジェクトルートの .sync-manifest.json に記録され、
+  次回以降はソースのハッシュが変わったファイルのみ再生成する（--full-refresh で無効化）。
+
+変更監視（--watch）:
+  同期後も起点の skills/commands・マスター・scripts/ を stat スナップショットで監視し、
+  変更のあったファイルの派生先だけを同期し続ける（連続保存はまとめて反映）。
+
+git の変更だけを同期（--since / --changed-only）:
+  ローカルの git（git diff --name-only <REF> と git status --porcelain）で変更のあったパスを集め、
+  --watch と同じ対応付けで派生先だけを同期する。同期先の出力が直接編集されている・前回の同期結果が無い・
+  変換スクリプト自体が変わったなど、差分では反映しきれない場合は全件同期に切り替える。
+
+プロファイル（--profile）:
+  フェーズ・同期先ごとの所要時間（wall / CPU）と stat・scandir・mkdir・open・unlink の回数、
+  読み書きバイト数（Linux の /proc/self/io）を計測し、要約を表示して .sync-profile.json に保存する。
+
+同期計画（--plan / --apply / --dry-run）:
+  実際の実行と同じ処理で、出力ごとの操作（create / update / link / delete / unchanged）を書き込みなしで計算する。
+  --dry-run は計画を表示するだけ、--plan は .sync-plan.json に保存し、--apply で後から実行する
+  （計画後に変更された出力は上書きしない）。
+  --check は同じ計画を使い、期待する出力とディスク上の出力の内容をハッシュで比べて、
+  ずれている出力があれば一覧を表示して終了コード 1 を返す（pre-commit / CI 用）。
+  全件の同期が成功すると各ファイルの stat の指紋を .sync-cache/check-stamp.json に記録し、
+  --check はそれ以降に何も変わっていなければ計画を作らずに終える（--check 自体は書き込まない）。
+
+複数リポジトリ（--batch）:
+  指定したプロジェクトルート（または glob）を、1回の起動からプロセスプールで並列に同期し、
+  リポジトリごとの成否・所要時間・書き込み数をまとめて表示する（--fail-fast で最初の失敗時に中断）。
 """
 
 import os
 import re
+import json
+import time
+import hashlib
+import functools
+import threading
+import contextlib
 import platform
 import argparse
 from pathlib import Path
 from datetime import datetime
 from typing import Tuple, Dict
 
+# path_reference の値（互換: master_rules.mdc / 00_master_rules.mdc / pmbok_paths.mdc / 既に環境名になっているケース）
+PATH_REFERENCE_PATTERN = re.compile(
+    r'path_reference:\s*"(?:(?:00_)?master_rules\.mdc|pmbok_paths\.mdc|CLAUDE\.md|AGENTS\.md|GEMINI\.md|KIRO\.md|copilot-instructions\.md)"'
+)
+
+
+# 1パス置換の安全性検査で参照する「同一トークン」（空白・引用符で区切られた連続文字列）
+_REWRITE_TOKEN_TAIL = re.compile(r'[^\s"]*')
+_REWRITE_TOKEN_LOOKBEHIND = 256
+
+
+class _RewriteHazard(Exception):
+    """1パス置換では逐次置換と同じ結果を保証できない箇所を検出した"""
+
+
+def _compile_rewrite_rules(rules: list):
+    """
+    逐次 re.sub のルール表をまとめ、本文を1回だけ走査して置換する関数を返す。
+
+    Args:
+        rules: [(pattern, repl, needles), ...] 逐次適用する順（優先度順）
+            repl: 置換後の固定文字列、または match を受け取る関数
+            needles: マッチ先頭に必ず現れる固定文字列（候補が複数ならタプル）
+
+    Returns:
+        rewrite(content) -> str | None
+        マッチを含むトークン（空白・引用符区切り）に先行ルールの needle がある、あるいは
+        置換結果と前後のトークンに後続ルールの needle が現れる場合は、逐次置換と結果が
+        変わり得るため None を返す。
+        呼び出し側は None のとき逐次版（_apply_rewrite_rules_sequential）にフォールバックする。
+    """
+    patterns = [re.compile(pattern) for pattern, _, _ in rules]
+    needles = [(needle,) if isinstance(needle, str) else tuple(needle) for _, _, needle in rules]
+    max_needle = max(len(needle) for group in needles for needle in group)
+
+    def needle_pattern(groups: list):
+        flat = sorted({needle for group in groups for needle in group}, key=len, reverse=True)
+        return re.compile("|".join(re.escape(needle) for needle in flat)) if flat else None
+
+    # 候補位置の走査は needle の固定文字列検索（str.find）だけで行い、ルールのパターンは候補位置でのみ照合する。
+    # 先頭が捕捉グループの分岐を含む交替正規表現は re の前方スキャン最適化が効かず、逐次 re.sub より遅くなるため。
+    needle_rules = {}
+    for index, group in enumerate(needles):
+        for needle in group:
+            needle_rules.setdefault(needle, []).append(index)
+    earlier = [needle_pattern(needles[:i]) for i in range(len(rules))]
+    later = [needle_pattern(needles[i + 1:]) for i in range(len(rules))]
+
+    def rewrite(content: str) -> str | None:
+        def replace_at(index: int, match) -> str:
+            start, end = match.span()
+            # 貪欲なパターンは空白・引用符までの同一トークン内で伸び縮みし得るため、トークン全体を検査範囲にする
+            reach = _REWRITE_TOKEN_TAIL.match(content, end).end()
+            hazard = earlier[index]
+            if hazard is not None:
+                found = hazard.search(content, start + 1, reach + max_needle)
+                if found is not None and found.start() <= reach:
+                    raise _RewriteHazard
+            repl = rules[index][1]
+            replacement = repl if isinstance(repl, str) else repl(match)
+            hazard = later[index]
+            if hazard is not None:
+                head = start
+                limit = max(0, start - _REWRITE_TOKEN_LOOKBEHIND)
+                while head > limit and not content[head - 1].isspace() and content[head - 1] != '"':
+                    head -= 1
+                if head == limit and limit > 0:
+                    raise _RewriteHazard
+                prefix = content[head:start]
+                found = hazard.search(prefix + replacement + content[end:end + max_needle])
+                if found is not None and found.start() < len(prefix) + len(replacement):
+                    raise _RewriteHazard
+            return replacement
+
+        parts = []
+        copied = 0
+        upcoming = {needle: content.find(needle) for needle in needle_rules}
+        upcoming = {needle: at for needle, at in upcoming.items() if at >= 0}
+        try:
+            while upcoming:
+                position = min(upcoming.values())
+                candidates = sorted({index for needle, at in upcoming.items() if at == position for index in needle_rules[needle]})
+                for index in candidates:
+                    match = patterns[index].match(content, position)
+                    if match is not None:
+                        parts.append(content[copied:position])
+                        parts.append(replace_at(index, match))
+                        copied = match.end()
+                        break
+                # re.sub と同じく、次の走査はマッチ末尾（マッチしなければ次の文字）から
+                resume = copied if copied > position else position + 1
+                for needle, at in list(upcoming.items()):
+                    if at < resume:
+                        at = content.find(needle, resume)
+                        if at < 0:
+                            del upcoming[needle]
+                        else:
+                            upcoming[needle] = at
+        except _RewriteHazard:
+            return None
+        if not parts:
+            return content
+        parts.append(content[copied:])
+        return "".join(parts)
+
+    return rewrite
+
+
+def _rewrite_needles(rules: list) -> tuple:
+    """
+    ルール表の needle をまとめた UTF-8 のバイト列（prefilter 用）。
+    どの needle も含まない本文にはどのルールも一致しないため、読み込んだバイト列のままデコード・置換を省略できる
+    """
+    needles = {n for _, _, needle in rules for n in ((needle,) if isinstance(needle, str) else needle)}
+    return tuple(sorted(n.encode("utf-8") for n in needles))
+
+
+def _apply_rewrite_rules_sequential(rules: list, content: str) -> str:
+    """ルール表を1本ずつ re.sub で適用する（1パス置換の参照実装・フォールバック）"""
+    for pattern, repl, _ in rules:
+        content = re.sub(pattern, repl, content)
+    return content
+
+
 def replace_path_reference(content: str, target: str) -> str:
     """
     path_reference の値だけを指定値に統一する（内容の正規化・削除はしない）。
@@ -31,12 +204,7 @@ def replace_path_reference(content: str, target: str) -> str:
         content: 対象テキスト
         target: 置換後（例: "CLAUDE.md", "AGENTS.md", "master_rules.mdc"）
     """
-    # 互換: master_rules.mdc / 00_master_rules.mdc / pmbok_paths.mdc / 既に環境名になっているケースもまとめて置換
-    return re.sub(
-        r'path_reference:\s*"(?:(?:00_)?master_rules\.mdc|pmbok_paths\.mdc|CLAUDE\.md|AGENTS\.md|GEMINI\.md|KIRO\.md|copilot-instructions\.md)"',
-        f'path_reference: "{target}"',
-        content,
-    )
+    return PATH_REFERENCE_PATTERN.sub(f'path_reference: "{target}"', content)
 
 
 def ensure_cursor_frontmatter(content: str) -> str:
@@ -80,15 +248,121 @@ def ensure_cursor_frontmatter(content: str) -> str:
 def _target_master_for_env(env: str) -> str:
     return "CLAUDE.md" if env == "claude" else "AGENTS.md"
 
+@functools.lru_cache(maxsize=None)
+def _skill_text_rules(target_env: str) -> tuple:
+    """transform_skill_text のルール表と1パス置換関数（環境ごとに1度だけ構築）"""
+    rules = [
+        (PATH_REFERENCE_PATTERN.pattern, f'path_reference: "{_target_master_for_env(target_env)}"', "path_reference:"),
+        (r'\.(?:cursor|claude|codex)/skills/', f'.{target_env}/skills/',
+         (".cursor/skills/", ".claude/skills/", ".codex/skills/")),
+    ]
+    return rules, _compile_rewrite_rules(rules)
+
+
+@functools.lru_cache(maxsize=None)
+def _skill_text_needles(target_env: str) -> tuple:
+    return _rewrite_needles(_skill_text_rules(target_env)[0])
+
+
+def skill_text_may_change(data: bytes, target_env: str) -> bool:
+    """
+    prefilter: transform_skill_text のルールの needle を data（UTF-8 のバイト列）が1つでも含めば True。
+    False なら変換しても内容は変わらない（改行の正規化を除く）ため、デコード・置換を省略してよい
+    """
+    return any(needle in data for needle in _skill_text_needles(target_env))
+
+
 def transform_skill_text(content: str, target_env: str) -> str:
     """
     skills配下のMarkdownを、指定環境の参照に揃える。
     - path_reference を環境別に差し替え
     - skill_resources 等の .{env}/skills/... を環境別に差し替え
     """
-    content = replace_path_reference(content, _target_master_for_env(target_env))
-    content = re.sub(r'\.(?:cursor|claude|codex)/skills/', f'.{target_env}/skills/', content)
-    return content
+    rules, rewrite = _skill_text_rules(target_env)
+    converted = rewrite(content)
+    if converted is None:
+        converted = _apply_rewrite_rules_sequential(rules, content)
+    return converted
+
+
+@functools.lru_cache(maxsize=None)
+def _skill_bytes_rules(target_env: str) -> tuple:
+    """
+    transform_skill_text のルール表を、UTF-8 のバイト列に対して1回で照合する交替パターンにしたもの
+    （ルールごとに1つの捕捉グループ）と、ルールごとの置換後のバイト列。
+
+    \\s は str の正規表現と同じく Unicode の空白（U+0085 / U+3000 等。最大が U+3000）の UTF-8 表現にも一致させる。
+    2つのルールは一致範囲が重ならず、置換結果が他方のルールの needle を含まないため、
+    優先度順の交替で照合しても逐次置換（transform_skill_text）と同じ結果になる。
+    """
+    rules, _ = _skill_text_rules(target_env)
+    spaces = sorted(chr(c).encode("utf-8") for c in range(0x3001) if re.match(r"\s", chr(c)))
+    space = b"(?:" + b"|".join(re.escape(s) for s in spaces) + b")"
+    alternatives = [b"(" + pattern.encode("ascii").replace(rb"\s", space) + b")" for pattern, _, _ in rules]
+    return re.compile(b"|".join(alternatives)), [repl.encode("utf-8") for _, repl, _ in rules]
+
+
+def _stream_skill_bytes(view, target_env: str):
+    """
+    transform_skill_text のストリーム版。
+    view（UTF-8 として正しいバイト列。mmap 等）を str にデコードせずに照合・置換し、
+    _encode_text(transform_skill_text(_decode_text(view), target_env)) と同じバイト列を
+    COPY_CHUNK_SIZE 程度のチャンクに分けて順に返す（ファイルサイズによらず保持するのは数チャンク分だけ）。
+
+    照合は view 全体に対して行うため、チャンクの境界をまたぐ参照もそのまま置換される。
+    改行の正規化（CRLF / CR → LF）と os.linesep への変換はチャンクごとに行い、境界で分かれた CRLF も1つの改行にする。
+    置換の間の区間と置換後のバイト列はチャンクの大きさにまとめてから返す（置換が密でも細かい書き込みにならない）。
+    """
+    pattern, replacements = _skill_bytes_rules(target_env)
+    linesep = os.linesep.encode("ascii")
+    pending_cr = False
+
+    def pieces():
+        """変換しない区間 (start, end) と、置換後のバイト列を順に返す"""
+        copied = 0
+        for match in pattern.finditer(view):
+            if copied < match.start():
+                yield copied, match.start()
+            yield replacements[match.lastindex - 1]
+            copied = match.end()
+        if copied < len(view):
+            yield copied, len(view)
+
+    def finish(chunk: bytes) -> bytes:
+        nonlocal pending_cr
+        if pending_cr and chunk[:1] == b"\n":
+            chunk = chunk[1:]
+        pending_cr = chunk.endswith(b"\r")
+        if b"\r" in chunk:
+            chunk = chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        if linesep != b"\n":
+            chunk = chunk.replace(b"\n", linesep)
+        return chunk
+
+    buffer = bytearray()
+    for piece in pieces():
+        if isinstance(piece, bytes):
+            buffer += piece
+        else:
+            start, end = piece
+            if buffer:
+                # バッファの残りを区間の先頭で埋め、チャンクの大きさにそろえる
+                filled = min(end, start + max(COPY_CHUNK_SIZE - len(buffer), 0))
+                buffer += view[start:filled]
+                start = filled
+            if len(buffer) >= COPY_CHUNK_SIZE:
+                yield finish(bytes(buffer))
+                buffer.clear()
+            # 残りの長い区間はバッファを経由せず、チャンク単位でそのまま返す
+            while end - start >= COPY_CHUNK_SIZE:
+                yield finish(view[start:start + COPY_CHUNK_SIZE])
+                start += COPY_CHUNK_SIZE
+            buffer += view[start:end]
+        if len(buffer) >= COPY_CHUNK_SIZE:
+            yield finish(bytes(buffer))
+            buffer.clear()
+    if buffer:
+        yield finish(bytes(buffer))
 
 def sync_skills_between_envs(
     project_root: Path,
@@ -101,16 +375,16 @@ def sync_skills_between_envs(
     src_env の skills ディレクトリを dst_env に同期する。
 
     mode:
-      - merge  : 既存のdstを消さず、同名ファイルのみ上書き（デフォルト）
-      - replace: dstのスキルディレクトリを削除してからコピー（破壊的）
+      - merge    : 既存のdstを消さず、同名ファイルのみ上書き（デフォルト）
+      - replace  : dstのスキルディレクトリを削除してからコピー（破壊的）
+      - reconcile: replace と同じ最終状態を差分反映で作る
+                   （内容が変わったファイルのみ書き込み、孤児ファイルのみ削除）
 
     env:
       - cursor: .cursor/skills
       - claude: .claude/skills
       - codex : .codex/skills
     """
-    import shutil
-
     env_to_dir = {
         "cursor": project_root / ".cursor" / "skills",
         "claude": project_root / ".claude" / "skills",
@@ -122,34 +396,40 @@ def sync_skills_between_envs(
     if src_dir is None or dst_dir is None:
         raise ValueError(f"Unknown env: src={src_env}, dst={dst_env}")
 
-    if not src_dir.exists():
+    if not fs_is_dir(src_dir):
         print(f"⚠️ skills同期スキップ: {src_dir} が見つかりません")
         return False
-    if mode not in {"merge", "replace"}:
+    if mode not in {"merge", "replace", "reconcile"}:
         raise ValueError(f"Unknown skills sync mode: {mode}")
 
     # 破壊的操作（dstの全削除）の前に、srcに同期可能なファイルがあるか検証
     # srcが空のときにdstだけ消してしまう事故を防ぐ。
-    src_files = [p for p in src_dir.rglob("*") if p.is_file()]
+    src_files = fs_list_files(src_dir, recursive=True)
     if len(src_files) == 0:
         print(f"❌ skills同期失敗: {src_dir} にファイルがありません（dst={dst_env} は変更しません）")
         return False
 
     if not dry_run:
-        dst_dir.mkdir(parents=True, exist_ok=True)
+        _fs_mkdir(dst_dir)
         if mode == "replace":
             deleted_count = 0
-            for skill_subdir in dst_dir.iterdir():
-                if skill_subdir.is_dir():
-                    shutil.rmtree(skill_subdir)
-                    deleted_count += 1
+            for name in sorted(_fs_entries(dst_dir)[1]):
+                _fs_rmtree(dst_dir / name)
+                deleted_count += 1
             if deleted_count:
                 print(f"🧹 skillsリフレッシュ ({dst_env}): {deleted_count}個削除")
 
+    known_dirs = set()
+    if mode == "reconcile" and not dry_run:
+        # dst直下のファイルは replace と同様に残し、スキルディレクトリ内の孤児のみ削除
+        expected = {dst_dir / p.relative_to(src_dir) for p in src_files}
+        removed, known_dirs = _reconcile_tree(dst_dir, expected, keep_root_files=True, label=dst_env)
+        if removed:
+            print(f"🧹 skills差分反映 ({dst_env}): 孤児ファイル{removed}個削除")
+
     copied_files = 0
+    unchanged_files = 0
     for src_path in src_files:
-        if not src_path.is_file():
-            continue
         rel = src_path.relative_to(src_dir)
         dst_path = dst_dir / rel
 
@@ -158,14 +438,28 @@ def sync_skills_between_envs(
             copied_files += 1
             continue
 
-        dst_path.parent.mkdir(parents=True, exist_ok=True)
+        if mode == "reconcile":
+            _ensure_dir(dst_path.parent, known_dirs)
+            if src_path.suffix.lower() in {".md", ".mdc"}:
+                changed = _transform_skill_file_if_changed(src_path, dst_path, dst_env)
+            else:
+                changed = _copy_file_if_changed(src_path, dst_path)
+            if changed:
+                copied_files += 1
+            else:
+                unchanged_files += 1
+            continue
+
+        _ensure_dir(dst_path.parent, known_dirs)
         if src_path.suffix.lower() in {".md", ".mdc"}:
-            text = src_path.read_text(encoding="utf-8")
-            dst_path.write_text(transform_skill_text(text, dst_env), encoding="utf-8")
+            _transform_skill_file_if_changed(src_path, dst_path, dst_env)
         else:
-            shutil.copy2(src_path, dst_path)
+            _copy_file_if_changed(src_path, dst_path)
         copied_files += 1
 
+    if mode == "reconcile":
+        print(f"🎯 skills同期完了: {src_env} → {dst_env} ({mode}): 書き込み{copied_files} / 変更なし{unchanged_files}ファイル")
+        return copied_files + unchanged_files > 0
     print(f"🎯 skills同期完了: {src_env} → {dst_env} ({mode}): {copied_files}ファイル")
     return copied_files > 0
 
@@ -180,7 +474,7 @@ def sync_skills_group(
     """
     if origin not in {"cursor", "claude", "codex"}:
         raise ValueError(f"Unknown skills origin: {origin}")
-    if mode not in {"merge", "replace"}:
+    if mode not in {"merge", "replace", "reconcile"}:
         raise ValueError(f"Unknown skills sync mode: {mode}")
 
     ok = True
@@ -190,10 +484,43 @@ def sync_skills_group(
         ok = sync_skills_between_envs(project_root, origin, dst, dry_run, mode=mode) and ok
     return ok
 
+# 実行時に埋め込みスクリプトを更新する環境（codex は権限事情で除外）
+EMBEDDED_SCRIPT_ENVS = ("claude", "cursor")
+
+# 大元のスクリプトを置くディレクトリ（先にあるほど優先）
+SCRIPT_SOURCE_DIRS = ("scripts", "commons_scripts")
+
+# ルール本文中のスクリプト参照（scripts/ と commons_scripts/ の両方。パス表記は変えずにファイル名だけ取り出す）
+SCRIPT_REFERENCE_PATTERN = re.compile(r'(?:scripts|commons_scripts)/([\w\-]+\.(?:py|sh|ps1))')
+
+
+def index_script_sources(project_root: Path) -> tuple[dict, set]:
+    """
+    scripts/ と commons_scripts/ のファイル名 → (パス, ラベル) の対応表を作る。
+    優先: scripts/ を先に登録し、次に commons_scripts/ を登録（同名は conflict 扱いで scripts/ を採用）
+
+    Returns:
+        (対応表, 両方に存在したファイル名の集合)
+    """
+    sources_by_name = {}
+    conflict_names = set()
+    for label in SCRIPT_SOURCE_DIRS:
+        for p in fs_list_files(project_root / label):
+            if p.name.startswith("."):
+                continue
+            if p.name in sources_by_name:
+                conflict_names.add(p.name)
+                continue
+            sources_by_name[p.name] = (p, label)
+    return sources_by_name, conflict_names
+
+
 def sync_embedded_skill_scripts(
     project_root: Path,
     dry_run: bool = False,
     envs: list[str] | None = None,
+    names: set | None = None,
+    link_mode: str = "copy",
 ) -> bool:
     """
     scripts/ と commons_scripts/ を大元（single source of truth）として、
@@ -202,49 +529,39 @@ def sync_embedded_skill_scripts(
     - 対象: .{claude,codex,cursor}/skills/*/scripts/*
     - ルール: ファイル名（basename）が一致する場合のみ上書き（新規作成はしない）
     - 優先順位: scripts/ > commons_scripts/
+    - names を指定した場合は、そのファイル名の埋め込みスクリプトのみ更新する（watch モード）
+    - link_mode で配置方法を選べる（"copy" / "reflink" / "hardlink"、_place_file を参照。COPY_ONLY_ENVS は常にコピー）
+    - 内容の比較はハッシュで行い、(inode, size, mtime_ns) が前回と同じファイルは読み込まない
+      （.sync-cache/file-hashes.json、load_file_hash_cache を参照）。内容が異なるコピーだけを置き換える
     """
-    import shutil
-
-    root_scripts_dir = project_root / "scripts"
-    root_common_scripts_dir = project_root / "commons_scripts"
 
     if envs is None:
         envs = ["claude", "codex", "cursor"]
 
-    sources_by_name = {}
-    conflict_names = set()
-
-    def index_sources(src_dir: Path, label: str) -> None:
-        if not src_dir.exists():
-            return
-        for p in src_dir.iterdir():
-            if not p.is_file():
-                continue
-            if p.name.startswith("."):
-                continue
-            existing = sources_by_name.get(p.name)
-            if existing is None:
-                sources_by_name[p.name] = (p, label)
-                continue
-            conflict_names.add(p.name)
-
-    # 優先: scripts/ を先に登録し、次に commons_scripts/ を登録（同名は conflict 扱い）
-    index_sources(root_scripts_dir, "scripts")
-    index_sources(root_common_scripts_dir, "commons_scripts")
+    sources_by_name, conflict_names = index_script_sources(project_root)
 
     if conflict_names:
         # 競合時は scripts/ を優先しつつ、警告を出す（自動で別名解決はしない）
         print(f"⚠️  埋め込みスクリプト同期: 同名競合が検出されました（scripts優先）: {sorted(conflict_names)}")
 
+    hash_cache = load_file_hash_cache(project_root)
     updated = 0
+    unchanged = 0
+    stale = 0
     skipped = 0
 
     for env in envs:
         skills_dir = project_root / f".{env}" / "skills"
-        if not skills_dir.exists():
+        env_link_mode = _link_mode_for_env(env, link_mode)
+        entries = _fs_entries(skills_dir)
+        if entries is None:
             continue
-        for embedded in skills_dir.glob("*/scripts/*"):
-            if not embedded.is_file():
+        # skills/*/scripts/* のファイル
+        embedded_files = [
+            path for skill_name in sorted(entries[1]) for path in fs_list_files(skills_dir / skill_name / "scripts")
+        ]
+        for embedded in embedded_files:
+            if names is not None and embedded.name not in names:
                 continue
             source_entry = sources_by_name.get(embedded.name)
             if source_entry is None:
@@ -253,83 +570,129 @@ def sync_embedded_skill_scripts(
             source_path, source_label = source_entry
 
             if dry_run:
-                print(f"🔍 [DRY-RUN] 埋め込みスクリプト更新予定: {embedded} <= {source_label}/{source_path.name}")
-                updated += 1
+                if _same_file_content(source_path, embedded, hash_cache):
+                    unchanged += 1
+                else:
+                    print(f"🔍 [DRY-RUN] 埋め込みスクリプト更新予定: {embedded} <= {source_label}/{source_path.name}")
+                    stale += 1
                 continue
 
-            embedded.parent.mkdir(parents=True, exist_ok=True)
             try:
-                shutil.copy2(source_path, embedded)
-                updated += 1
+                if _copy_file_if_changed(source_path, embedded, env_link_mode, hash_cache):
+                    updated += 1
+                else:
+                    unchanged += 1
             except PermissionError as e:
+                # 置き換えられなかったコピーは古い内容のまま残る
                 print(f"⚠️  埋め込みスクリプト同期: 権限不足でスキップ: {embedded} ({e})")
-                skipped += 1
+                stale += 1
             except OSError as e:
                 print(f"⚠️  埋め込みスクリプト同期: 書き込み失敗でスキップ: {embedded} ({e})")
-                skipped += 1
+                stale += 1
 
-    if updated == 0 and skipped == 0:
+    if not dry_run:
+        # watch モード（names 指定）では今回見なかったファイルの記録も残す
+        save_file_hash_cache(hash_cache, prune=names is None)
+
+    if updated == 0 and unchanged == 0 and stale == 0 and skipped == 0:
         print("ℹ️  埋め込みスクリプト同期: 対象が見つかりませんでした")
         return True
 
-    print(f"🧩 埋め込みスクリプト同期完了: 更新={updated} / 対象外={skipped}")
+    print(
+        f"🧩 埋め込みスクリプト同期完了: 更新={updated} / 変更なし={unchanged} / 古いまま={stale} / 対象外={skipped}"
+    )
     return True
 
-def remove_empty_directories(project_root: Path, target_dir: Path, dry_run: bool = False) -> int:
-    """
-    target_dir 配下の空ディレクトリを再帰的に削除する（ボトムアップ）。
-    - スクリプトの同期/変換で残る空フォルダの掃除用。
-    - ファイルが1つでもあれば削除しない。
-    """
-    if not target_dir.exists() or not target_dir.is_dir():
-        return 0
-
-    removed = 0
+EMPTY_DIR_IGNORABLE_FILES = {".gitkeep", ".DS_Store"}
 
-    # 深い階層から順に処理（子→親）
-    dirs = [p for p in target_dir.rglob("*") if p.is_dir()]
-    dirs.sort(key=lambda p: len(p.parts), reverse=True)
 
-    ignorable_files = {".gitkeep", ".DS_Store"}
+def sweep_empty_directories(project_root: Path, roots: list, dry_run: bool = False) -> int:
+    """
+    roots 配下の空ディレクトリを、1回の後行順（post-order）走査でまとめて削除する。
 
-    for d in dirs:
-        try:
-            entries = list(d.iterdir())
-        except Exception:
-            continue
+    - 各ディレクトリは1回だけ列挙し（os.scandir。索引が有効なら索引から）、空かどうかは
+      子ディレクトリの結果（削除できたか）から下から上へ判定する（列挙し直さない）
+    - 空、または「意味のない保持ファイル（.gitkeep / .DS_Store）だけ」のディレクトリを削除する
+      （保持ファイルは先に削除してから rmdir）。ファイルが1つでもあれば削除しない
+    - roots 自身は削除しない。他の root の配下にある root はまとめて1回で走査する
+    - dry_run では削除予定を表示するだけ（子を削除しない前提で判定するため、親は予定に含めない）
 
-        # 空、または「意味のない保持ファイルだけ」のディレクトリを削除対象にする
-        meaningful = [e for e in entries if e.name not in ignorable_files]
-        if meaningful:
-            continue
+    Returns:
+        削除した（dry_run では削除予定の）ディレクトリ数
+    """
+    keys = sorted({os.fspath(root) for root in roots})
+    protected = set(keys)
+    removed = 0
 
+    def remove(d: str, keep_files: list) -> bool:
+        """d を削除し、実際に消えたら True（dry_run では表示のみで False）"""
+        nonlocal removed
         if dry_run:
             try:
-                rel = d.relative_to(project_root)
+                rel = Path(d).relative_to(project_root)
             except ValueError:
                 rel = d
             print(f"🔍 [DRY-RUN] 空ディレクトリ削除予定: {rel}")
             removed += 1
-            continue
-
-        # .gitkeep 等のみがある場合は先に削除してから rmdir
-        for e in entries:
+            return False
+        for name in keep_files:
             try:
-                if e.is_file() and e.name in ignorable_files:
-                    e.unlink()
+                _fs_unlink(Path(d, name))
             except Exception:
                 pass
         try:
-            d.rmdir()
-            removed += 1
-        except Exception:
+            _fs_rmdir(d)
+        except OSError:
+            return False
+        removed += 1
+        return True
+
+    for i, root in enumerate(keys):
+        # 他の root の配下なら、その root の走査に含まれる
+        if any(root.startswith(outer + os.sep) for outer in keys[:i]):
             continue
+        # フレーム: [ディレクトリ, 未処理の子ディレクトリ, 残るエントリがあるか, 保持ファイル名]
+        stack = [[root, None, False, []]]
+        while stack:
+            frame = stack[-1]
+            d, pending = frame[0], frame[1]
+            if pending is None:
+                entries = _fs_entries(d)
+                if entries is None:
+                    # 読めないディレクトリは残す
+                    stack.pop()
+                    if stack:
+                        stack[-1][2] = True
+                    continue
+                file_names, dir_names, other_names = entries
+                frame[1] = [os.path.join(d, name) for name in sorted(dir_names, reverse=True)]
+                frame[2] = any(name not in EMPTY_DIR_IGNORABLE_FILES for name in file_names + other_names)
+                frame[3] = file_names
+                continue
+            if pending:
+                stack.append([pending.pop(), None, False, []])
+                continue
+            # 子をすべて処理し終えた（post-order）: 残るエントリが無ければ削除する
+            stack.pop()
+            gone = d not in protected and not frame[2] and remove(d, frame[3])
+            if stack and not gone:
+                stack[-1][2] = True
 
     return removed
 
+
+def remove_empty_directories(project_root: Path, target_dir: Path, dry_run: bool = False) -> int:
+    """
+    target_dir 配下の空ディレクトリを再帰的に削除する（ボトムアップ）。
+    - スクリプトの同期/変換で残る空フォルダの掃除用。
+    - ファイルが1つでもあれば削除しない。
+    - 複数のディレクトリをまとめて掃除する場合は sweep_empty_directories を使う。
+    """
+    return sweep_empty_directories(project_root, [target_dir], dry_run=dry_run)
+
 def cleanup_empty_dirs_after_run(project_root: Path, dry_run: bool = False) -> int:
     """
-    本スクリプトが触りうる主要ディレクトリ配下の空ディレクトリをまとめて削除する。
+    本スクリプトが触りうる主要ディレクトリ配下の空ディレクトリをまとめて削除する（1回の走査）。
     """
     targets = [
         project_root / ".codex" / "skills",
@@ -344,9 +707,7 @@ def cleanup_empty_dirs_after_run(project_root: Path, dry_run: bool = False) -> i
         project_root / ".cursor" / "rules",
     ]
 
-    total = 0
-    for t in targets:
-        total += remove_empty_directories(project_root, t, dry_run=dry_run)
+    total = sweep_empty_directories(project_root, targets, dry_run=dry_run)
 
     if total and not dry_run:
         print(f"🧹 空ディレクトリ掃除: {total}個")
@@ -470,8 +831,8 @@ def create_output_file_if_not_exists(file_path):
     """
     try:
         if not file_path.exists():
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            file_path.touch()
+            _fs_mkdir(file_path.parent)
+            _write_bytes(file_path, b"")
             print(f"📝 新規ファイル作成: {file_path}")
         else:
             print(f"📄 既存ファイル更新: {file_path}")
@@ -492,21 +853,28 @@ def create_agents_from_mdc(preserve_content: bool = True):
     agents_dir = project_root / ".claude" / "agents"
 
     # エージェントディレクトリを作成
-    agents_dir.mkdir(parents=True, exist_ok=True)
+    _fs_mkdir(agents_dir)
     print(f"📁 エージェントディレクトリ準備完了: {agents_dir}")
     
-    # 既存のエージェントファイルを削除（.mdと.mdcの両方）
-    for agent_file in agents_dir.glob("*"):
-        if agent_file.suffix in ['.md', '.mdc']:
+    # 既存のエージェントファイル（.mdと.mdcの両方）: 今回生成しなかったものだけを最後に削除する
+    # （生成物と同じ内容のファイルは書き直さず、mtime を保つ）
+    existing_files = [f for f in fs_list_files(agents_dir) if f.suffix in ['.md', '.mdc']]
+    produced = set()
+
+    def remove_stale_agents() -> None:
+        for agent_file in existing_files:
+            if agent_file in produced:
+                continue
             try:
-                agent_file.unlink()
+                _fs_unlink(agent_file)
                 print(f"🗑️  削除: {agent_file.name}")
             except Exception as e:
                 print(f"⚠️  削除失敗: {agent_file.name}: {e}")
-    
+
     # mdcファイルを取得
-    mdc_files = list(rules_dir.glob("*.mdc"))
+    mdc_files = [f for f in fs_list_files(rules_dir) if f.suffix == ".mdc"]
     if not mdc_files:
+        remove_stale_agents()
         print("❌ .mdcファイルが見つかりません")
         return False
     
@@ -526,8 +894,11 @@ def create_agents_from_mdc(preserve_content: bool = True):
             if ("00" in filename or "path" in filename.lower()):
                 # .mdcファイルとしてそのままコピー
                 agent_file = agents_dir / filename  # 拡張子も含めてそのまま
-                agent_file.write_text(replace_path_reference(content, "CLAUDE.md"), encoding='utf-8')
-                print(f"📋 マスターファイルコピー: {filename} (.mdcのまま)")
+                if write_text_if_changed(agent_file, replace_path_reference(content, "CLAUDE.md")):
+                    print(f"📋 マスターファイルコピー: {filename} (.mdcのまま)")
+                else:
+                    print(f"⏭️  変更なし: {filename}")
+                produced.add(agent_file)
                 success_count += 1
                 # コマンドディレクトリにはコピーしない（マスターファイルは除外）
                 continue
@@ -568,16 +939,19 @@ description: {description}
             # エージェントファイルのパス
             agent_file = agents_dir / f"{agent_name}.md"
             
-            # エージェントファイルを書き込み
-            agent_file.write_text(agent_content, encoding='utf-8')
-            
-            print(f"✅ エージェント作成: {agent_name}")
+            # エージェントファイルを書き込み（内容が同じなら書き込まない）
+            if write_text_if_changed(agent_file, agent_content):
+                print(f"✅ エージェント作成: {agent_name}")
+            else:
+                print(f"⏭️  変更なし: {agent_name}")
+            produced.add(agent_file)
             
             success_count += 1
             
         except Exception as e:
             print(f"❌ 変換失敗 {mdc_file.name}: {e}")
-    
+
+    remove_stale_agents()
     print(f"🎯 エージェント作成完了: {success_count}/{len(mdc_files)}")
     return success_count > 0
 
@@ -648,14 +1022,19 @@ def organize_manual_commands(project_root: Path, dry_run: bool = False) -> int:
     return moved_count
 
 
-def sync_commands_to_codex_and_claude(project_root: Path, dry_run: bool = False) -> bool:
+def sync_commands_to_codex_and_claude(project_root: Path, dry_run: bool = False, refresh_mode: str = "reconcile") -> bool:
     """
     .cursor/commands の手動コマンドを .codex/prompts と .claude/commands に同期する。
     - すべてのファイルをフラット配置（サブディレクトリ構造は作成しない）。
     - .codex/prompts/*.md と .claude/commands/*.md に直接配置。
+    - refresh_mode="reconcile" では孤児ファイル/サブディレクトリのみ削除し、内容が変わったファイルのみ書き込む。
+      "replace" ではコピー先の既存ファイルを全削除してから書き込む（旧挙動）。"staged" は reconcile と同じ。
     """
     import shutil
 
+    if refresh_mode not in REFRESH_MODES:
+        raise ValueError(f"Unknown refresh mode: {refresh_mode}")
+
     source_dir = project_root / ".cursor" / "commands"
     codex_prompts_dir = project_root / ".codex" / "prompts"
     claude_commands_dir = project_root / ".claude" / "commands"
@@ -671,72 +1050,97 @@ def sync_commands_to_codex_and_claude(project_root: Path, dry_run: bool = False)
         print(f"📁 Codexプロンプトディレクトリ準備完了: {codex_prompts_dir}")
         print(f"📁 Claudeコマンドディレクトリ準備完了: {claude_commands_dir}")
 
-    # コピー先の既存ファイルを削除（直下のファイルのみ、サブディレクトリは削除）
     target_dirs = [
         (codex_prompts_dir, ".codex/prompts"),
         (claude_commands_dir, ".claude/commands")
     ]
 
-    for target_dir, dir_name in target_dirs:
-        if not dry_run and target_dir.exists():
-            # サブディレクトリを削除
-            for item in target_dir.iterdir():
-                if item.is_dir():
-                    shutil.rmtree(item)
-                    print(f"🗑️  削除 ({dir_name}): {item.name}/")
-            # ファイルを削除
-            for existing_file in target_dir.iterdir():
-                if existing_file.is_file():
-                    try:
-                        existing_file.unlink()
-                        print(f"🗑️  削除 ({dir_name}): {existing_file.name}")
-                    except Exception as e:
-                        print(f"⚠️  削除失敗 ({dir_name}): {existing_file.name}: {e}")
-
-    # ソースディレクトリ直下のファイルをフラットにコピー
-    copied_count = 0
+    # ソースディレクトリ直下のファイルを読み込む（最終更新行は削除）
+    sources = []
     for source_file in source_dir.iterdir():
         if source_file.is_file():
-            # ソースファイルの内容を読み込み
             try:
                 source_content = source_file.read_text(encoding='utf-8')
             except Exception as e:
                 print(f"❌ コピー失敗（read） {source_file.name}: {e}")
                 continue
-
             # 最終更新行を削除（# ・最終更新: などのパターン）
             source_content = re.sub(r'^#\s*・?最終更新.*\n', '', source_content, flags=re.MULTILINE)
+            sources.append((source_file, source_content))
 
-            # 各コピー先にコピー（環境別にpath_referenceを変換）
-            per_file_success = False
-            for target_dir, dir_name in target_dirs:
-                target_file = target_dir / source_file.name
+    for target_dir, dir_name in target_dirs:
+        if dry_run or not target_dir.exists():
+            continue
+        if refresh_mode != "replace":
+            # 孤児のみ削除（サブディレクトリは中身ごと孤児扱い）
+            expected = {target_dir / source_file.name for source_file, _ in sources}
+            for item in sorted(target_dir.iterdir()):
+                if item.is_dir():
+                    shutil.rmtree(item)
+                    print(f"🗑️  削除 ({dir_name}): {item.name}/")
+                elif item not in expected:
+                    try:
+                        item.unlink()
+                        print(f"🗑️  削除 ({dir_name}): {item.name}")
+                    except Exception as e:
+                        print(f"⚠️  削除失敗 ({dir_name}): {item.name}: {e}")
+            continue
+        # コピー先の既存ファイルを削除（直下のファイルのみ、サブディレクトリは削除）
+        # サブディレクトリを削除
+        for item in target_dir.iterdir():
+            if item.is_dir():
+                shutil.rmtree(item)
+                print(f"🗑️  削除 ({dir_name}): {item.name}/")
+        # ファイルを削除
+        for existing_file in target_dir.iterdir():
+            if existing_file.is_file():
+                try:
+                    existing_file.unlink()
+                    print(f"🗑️  削除 ({dir_name}): {existing_file.name}")
+                except Exception as e:
+                    print(f"⚠️  削除失敗 ({dir_name}): {existing_file.name}: {e}")
 
-                # 環境別にpath_referenceを変換
-                if dir_name == ".codex/prompts":
-                    target_content = replace_path_reference(source_content, "AGENTS.md")
-                else:
-                    target_content = replace_path_reference(source_content, "CLAUDE.md")
+    # ソースディレクトリ直下のファイルをフラットにコピー
+    copied_count = 0
+    unchanged_count = 0
+    for source_file, source_content in sources:
+        # 各コピー先にコピー（環境別にpath_referenceを変換）
+        per_file_success = False
+        per_file_written = False
+        for target_dir, dir_name in target_dirs:
+            target_file = target_dir / source_file.name
+
+            # 環境別にpath_referenceを変換
+            if dir_name == ".codex/prompts":
+                target_content = replace_path_reference(source_content, "AGENTS.md")
+            else:
+                target_content = replace_path_reference(source_content, "CLAUDE.md")
 
-                if dry_run:
-                    print(f"🔍 [DRY-RUN] コピー予定 ({dir_name}): {source_file.name}")
-                    per_file_success = True
-                    continue
+            if dry_run:
+                print(f"🔍 [DRY-RUN] コピー予定 ({dir_name}): {source_file.name}")
+                per_file_success = True
+                continue
 
-                try:
-                    target_file.write_text(target_content, encoding='utf-8')
+            try:
+                # replace では既存ファイルを削除済みのため、常に書き込みになる
+                if write_text_if_changed(target_file, target_content):
                     print(f"📋 コピー完了 ({dir_name}): {source_file.name}")
-                    per_file_success = True
-                except PermissionError as e:
-                    # Codex側が保護されている等で失敗しても、Claude側のコピーは継続したい
-                    print(f"⚠️  コピー失敗（権限） ({dir_name}): {source_file.name}: {e}")
-                except Exception as e:
-                    print(f"❌ コピー失敗 ({dir_name}): {source_file.name}: {e}")
+                    per_file_written = True
+                per_file_success = True
+            except PermissionError as e:
+                # Codex側が保護されている等で失敗しても、Claude側のコピーは継続したい
+                print(f"⚠️  コピー失敗（権限） ({dir_name}): {source_file.name}: {e}")
+            except Exception as e:
+                print(f"❌ コピー失敗 ({dir_name}): {source_file.name}: {e}")
 
-            if per_file_success:
-                copied_count += 1
+        if per_file_success:
+            copied_count += 1
+            if not per_file_written and not dry_run:
+                unchanged_count += 1
 
     print(f"🎯 {'[DRY-RUN] ' if dry_run else ''}コマンド同期{'予定' if dry_run else '完了'}: {copied_count}ファイル")
+    if unchanged_count:
+        print(f"⏭️  変更なし: {unchanged_count}ファイル")
     return copied_count > 0
 
 def extract_description_from_frontmatter(content):
@@ -750,59 +1154,66 @@ def extract_description_from_frontmatter(content):
         print(f"⚠️  Description抽出エラー: {e}")
         return "Agent for handling specific presentation tasks"
 
-def convert_mdc_paths_to_agent_paths(content):
-    """
-    コンテンツ内の .mdc ファイル参照を .claude/agents/*.md に変換
-
-    対応形式:
-    1. 旧形式: action: "call ファイル名.mdc => ..."
-    2. v2形式: rule: ".cursor/rules/XX.mdc"
-    """
-    # 1. 旧形式: action: "call ファイル名.mdc パターン
-    def replace_call_path(match):
-        prefix = match.group(1)
-        mdc_filename = match.group(2)
+def _replace_call_path(match):
+    """旧形式 action: "call ファイル名.mdc を .claude/agents/ファイル名.md 参照に変換"""
+    prefix = match.group(1)
+    mdc_filename = match.group(2)
 
-        if mdc_filename.endswith('.mdc'):
-            agent_filename = mdc_filename.replace('.mdc', '.md')
-            return f'{prefix}.claude/agents/{agent_filename}'
+    if mdc_filename.endswith('.mdc'):
+        agent_filename = mdc_filename.replace('.mdc', '.md')
+        return f'{prefix}.claude/agents/{agent_filename}'
 
-        return match.group(0)
+    return match.group(0)
 
-    pattern_old = r'(action:\s*"call\s+)([^"\s=>]+\.mdc)'
-    converted_content = re.sub(pattern_old, replace_call_path, content)
 
-    # 2. v2形式: rule: ".cursor/rules/XX.mdc" パターン
-    def replace_rule_path(match):
-        prefix = match.group(1)  # 'rule: "'
-        mdc_path = match.group(2)  # '.cursor/rules/XX.mdc' or similar
+def _replace_rule_path(match):
+    """v2形式 rule: ".cursor/rules/XX.mdc" を .claude/agents/XX.md 参照に変換"""
+    prefix = match.group(1)  # 'rule: "'
+    mdc_path = match.group(2)  # '.cursor/rules/XX.mdc' or similar
 
-        # パスからファイル名を抽出
-        if '/' in mdc_path:
-            filename = mdc_path.split('/')[-1]
-        else:
-            filename = mdc_path
+    # パスからファイル名を抽出
+    if '/' in mdc_path:
+        filename = mdc_path.split('/')[-1]
+    else:
+        filename = mdc_path
 
-        # .mdc を .md に変更
-        if filename.endswith('.mdc'):
-            agent_filename = filename.replace('.mdc', '.md')
-            return f'{prefix}.claude/agents/{agent_filename}"'
+    # .mdc を .md に変更
+    if filename.endswith('.mdc'):
+        agent_filename = filename.replace('.mdc', '.md')
+        return f'{prefix}.claude/agents/{agent_filename}"'
 
-        return match.group(0)
+    return match.group(0)
 
-    # rule: ".cursor/rules/XX.mdc" または rule: "XX.mdc" パターン
-    pattern_v2 = r'(rule:\s*")([^"]+\.mdc)"'
-    converted_content = re.sub(pattern_v2, replace_rule_path, converted_content)
 
+# convert_mdc_paths_to_agent_paths のルール表（逐次適用順）
+MDC_TO_AGENT_RULES = [
+    # 1. 旧形式: action: "call ファイル名.mdc パターン
+    (r'(action:\s*"call\s+)([^"\s=>]+\.mdc)', _replace_call_path, 'action:'),
+    # 2. v2形式: rule: ".cursor/rules/XX.mdc" または rule: "XX.mdc" パターン
+    (r'(rule:\s*")([^"]+\.mdc)"', _replace_rule_path, 'rule:'),
     # 3. path_reference の変換（互換: 00_master_rules / pmbok_paths 等も吸収）
-    converted_content = replace_path_reference(converted_content, "CLAUDE.md")
-
+    (PATH_REFERENCE_PATTERN.pattern, 'path_reference: "CLAUDE.md"', 'path_reference:'),
     # 4. .cursor/rules/ → .claude/agents/ （一般的なパス参照）
-    converted_content = re.sub(r'\.cursor/rules/', '.claude/agents/', converted_content)
-
+    (r'\.cursor/rules/', '.claude/agents/', '.cursor/rules/'),
     # 5. .cursor/commands/ → .claude/commands/ （コマンドパス参照）
-    converted_content = re.sub(r'\.cursor/commands/', '.claude/commands/', converted_content)
+    (r'\.cursor/commands/', '.claude/commands/', '.cursor/commands/'),
+]
+_rewrite_mdc_to_agent = _compile_rewrite_rules(MDC_TO_AGENT_RULES)
+
+
+def convert_mdc_paths_to_agent_paths(content):
+    """
+    コンテンツ内の .mdc ファイル参照を .claude/agents/*.md に変換
+
+    対応形式:
+    1. 旧形式: action: "call ファイル名.mdc => ..."
+    2. v2形式: rule: ".cursor/rules/XX.mdc"
 
+    MDC_TO_AGENT_RULES を1回の走査でまとめて適用する（結果は逐次 re.sub と同一）。
+    """
+    converted_content = _rewrite_mdc_to_agent(content)
+    if converted_content is None:
+        converted_content = _apply_rewrite_rules_sequential(MDC_TO_AGENT_RULES, content)
     return converted_content
 
 
@@ -977,100 +1388,109 @@ def remove_unnecessary_sections(content: str) -> str:
     return '\n'.join(final_result)
 
 
-def convert_agent_paths_to_mdc_paths(content: str) -> str:
-    """
-    コンテンツ内の .claude/agents/*.md 参照を .cursor/rules/*.mdc に変換（逆変換）
+def _replace_agent_rule_path(match):
+    """rule: ".claude/agents/XX.md" を .cursor/rules/XX.mdc 参照に変換"""
+    prefix = match.group(1)  # 'rule: "'
+    agent_path = match.group(2)  # '.claude/agents/XX.md' or similar
 
-    対応形式:
-    1. rule: ".claude/agents/XX.md" → rule: ".cursor/rules/XX.mdc"
-    2. action: "call .claude/agents/XX.md => ..." → action: "call XX.mdc => ..."
-    3. path_reference: "CLAUDE.md" → path_reference: "pmbok_paths.mdc"
-    4. .claude/skills/xxx/ → .cursor/rules/xxx.mdc
-    5. .codex/prompts/ → .cursor/commands/
-    6. .codex/skills/ → .cursor/rules/
-    """
-    converted_content = content
+    # パスからファイル名を抽出
+    if '/' in agent_path:
+        filename = agent_path.split('/')[-1]
+    else:
+        filename = agent_path
 
-    # 1. rule: ".claude/agents/XX.md" → rule: ".cursor/rules/XX.mdc"
-    def replace_agent_rule_path(match):
-        prefix = match.group(1)  # 'rule: "'
-        agent_path = match.group(2)  # '.claude/agents/XX.md' or similar
+    # .md を .mdc に変更
+    if filename.endswith('.md'):
+        mdc_filename = filename.replace('.md', '.mdc')
+        return f'{prefix}.cursor/rules/{mdc_filename}"'
 
-        # パスからファイル名を抽出
-        if '/' in agent_path:
-            filename = agent_path.split('/')[-1]
-        else:
-            filename = agent_path
+    return match.group(0)
 
-        # .md を .mdc に変更
-        if filename.endswith('.md'):
-            mdc_filename = filename.replace('.md', '.mdc')
-            return f'{prefix}.cursor/rules/{mdc_filename}"'
 
-        return match.group(0)
+def _replace_agent_call_path(match):
+    """action: "call .claude/agents/XX.md を XX.mdc 参照に変換"""
+    prefix = match.group(1)
+    agent_path = match.group(2)
 
-    pattern_agent_rule = r'(rule:\s*")([^"]+\.md)"'
-    converted_content = re.sub(pattern_agent_rule, replace_agent_rule_path, converted_content)
+    # パスからファイル名を抽出
+    if '/' in agent_path:
+        filename = agent_path.split('/')[-1]
+    else:
+        filename = agent_path
 
-    # 2. action: "call .claude/agents/XX.md パターン → action: "call XX.mdc
-    def replace_agent_call_path(match):
-        prefix = match.group(1)
-        agent_path = match.group(2)
+    if filename.endswith('.md'):
+        mdc_filename = filename.replace('.md', '.mdc')
+        return f'{prefix}{mdc_filename}'
 
-        # パスからファイル名を抽出
-        if '/' in agent_path:
-            filename = agent_path.split('/')[-1]
-        else:
-            filename = agent_path
+    return match.group(0)
 
-        if filename.endswith('.md'):
-            mdc_filename = filename.replace('.md', '.mdc')
-            return f'{prefix}{mdc_filename}'
 
-        return match.group(0)
+SKILL_NAME_PATTERN = re.compile(r'\.claude/skills/([^/]+)')
+AGENT_FILENAME_PATTERN = re.compile(r'\.claude/agents/([^/\s"]+)\.md')
 
-    pattern_agent_call = r'(action:\s*"call\s+)([^"\s=>]+\.md)'
-    converted_content = re.sub(pattern_agent_call, replace_agent_call_path, converted_content)
 
-    # 3. path_reference: 各環境の値 → Cursor用 "00_master_rules.mdc"
-    converted_content = replace_path_reference(converted_content, "00_master_rules.mdc")
+def _replace_skills_path(match):
+    """.claude/skills/skill-name/... → .cursor/rules/skill_name.mdc"""
+    full_path = match.group(0)
+    skill_match = SKILL_NAME_PATTERN.search(full_path)
+    if skill_match:
+        skill_name = skill_match.group(1)
+        # ハイフンをアンダースコアに変換
+        rule_name = skill_name.replace('-', '_')
+        return f'.cursor/rules/{rule_name}.mdc'
+    return full_path
 
+
+def _replace_agent_path_general(match):
+    """.claude/agents/xxx.md → .cursor/rules/xxx.mdc"""
+    full_path = match.group(0)
+    agent_match = AGENT_FILENAME_PATTERN.search(full_path)
+    if agent_match:
+        filename = agent_match.group(1)
+        return f'.cursor/rules/{filename}.mdc'
+    return full_path
+
+
+# convert_agent_paths_to_mdc_paths のルール表（逐次適用順）
+AGENT_TO_MDC_RULES = [
+    # 1. rule: ".claude/agents/XX.md" → rule: ".cursor/rules/XX.mdc"
+    (r'(rule:\s*")([^"]+\.md)"', _replace_agent_rule_path, 'rule:'),
+    # 2. action: "call .claude/agents/XX.md パターン → action: "call XX.mdc
+    (r'(action:\s*"call\s+)([^"\s=>]+\.md)', _replace_agent_call_path, 'action:'),
+    # 3. path_reference: 各環境の値 → Cursor用 "00_master_rules.mdc"
+    (PATH_REFERENCE_PATTERN.pattern, 'path_reference: "00_master_rules.mdc"', 'path_reference:'),
     # 4. .claude/skills/xxx-yyy/ パターン → .cursor/rules/XX_xxx_yyy.mdc
     #    （スキル名からルール名への変換は複雑なため、汎用パターンで対応）
-    def replace_skills_path(match):
-        full_path = match.group(0)
-        # .claude/skills/skill-name/... → .cursor/rules/skill-name.mdc
-        skill_match = re.search(r'\.claude/skills/([^/]+)', full_path)
-        if skill_match:
-            skill_name = skill_match.group(1)
-            # ハイフンをアンダースコアに変換
-            rule_name = skill_name.replace('-', '_')
-            return f'.cursor/rules/{rule_name}.mdc'
-        return full_path
-
-    converted_content = re.sub(r'\.claude/skills/[^"\s]+', replace_skills_path, converted_content)
-
+    (r'\.claude/skills/[^"\s]+', _replace_skills_path, '.claude/skills/'),
     # 5. .codex/prompts/ → .cursor/commands/
-    converted_content = re.sub(r'\.codex/prompts/', '.cursor/commands/', converted_content)
-
+    (r'\.codex/prompts/', '.cursor/commands/', '.codex/prompts/'),
     # 6. .codex/skills/ → .cursor/rules/（スキル参照）
-    converted_content = re.sub(r'\.codex/skills/', '.cursor/rules/', converted_content)
-
+    (r'\.codex/skills/', '.cursor/rules/', '.codex/skills/'),
     # 7. .claude/commands/ → .cursor/commands/
-    converted_content = re.sub(r'\.claude/commands/', '.cursor/commands/', converted_content)
-
+    (r'\.claude/commands/', '.cursor/commands/', '.claude/commands/'),
     # 8. .claude/agents/xxx.md → .cursor/rules/xxx.mdc （一般的なパス参照）
-    def replace_agent_path_general(match):
-        full_path = match.group(0)
-        # .claude/agents/xxx.md → .cursor/rules/xxx.mdc
-        agent_match = re.search(r'\.claude/agents/([^/\s"]+)\.md', full_path)
-        if agent_match:
-            filename = agent_match.group(1)
-            return f'.cursor/rules/{filename}.mdc'
-        return full_path
+    (r'\.claude/agents/[^\s"]+\.md', _replace_agent_path_general, '.claude/agents/'),
+]
+_rewrite_agent_to_mdc = _compile_rewrite_rules(AGENT_TO_MDC_RULES)
+
+
+def convert_agent_paths_to_mdc_paths(content: str) -> str:
+    """
+    コンテンツ内の .claude/agents/*.md 参照を .cursor/rules/*.mdc に変換（逆変換）
 
-    converted_content = re.sub(r'\.claude/agents/[^\s"]+\.md', replace_agent_path_general, converted_content)
+    対応形式:
+    1. rule: ".claude/agents/XX.md" → rule: ".cursor/rules/XX.mdc"
+    2. action: "call .claude/agents/XX.md => ..." → action: "call XX.mdc => ..."
+    3. path_reference: "CLAUDE.md" → path_reference: "pmbok_paths.mdc"
+    4. .claude/skills/xxx/ → .cursor/rules/xxx.mdc
+    5. .codex/prompts/ → .cursor/commands/
+    6. .codex/skills/ → .cursor/rules/
 
+    AGENT_TO_MDC_RULES を1回の走査でまとめて適用する（結果は逐次 re.sub と同一）。
+    """
+    converted_content = _rewrite_agent_to_mdc(content)
+    if converted_content is None:
+        converted_content = _apply_rewrite_rules_sequential(AGENT_TO_MDC_RULES, content)
     return converted_content
 
 def convert_agents_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
@@ -1129,8 +1549,7 @@ def convert_agents_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
 
                 if dry_run:
                     print(f"🔍 [DRY-RUN] マスターファイルコピー予定: {filename} (.mdcのまま)")
-                else:
-                    rule_file.write_text(content, encoding='utf-8')
+                elif write_text_if_changed(rule_file, content):
                     print(f"📋 マスターファイルコピー: {filename} (.mdcのまま)")
                 success_count += 1
                 continue
@@ -1151,8 +1570,7 @@ def convert_agents_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
 
                 if dry_run:
                     print(f"🔍 [DRY-RUN] ルール作成予定: {rule_name}")
-                else:
-                    rule_file.write_text(rule_content, encoding='utf-8')
+                elif write_text_if_changed(rule_file, rule_content):
                     print(f"✅ ルール作成: {rule_name}")
                 success_count += 1
 
@@ -1163,169 +1581,238 @@ def convert_agents_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
     return success_count > 0
 
 
-def convert_skills_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
+# 逆変換（skills → .cursor/rules）の起点環境: (skills ディレクトリ, 表示名の接頭辞, 変換元の表示接頭辞)
+REVERSE_SKILL_SOURCES = {
+    "claude": (".claude/skills", "", ""),
+    "codex": (".codex/skills", "Codex", "codex/"),
+}
+
+# 逆変換時に削除する skill_resources セクション（順変換で SKILL.md に追加したもの）
+SKILL_RESOURCES_SECTION_PATTERN = re.compile(
+    r'# ======== 関連リソース ========\nskill_resources:.*?(?=\n[a-z#]|\Z)', re.DOTALL
+)
+
+
+def index_rule_prefixes(rules_dir: Path) -> dict:
+    """
+    .cursor/rules の既存ルールから、番号プレフィックスを復元するための索引を作る（ディレクトリを1回だけ走査）。
+
+    Returns:
+        {接尾辞: ルール名（拡張子なし）}
+        ルール名の各 "_" より後ろの部分を接尾辞とする（rules_dir.glob(f"*_{接尾辞}.mdc") に一致するルール）。
+        同じ接尾辞を持つルールが複数ある場合は、名前順で最初のものを使う
+    """
+    entries = _fs_entries(rules_dir)
+    index = {}
+    if entries is None:
+        return index
+    for name in sorted(entries[0]):
+        if not name.endswith(".mdc") or name.startswith("."):
+            continue
+        stem = name[:-len(".mdc")]
+        at = stem.find("_")
+        while at >= 0:
+            index.setdefault(stem[at + 1:], stem)
+            at = stem.find("_", at + 1)
+    return index
+
+
+def _merge_skill_sections(path: Path) -> list:
+    """questions/ または assets/ 直下の *.md を名前順に読み、先頭の見出し行を除いた本文の一覧を返す"""
+    sections = []
+    if not path.exists():
+        return sections
+    for section_file in sorted(path.glob("*.md")):
+        content = section_file.read_text(encoding='utf-8')
+        # ヘッダー行を削除（# skill-name - question_name）
+        lines = content.splitlines()
+        if lines and lines[0].startswith('#'):
+            content = '\n'.join(lines[1:]).strip()
+        sections.append(f"\n{content}")
+    return sections
+
+
+def _merge_skill_to_rule(skill_dir: str, rule_name: str) -> dict:
+    """
+    1つのスキル（SKILL.md + questions/*.md + assets/*.md）を .mdc ルールの内容に統合する。
+    書き込みは行わないため、プロセスプールのワーカーで実行できる（引数・戻り値とも pickle 可能）。
+
+    Returns:
+        {"skill": スキル名, "rule_name": ルール名, "content": ルールの内容（SKILL.md が無ければ None）,
+         "scripts": scripts/ 直下のファイル（名前順）, "error": 失敗時のメッセージ, "traceback": 失敗時のトレースバック}
+    """
+    skill_path = Path(skill_dir)
+    result = {"skill": skill_path.name, "rule_name": rule_name, "content": None, "scripts": [], "error": None}
+    try:
+        skill_file = skill_path / "SKILL.md"
+        if not skill_file.exists():
+            return result
+
+        # SKILL.md を読み込み
+        skill_content = skill_file.read_text(encoding='utf-8')
+        frontmatter, body = parse_frontmatter(skill_content)
+        description = frontmatter.get('description', f'Rule for {skill_path.name}')
+
+        # 統合コンテンツを構築（questions/*.md → assets/*.md の順）
+        combined_sections = [body]
+        combined_sections.extend(_merge_skill_sections(skill_path / "questions"))
+        combined_sections.extend(_merge_skill_sections(skill_path / "assets"))
+        combined_content = '\n\n'.join(combined_sections)
+
+        # パス参照を逆変換し、skill_resources セクションを削除（逆変換時は不要）
+        combined_content = convert_agent_paths_to_mdc_paths(combined_content)
+        combined_content = SKILL_RESOURCES_SECTION_PATTERN.sub('', combined_content)
+
+        # 新しいフロントマターを作成
+        result["content"] = create_cursor_frontmatter(rule_name, description) + combined_content.strip()
+
+        skill_scripts_dir = skill_path / "scripts"
+        if skill_scripts_dir.exists():
+            result["scripts"] = sorted(str(p) for p in skill_scripts_dir.glob("*") if p.is_file())
+    except Exception as e:
+        import traceback
+
+        result["error"] = str(e)
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def convert_env_skills_to_cursor(project_root: Path, source_env: str, dry_run: bool = False, jobs: int = 1) -> bool:
     """
-    .claude/skills/*/SKILL.md → .cursor/rules/*.mdc 変換（逆変換）
+    .{source_env}/skills/*/SKILL.md → .cursor/rules/*.mdc 変換（逆変換。source_env: REVERSE_SKILL_SOURCES）
 
     機能:
     1. SKILL.md + questions/*.md + assets/*.md を統合して単一の .mdc ファイルに変換
     2. スクリプトを scripts/ または commons_scripts/ にコピー（上書き）
     3. パス参照を .cursor/rules 形式に変換
 
+    ルール名の番号プレフィックスは、変換前の .cursor/rules を1回だけ走査した索引（index_rule_prefixes）から復元する
+    （変換中に書いたルールは復元元にならない）。
+    jobs > 1 の場合、スキルの統合（読み込み・変換）をプロセスプールで並列に行う。
+    書き込みと表示はスキル名の順に行うため、並列でも結果・表示順は変わらない。
+
     Args:
         project_root: プロジェクトルートパス
+        source_env: 起点環境（"claude" / "codex"）
         dry_run: ドライラン（実際には書き込まない）
+        jobs: 並列数（1 なら逐次）
     """
-    import shutil
-
-    claude_skills_dir = project_root / ".claude" / "skills"
+    if source_env not in REVERSE_SKILL_SOURCES:
+        raise ValueError(f"Unknown reverse conversion source: {source_env}")
+    skills_rel, label, origin_prefix = REVERSE_SKILL_SOURCES[source_env]
+    skills_dir = project_root / skills_rel
     rules_dir = project_root / ".cursor" / "rules"
     scripts_dir = project_root / "scripts"
     commons_scripts_dir = project_root / "commons_scripts"
 
-    if not claude_skills_dir.exists():
-        print(f"⚠️ .claude/skillsディレクトリが見つかりません: {claude_skills_dir}")
+    if not skills_dir.exists():
+        print(f"⚠️ {skills_rel}ディレクトリが見つかりません: {skills_dir}")
         return False
 
     # スキルディレクトリ一覧を取得
-    skill_dirs = [d for d in claude_skills_dir.iterdir() if d.is_dir()]
+    skill_dirs = sorted(d for d in skills_dir.iterdir() if d.is_dir())
     if not skill_dirs:
         print("⚠️ スキルディレクトリが見つかりません")
         return False
 
-    print(f"📋 {len(skill_dirs)}個のスキルディレクトリを発見")
+    print(f"📋 {len(skill_dirs)}個の{label}スキルディレクトリを発見")
+
+    # スキル名からルール名を生成（ハイフン→アンダースコア）し、既存ルールの番号プレフィックスがあれば復元する
+    prefixes = index_rule_prefixes(rules_dir)
+    rule_names = []
+    for skill_dir in skill_dirs:
+        rule_name = skill_dir.name.replace('-', '_')
+        rule_names.append(prefixes.get(rule_name, rule_name))
 
     if not dry_run:
         rules_dir.mkdir(parents=True, exist_ok=True)
         scripts_dir.mkdir(parents=True, exist_ok=True)
 
+    tasks = ([str(d) for d in skill_dirs], rule_names)
+    if jobs > 1 and len(skill_dirs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = min(jobs, len(skill_dirs))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # スキル1件ごとの受け渡しはプロセス間通信の方が重くなるため、ワーカーあたり数回に分けて渡す
+            results = list(pool.map(_merge_skill_to_rule, *tasks, chunksize=max(1, len(skill_dirs) // (workers * 4))))
+    else:
+        results = list(map(_merge_skill_to_rule, *tasks))
+
     success_count = 0
     script_copy_count = 0
-
-    for skill_dir in sorted(skill_dirs):
+    for result in results:
+        skill_name = result["skill"]
+        rule_name = result["rule_name"]
         try:
-            skill_name = skill_dir.name  # 例: pmbok-executing
-            skill_file = skill_dir / "SKILL.md"
-
-            if not skill_file.exists():
-                print(f"⚠️ SKILL.mdが見つかりません: {skill_dir.name}")
+            if result["error"] is not None:
+                raise RuntimeError(result["error"])
+            if result["content"] is None:
+                print(f"⚠️ SKILL.mdが見つかりません: {skill_name}")
                 continue
 
-            # スキル名からルール名を生成（ハイフン→アンダースコア）
-            # 番号プレフィックスの復元を試みる
-            rule_name = skill_name.replace('-', '_')
-
-            # 既存のルールファイルから番号プレフィックスを検出
-            existing_rules = list(rules_dir.glob(f"*_{rule_name}.mdc")) if rules_dir.exists() else []
-            if existing_rules:
-                # 既存の番号を使用
-                rule_name = existing_rules[0].stem
-            else:
-                # 番号なしで作成（後でマニュアル調整が必要）
-                pass
-
-            # SKILL.md を読み込み
-            skill_content = skill_file.read_text(encoding='utf-8')
-            frontmatter, body = parse_frontmatter(skill_content)
-            description = frontmatter.get('description', f'Rule for {skill_name}')
-
-            # 統合コンテンツを構築
-            combined_sections = []
-            combined_sections.append(body)
-
-            # questions/*.md を統合
-            questions_dir = skill_dir / "questions"
-            if questions_dir.exists():
-                for q_file in sorted(questions_dir.glob("*.md")):
-                    q_content = q_file.read_text(encoding='utf-8')
-                    # ヘッダー行を削除（# skill-name - question_name）
-                    q_lines = q_content.splitlines()
-                    if q_lines and q_lines[0].startswith('#'):
-                        q_content = '\n'.join(q_lines[1:]).strip()
-                    combined_sections.append(f"\n{q_content}")
-
-            # assets/*.md を統合
-            assets_dir = skill_dir / "assets"
-            if assets_dir.exists():
-                for t_file in sorted(assets_dir.glob("*.md")):
-                    t_content = t_file.read_text(encoding='utf-8')
-                    # ヘッダー行を削除
-                    t_lines = t_content.splitlines()
-                    if t_lines and t_lines[0].startswith('#'):
-                        t_content = '\n'.join(t_lines[1:]).strip()
-                    combined_sections.append(f"\n{t_content}")
-
-            # コンテンツを結合
-            combined_content = '\n\n'.join(combined_sections)
-
-            # パス参照を逆変換
-            combined_content = convert_agent_paths_to_mdc_paths(combined_content)
-
-            # skill_resources セクションを削除（逆変換時は不要）
-            combined_content = re.sub(
-                r'# ======== 関連リソース ========\nskill_resources:.*?(?=\n[a-z#]|\Z)',
-                '',
-                combined_content,
-                flags=re.DOTALL
-            )
-
-            # 新しいフロントマターを作成
-            new_frontmatter = create_cursor_frontmatter(rule_name, description)
-            rule_content = new_frontmatter + combined_content.strip()
-
             rule_file = rules_dir / f"{rule_name}.mdc"
-
+            source = f"{origin_prefix}{skill_name}"
             if dry_run:
-                print(f"🔍 [DRY-RUN] ルール作成予定: {rule_name} (from {skill_name})")
+                print(f"🔍 [DRY-RUN] ルール作成予定: {rule_name} (from {source})")
+            elif write_text_if_changed(rule_file, result["content"]):
+                print(f"✅ ルール作成: {rule_name} (from {source})")
             else:
-                rule_file.write_text(rule_content, encoding='utf-8')
-                print(f"✅ ルール作成: {rule_name} (from {skill_name})")
+                print(f"⏭️  変更なし: {rule_name} (from {source})")
 
             success_count += 1
 
             # scripts/ 内のスクリプトをコピー（上書き）
-            skill_scripts_dir = skill_dir / "scripts"
-            if skill_scripts_dir.exists():
-                for script_file in skill_scripts_dir.glob("*"):
-                    if script_file.is_file():
-                        # コピー先を決定（commons_scripts に同名ファイルがあればそちら優先）
-                        target_in_commons = commons_scripts_dir / script_file.name
-                        target_in_scripts = scripts_dir / script_file.name
-
-                        if target_in_commons.exists() or script_file.name.startswith("manage_"):
-                            target_file = target_in_commons
-                            target_name = f"commons_scripts/{script_file.name}"
-                        else:
-                            target_file = target_in_scripts
-                            target_name = f"scripts/{script_file.name}"
+            for script_path in result["scripts"]:
+                script_file = Path(script_path)
+                # コピー先を決定（commons_scripts に同名ファイルがあればそちら優先）
+                target_in_commons = commons_scripts_dir / script_file.name
+                target_in_scripts = scripts_dir / script_file.name
+
+                if target_in_commons.exists() or script_file.name.startswith("manage_"):
+                    target_file = target_in_commons
+                    target_name = f"commons_scripts/{script_file.name}"
+                else:
+                    target_file = target_in_scripts
+                    target_name = f"scripts/{script_file.name}"
 
-                        if dry_run:
-                            print(f"  🔍 [DRY-RUN] スクリプト上書き予定: {target_name}")
-                        else:
-                            target_file.parent.mkdir(parents=True, exist_ok=True)
-                            shutil.copy2(script_file, target_file)
-                            print(f"  📜 スクリプト上書き: {target_name}")
-                        script_copy_count += 1
+                if dry_run:
+                    print(f"  🔍 [DRY-RUN] スクリプト上書き予定: {target_name}")
+                else:
+                    target_file.parent.mkdir(parents=True, exist_ok=True)
+                    _copy_file_if_changed(script_file, target_file)
+                    print(f"  📜 スクリプト上書き: {target_name}")
+                script_copy_count += 1
 
         except Exception as e:
-            print(f"❌ スキル変換失敗 {skill_dir.name}: {e}")
-            import traceback
-            traceback.print_exc()
+            print(f"❌ {label}スキル変換失敗 {skill_name}: {e}")
+            if result.get("traceback"):
+                # ワーカーで発生した例外は、ワーカー側のトレースバックを表示する
+                import sys
+                print(result["traceback"], end="", file=sys.stderr)
+            else:
+                import traceback
+                traceback.print_exc()
 
-    print(f"🎯 {'[DRY-RUN] ' if dry_run else ''}スキル→ルール変換{'予定' if dry_run else '完了'}: {success_count}/{len(skill_dirs)}")
+    print(f"🎯 {'[DRY-RUN] ' if dry_run else ''}{label}スキル→ルール変換{'予定' if dry_run else '完了'}: {success_count}/{len(skill_dirs)}")
     if script_copy_count > 0:
         print(f"📜 {'[DRY-RUN] ' if dry_run else ''}スクリプトコピー{'予定' if dry_run else '完了'}: {script_copy_count}ファイル")
 
     return success_count > 0
 
 
+def convert_skills_to_cursor(project_root: Path, dry_run: bool = False, jobs: int = 1) -> bool:
+    """
+    .claude/skills/*/SKILL.md → .cursor/rules/*.mdc 変換（逆変換。convert_env_skills_to_cursor を参照）
+    """
+    return convert_env_skills_to_cursor(project_root, "claude", dry_run=dry_run, jobs=jobs)
+
+
 def sync_commands_from_claude_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
     """
     .claude/commands/commands → .cursor/commands/commands 逆同期
     - 01/02分割は廃止（02_commandsは扱わない）
     """
-    import shutil
-
     claude_commands_dir = project_root / ".claude" / "commands"
     cursor_commands_dir = project_root / ".cursor" / "commands"
     src_commands_dir = claude_commands_dir / "commands"
@@ -1354,7 +1841,7 @@ def sync_commands_from_claude_to_cursor(project_root: Path, dry_run: bool = Fals
                         print(f"🔍 [DRY-RUN] 逆同期予定: {relative_path}")
                     else:
                         target_file.parent.mkdir(parents=True, exist_ok=True)
-                        shutil.copy2(source_file, target_file)
+                        _copy_file_if_changed(source_file, target_file)
                         print(f"📋 逆同期完了: {relative_path}")
 
                     copied_count += 1
@@ -1368,152 +1855,11 @@ def sync_commands_from_claude_to_cursor(project_root: Path, dry_run: bool = Fals
     return copied_count > 0
 
 
-def convert_codex_skills_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
+def convert_codex_skills_to_cursor(project_root: Path, dry_run: bool = False, jobs: int = 1) -> bool:
     """
-    .codex/skills/*/SKILL.md → .cursor/rules/*.mdc 変換（逆変換）
-
-    機能:
-    1. SKILL.md + questions/*.md + assets/*.md を統合して単一の .mdc ファイルに変換
-    2. スクリプトを scripts/ または commons_scripts/ にコピー（上書き）
-    3. パス参照を .cursor/rules 形式に変換
-
-    Args:
-        project_root: プロジェクトルートパス
-        dry_run: ドライラン（実際には書き込まない）
+    .codex/skills/*/SKILL.md → .cursor/rules/*.mdc 変換（逆変換。convert_env_skills_to_cursor を参照）
     """
-    import shutil
-
-    codex_skills_dir = project_root / ".codex" / "skills"
-    rules_dir = project_root / ".cursor" / "rules"
-    scripts_dir = project_root / "scripts"
-    commons_scripts_dir = project_root / "commons_scripts"
-
-    if not codex_skills_dir.exists():
-        print(f"⚠️ .codex/skillsディレクトリが見つかりません: {codex_skills_dir}")
-        return False
-
-    # スキルディレクトリ一覧を取得
-    skill_dirs = [d for d in codex_skills_dir.iterdir() if d.is_dir()]
-    if not skill_dirs:
-        print("⚠️ スキルディレクトリが見つかりません")
-        return False
-
-    print(f"📋 {len(skill_dirs)}個のCodexスキルディレクトリを発見")
-
-    if not dry_run:
-        rules_dir.mkdir(parents=True, exist_ok=True)
-        scripts_dir.mkdir(parents=True, exist_ok=True)
-
-    success_count = 0
-    script_copy_count = 0
-
-    for skill_dir in sorted(skill_dirs):
-        try:
-            skill_name = skill_dir.name  # 例: pmbok-executing
-            skill_file = skill_dir / "SKILL.md"
-
-            if not skill_file.exists():
-                print(f"⚠️ SKILL.mdが見つかりません: {skill_dir.name}")
-                continue
-
-            # スキル名からルール名を生成（ハイフン→アンダースコア）
-            rule_name = skill_name.replace('-', '_')
-
-            # 既存のルールファイルから番号プレフィックスを検出
-            existing_rules = list(rules_dir.glob(f"*_{rule_name}.mdc")) if rules_dir.exists() else []
-            if existing_rules:
-                rule_name = existing_rules[0].stem
-
-            # SKILL.md を読み込み
-            skill_content = skill_file.read_text(encoding='utf-8')
-            frontmatter, body = parse_frontmatter(skill_content)
-            description = frontmatter.get('description', f'Rule for {skill_name}')
-
-            # 統合コンテンツを構築
-            combined_sections = []
-            combined_sections.append(body)
-
-            # questions/*.md を統合
-            questions_dir = skill_dir / "questions"
-            if questions_dir.exists():
-                for q_file in sorted(questions_dir.glob("*.md")):
-                    q_content = q_file.read_text(encoding='utf-8')
-                    q_lines = q_content.splitlines()
-                    if q_lines and q_lines[0].startswith('#'):
-                        q_content = '\n'.join(q_lines[1:]).strip()
-                    combined_sections.append(f"\n{q_content}")
-
-            # assets/*.md を統合
-            assets_dir = skill_dir / "assets"
-            if assets_dir.exists():
-                for t_file in sorted(assets_dir.glob("*.md")):
-                    t_content = t_file.read_text(encoding='utf-8')
-                    t_lines = t_content.splitlines()
-                    if t_lines and t_lines[0].startswith('#'):
-                        t_content = '\n'.join(t_lines[1:]).strip()
-                    combined_sections.append(f"\n{t_content}")
-
-            # コンテンツを結合
-            combined_content = '\n\n'.join(combined_sections)
-
-            # パス参照を逆変換
-            combined_content = convert_agent_paths_to_mdc_paths(combined_content)
-
-            # skill_resources セクションを削除
-            combined_content = re.sub(
-                r'# ======== 関連リソース ========\nskill_resources:.*?(?=\n[a-z#]|\Z)',
-                '',
-                combined_content,
-                flags=re.DOTALL
-            )
-
-            # 新しいフロントマターを作成
-            new_frontmatter = create_cursor_frontmatter(rule_name, description)
-            rule_content = new_frontmatter + combined_content.strip()
-
-            rule_file = rules_dir / f"{rule_name}.mdc"
-
-            if dry_run:
-                print(f"🔍 [DRY-RUN] ルール作成予定: {rule_name} (from codex/{skill_name})")
-            else:
-                rule_file.write_text(rule_content, encoding='utf-8')
-                print(f"✅ ルール作成: {rule_name} (from codex/{skill_name})")
-
-            success_count += 1
-
-            # scripts/ 内のスクリプトをコピー（上書き）
-            skill_scripts_dir = skill_dir / "scripts"
-            if skill_scripts_dir.exists():
-                for script_file in skill_scripts_dir.glob("*"):
-                    if script_file.is_file():
-                        target_in_commons = commons_scripts_dir / script_file.name
-                        target_in_scripts = scripts_dir / script_file.name
-
-                        if target_in_commons.exists() or script_file.name.startswith("manage_"):
-                            target_file = target_in_commons
-                            target_name = f"commons_scripts/{script_file.name}"
-                        else:
-                            target_file = target_in_scripts
-                            target_name = f"scripts/{script_file.name}"
-
-                        if dry_run:
-                            print(f"  🔍 [DRY-RUN] スクリプト上書き予定: {target_name}")
-                        else:
-                            target_file.parent.mkdir(parents=True, exist_ok=True)
-                            shutil.copy2(script_file, target_file)
-                            print(f"  📜 スクリプト上書き: {target_name}")
-                        script_copy_count += 1
-
-        except Exception as e:
-            print(f"❌ Codexスキル変換失敗 {skill_dir.name}: {e}")
-            import traceback
-            traceback.print_exc()
-
-    print(f"🎯 {'[DRY-RUN] ' if dry_run else ''}Codexスキル→ルール変換{'予定' if dry_run else '完了'}: {success_count}/{len(skill_dirs)}")
-    if script_copy_count > 0:
-        print(f"📜 {'[DRY-RUN] ' if dry_run else ''}スクリプトコピー{'予定' if dry_run else '完了'}: {script_copy_count}ファイル")
-
-    return success_count > 0
+    return convert_env_skills_to_cursor(project_root, "codex", dry_run=dry_run, jobs=jobs)
 
 
 def sync_codex_prompts_to_cursor(project_root: Path, dry_run: bool = False) -> bool:
@@ -1521,8 +1867,6 @@ def sync_codex_prompts_to_cursor(project_root: Path, dry_run: bool = False) -> b
     .codex/prompts/commands → .cursor/commands/commands 逆同期
     - 01/02分割は廃止（02_commandsは扱わない）
     """
-    import shutil
-
     codex_prompts_dir = project_root / ".codex" / "prompts"
     cursor_commands_dir = project_root / ".cursor" / "commands"
     src_commands_dir = codex_prompts_dir / "commands"
@@ -1557,7 +1901,7 @@ def sync_codex_prompts_to_cursor(project_root: Path, dry_run: bool = False) -> b
                     print(f"🔍 [DRY-RUN] 逆同期予定: {relative_path}")
                 else:
                     target_file.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(source_file, target_file)
+                    _copy_file_if_changed(source_file, target_file)
                     print(f"📋 逆同期完了: {relative_path}")
 
                 copied_count += 1
@@ -1843,66 +2187,21 @@ def split_sections_by_type(sections: Dict[str, Dict]) -> Dict[str, Dict[str, str
     return result
 
 
-def build_skill_md(skill_name: str, description: str, sections: Dict[str, str], target_env: str = "claude",
-                   has_questions: bool = False, has_templates: bool = False, has_scripts: bool = False,
-                   question_files: list = None, template_files: list = None, script_files: list = None) -> str:
+def render_skill_md_template(skill_name: str, description: str, sections: Dict[str, str]) -> Tuple[str, str]:
     """
-    SKILL.md ファイルの内容を構築
-
-    Args:
-        skill_name: スキル名
-        description: 説明文
-        sections: スキルセクション（default/guide以外）
-        target_env: 対象環境 ("claude" | "codex" | "cursor")
-        has_questions: questions/ディレクトリが存在するか
-        has_templates: templates/ディレクトリが存在するか
-        has_scripts: scripts/ディレクトリが存在するか
-        question_files: questionsファイル名リスト
-        template_files: templatesファイル名リスト
-        script_files: scriptsファイル名リスト
+    SKILL.md のうち環境に依存しない部分（フロントマターとセクション本文）を組み立てる。
+    ルールごとに1回だけ呼び、環境ごとの差分は specialize_skill_md で差し込む
 
     Returns:
-        SKILL.md の内容
+        (フロントマター, セクション本文) のひな形
     """
-    lines = []
-
     # フロントマター（descriptionはコロンを含む可能性があるためクォート必須）
-    lines.append("---")
-    lines.append(f"name: {skill_name}")
     # descriptionに含まれる " を \" にエスケープしてダブルクォートで囲む
     escaped_desc = description.replace('"', '\\"')
-    lines.append(f'description: "{escaped_desc}"')
-    lines.append("---")
-    lines.append("")
-
-    # 環境別のpath_reference
-    if target_env == "claude":
-        lines.append('path_reference: "CLAUDE.md"')
-    else:  # codex / cursor
-        lines.append('path_reference: "AGENTS.md"')
-    lines.append("")
-
-    # 関連リソースのパス参照を追加（フルパス形式）
-    # 例: .claude/skills/pmbok-closing/questions/project_closure_questions.md
-    skill_base_path = f".{target_env}/skills/{skill_name}"
-    if has_questions or has_templates or has_scripts:
-        lines.append("# ======== 関連リソース ========")
-        lines.append("skill_resources:")
-        if has_questions and question_files:
-            lines.append("  questions:")
-            for qf in question_files:
-                lines.append(f'    - "{skill_base_path}/questions/{qf}"')
-        if has_templates and template_files:
-            lines.append("  assets:")
-            for tf in template_files:
-                lines.append(f'    - "{skill_base_path}/assets/{tf}"')
-        if has_scripts and script_files:
-            lines.append("  scripts:")
-            for sf in script_files:
-                lines.append(f'    - "{skill_base_path}/scripts/{sf}"')
-        lines.append("")
+    head = f'---\nname: {skill_name}\ndescription: "{escaped_desc}"\n---\n'
 
     # セクション内容（順序を保持）
+    lines = []
     for name, content in sections.items():
         if name == "_preamble":
             # preamble内のpath_reference行を削除してから追加
@@ -1917,15 +2216,16 @@ def build_skill_md(skill_name: str, description: str, sections: Dict[str, str],
             if content_stripped:
                 # contentが既にセクション名（YAMLキー行）を含んでいるかチェック
                 # コメント行で始まる場合も、中にYAMLキー行があれば既に含まれている
-                yaml_key_pattern = re.compile(rf'^{re.escape(name)}:\s*(\|)?', re.MULTILINE)
-                has_yaml_key = yaml_key_pattern.search(content_stripped)
+                # （行頭の「セクション名:」の有無だけを見るので、正規表現は使わない）
+                yaml_key = f"{name}:"
+                has_yaml_key = content_stripped.startswith(yaml_key) or f"\n{yaml_key}" in content_stripped
 
                 if has_yaml_key:
                     # 既にYAMLキー行を含んでいる → そのまま出力
                     lines.append(content_stripped)
                 else:
                     # YAMLキー行がない → セクション名をYAMLキーとして追加
-                    lines.append(f"{name}:")
+                    lines.append(yaml_key)
                     # インデントを追加（各行に2スペース）
                     for line in content_stripped.split('\n'):
                         if line.strip():
@@ -1938,7 +2238,76 @@ def build_skill_md(skill_name: str, description: str, sections: Dict[str, str],
                             lines.append("")
                 lines.append("")
 
-    return "\n".join(lines)
+    # 本文が空のときは区切りの改行も付けない（1つのリストを join していた頃と同じ出力にする）
+    body = "\n" + "\n".join(lines) if lines else ""
+    return head, body
+
+
+def specialize_skill_md(template: Tuple[str, str], skill_name: str, target_env: str = "claude",
+                        has_questions: bool = False, has_templates: bool = False, has_scripts: bool = False,
+                        question_files: list = None, template_files: list = None, script_files: list = None) -> str:
+    """
+    render_skill_md_template のひな形に、環境ごとの path_reference と関連リソースのパスを差し込んで
+    SKILL.md の内容を完成させる（引数は build_skill_md と同じ）
+    """
+    head, body = template
+
+    # 環境別のpath_reference
+    if target_env == "claude":
+        lines = ['path_reference: "CLAUDE.md"', ""]
+    else:  # codex / cursor
+        lines = ['path_reference: "AGENTS.md"', ""]
+
+    # 関連リソースのパス参照を追加（フルパス形式）
+    # 例: .claude/skills/pmbok-closing/questions/project_closure_questions.md
+    skill_base_path = f".{target_env}/skills/{skill_name}"
+    if has_questions or has_templates or has_scripts:
+        lines.append("# ======== 関連リソース ========")
+        lines.append("skill_resources:")
+        if has_questions and question_files:
+            lines.append("  questions:")
+            for qf in question_files:
+                lines.append(f'    - "{skill_base_path}/questions/{qf}"')
+        if has_templates and template_files:
+            lines.append("  assets:")
+            for tf in template_files:
+                lines.append(f'    - "{skill_base_path}/assets/{tf}"')
+        if has_scripts and script_files:
+            lines.append("  scripts:")
+            for sf in script_files:
+                lines.append(f'    - "{skill_base_path}/scripts/{sf}"')
+        lines.append("")
+
+    return head + "\n" + "\n".join(lines) + body
+
+
+def build_skill_md(skill_name: str, description: str, sections: Dict[str, str], target_env: str = "claude",
+                   has_questions: bool = False, has_templates: bool = False, has_scripts: bool = False,
+                   question_files: list = None, template_files: list = None, script_files: list = None) -> str:
+    """
+    SKILL.md ファイルの内容を構築
+    （複数の環境に書き出す場合は render_skill_md_template を1回呼び、specialize_skill_md を環境ごとに呼ぶ）
+
+    Args:
+        skill_name: スキル名
+        description: 説明文
+        sections: スキルセクション（default/guide以外）
+        target_env: 対象環境 ("claude" | "codex" | "cursor")
+        has_questions: questions/ディレクトリが存在するか
+        has_templates: templates/ディレクトリが存在するか
+        has_scripts: scripts/ディレクトリが存在するか
+        question_files: questionsファイル名リスト
+        template_files: templatesファイル名リスト
+        script_files: scriptsファイル名リスト
+
+    Returns:
+        SKILL.md の内容
+    """
+    return specialize_skill_md(
+        render_skill_md_template(skill_name, description, sections), skill_name, target_env,
+        has_questions=has_questions, has_templates=has_templates, has_scripts=has_scripts,
+        question_files=question_files, template_files=template_files, script_files=script_files,
+    )
 
 
 def build_single_question_md(skill_name: str, question_name: str, content: str) -> str:
@@ -1965,253 +2334,527 @@ def build_single_template_md(skill_name: str, template_name: str, content: str)
     return "\n".join(lines)
 
 
-def create_skills_from_mdc(
-    project_root: Path,
-    dry_run: bool = False,
-    target_rule: str = None,
-    preserve_content: bool = True,
-) -> bool:
-    """
-    .cursor/rules/*.mdc → .claude/skills/<skill-name>/ 変換（YAML形式検出）
-                       → .codex/skills/<skill-name>/ 変換
+PARSE_CACHE_DIR = ".sync-cache"
+# 解析キャッシュの上限サイズ（超えたら参照が古いものから削除する）
+PARSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
 
-    機能:
-    1. YAML形式セクション（xxx_template:, xxx_questions:等）による抽出
-    2. タイプ別ファイル分割（SKILL.md, questions/*.md, assets/*.md）
-    3. 使用スクリプトの検出・同梱
-    4. .claude/skills と .codex/skills の両方に転記
 
-    Args:
-        project_root: プロジェクトルートパス
-        dry_run: ドライラン（実際には書き込まない）
-        target_rule: 特定ルールのみ変換（例: "07_pmbok_executing"）
-    """
-    import shutil
+@functools.lru_cache(maxsize=None)
+def _transform_code_stamp() -> str:
+    """変換コード（このスクリプト自身）のハッシュ。コードが変われば解析キャッシュは全て無効になる"""
+    return _sha256_bytes(Path(__file__).read_bytes())
 
-    rules_dir = project_root / ".cursor" / "rules"
-    cursor_skills_dir = project_root / ".cursor" / "skills"
-    claude_skills_dir = project_root / ".claude" / "skills"
-    codex_skills_dir = project_root / ".codex" / "skills"
-    scripts_origin_dir = project_root / "scripts"
 
-    # 転記先ディレクトリのリスト
-    skills_dirs = [
-        (cursor_skills_dir, ".cursor/skills"),
-        (claude_skills_dir, ".claude/skills"),
-        (codex_skills_dir, ".codex/skills"),
-    ]
+def _parse_cache_path(project_root: Path, raw: bytes) -> Path:
+    """.mdc の内容ハッシュ + 変換コードのハッシュをキーにしたキャッシュファイルのパス"""
+    key = _sha256_bytes(_transform_code_stamp().encode("ascii") + b"\0" + raw)
+    return project_root / PARSE_CACHE_DIR / "mdc" / f"{key}.json"
 
-    if not rules_dir.exists():
-        print(f"❌ .cursor/rulesディレクトリが見つかりません: {rules_dir}")
-        return False
 
-    mdc_files = list(rules_dir.glob("*.mdc"))
-    if not mdc_files:
-        print("❌ .mdcファイルが見つかりません")
-        return False
+def load_parse_cache(path: Path) -> dict | None:
+    """解析キャッシュを読み込む（無い・壊れている場合は None）。参照したエントリは LRU 用に mtime を更新する"""
+    try:
+        entry = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
 
-    # 特定ルールのみ対象にする場合
-    if target_rule:
-        mdc_files = [f for f in mdc_files if target_rule in f.stem]
-        if not mdc_files:
-            print(f"❌ 指定ルール '{target_rule}' が見つかりません")
-            return False
 
-    print(f"📋 {len(mdc_files)}個の.mdcファイルをスキルへ変換開始（V2: YAML形式検出）")
-    print(f"📁 転記先: {', '.join([name for _, name in skills_dirs])}")
+def save_parse_cache(path: Path, entry: dict) -> None:
+    """解析キャッシュを書き込む（一時ファイル経由で置き換え、失敗しても処理は続行）"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 解析キャッシュ保存失敗: {e}")
+
+
+def prune_parse_cache(project_root: Path, max_bytes: int = PARSE_CACHE_MAX_BYTES) -> int:
+    """解析キャッシュが max_bytes を超えていれば、参照が古い（mtime が古い）ものから削除する。削除数を返す"""
+    cache_dir = project_root / PARSE_CACHE_DIR / "mdc"
+    if not cache_dir.is_dir():
+        return 0
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
 
-    # 既存のスキルディレクトリを全削除（リフレッシュ）
-    # スキルは「生成物」扱いとし、毎回の同期で完全一致させる（残骸を残さない）。
-    if not dry_run and not target_rule:  # 特定ルール指定時は削除しない
-        for skills_dir, dir_name in skills_dirs:
-            if skills_dir.exists():
-                deleted_count = 0
-                for skill_subdir in skills_dir.iterdir():
-                    if skill_subdir.is_dir():
-                        try:
-                            shutil.rmtree(skill_subdir)
-                            print(f"🗑️  スキル削除 ({dir_name}): {skill_subdir.name}")
-                            deleted_count += 1
-                        except Exception as e:
-                            print(f"⚠️  スキル削除失敗 ({dir_name}): {skill_subdir.name}: {e}")
-                if deleted_count > 0:
+
+FILE_HASH_CACHE_NAME = "file-hashes.json"
+FILE_HASH_CACHE_VERSION = 1
+
+
+def load_file_hash_cache(project_root: Path) -> dict:
+    """
+    ファイル内容ハッシュのメモ（.sync-cache/file-hashes.json）を読み込む。
+    (inode, size, mtime_ns) が記録と一致するファイルは、読み込まずに記録済みのハッシュを使う（_cached_file_hash）。
+    無い・壊れている・バージョン不一致の場合は空のメモから始める
+
+    構造（ファイル上）:
+        {"version": 1, "files": {path_key: [inode, size, mtime_ns, sha256]}}
+    """
+    cache = {"root": project_root, "files": {}, "seen": set(), "dirty": False}
+    try:
+        data = json.loads((project_root / PARSE_CACHE_DIR / FILE_HASH_CACHE_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return cache
+    if isinstance(data, dict) and data.get("version") == FILE_HASH_CACHE_VERSION and isinstance(data.get("files"), dict):
+        cache["files"] = data["files"]
+    return cache
+
+
+def save_file_hash_cache(cache: dict, prune: bool = True) -> None:
+    """
+    メモに変更があれば書き出す（一時ファイル経由で置き換え、失敗しても処理は続行）。
+    prune なら今回参照しなかったファイルの記録を捨てる。同期計画の記録中は書き出さない
+    """
+    if _sync_plan is not None:
+        return
+    files = cache["files"]
+    if prune:
+        unseen = files.keys() - cache["seen"]
+        for key in unseen:
+            del files[key]
+        cache["dirty"] = cache["dirty"] or bool(unseen)
+    if not cache["dirty"]:
+        return
+    path = cache["root"] / PARSE_CACHE_DIR / FILE_HASH_CACHE_NAME
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": FILE_HASH_CACHE_VERSION, "files": files}, sort_keys=True), encoding="utf-8"
+        )
+        os.replace(tmp_path, path)
+        cache["dirty"] = False
+    except OSError as e:
+        print(f"⚠️ ハッシュキャッシュ保存失敗: {e}")
+
+
+def _cached_file_hash(cache: dict, path: Path) -> str:
+    """path の内容ハッシュ。(inode, size, mtime_ns) が記録と同じなら読み込まない（無ければ OSError）"""
+    st = fs_stat(path)
+    key = _manifest_key(cache["root"], path)
+    cache["seen"].add(key)
+    state = [st.st_ino, st.st_size, st.st_mtime_ns]
+    entry = cache["files"].get(key)
+    if entry is not None and entry[:3] == state:
+        return entry[3]
+    digest = _file_sha256(path)
+    cache["files"][key] = state + [digest]
+    cache["dirty"] = True
+    return digest
+
+
+def _remember_file_hash(cache: dict, path: Path, digest: str) -> None:
+    """書き込んだ path の内容ハッシュを、現在の (inode, size, mtime_ns) と合わせて記録する"""
+    try:
+        st = fs_stat(path)
+    except OSError:
+        return
+    key = _manifest_key(cache["root"], path)
+    cache["seen"].add(key)
+    cache["files"][key] = [st.st_ino, st.st_size, st.st_mtime_ns, digest]
+    cache["dirty"] = True
+
+
+def _parse_mdc_for_skill(content: str) -> dict:
+    """
+    .mdc の内容をスキル生成用に解析する（フロントマター・セクション抽出・変換・タイプ別分割）。
+    結果は JSON で保存できる形で返し、解析キャッシュにそのまま格納する。
+
+    Returns:
+        {"description": フロントマターの description（無ければ None）,
+         "legacy": セクションマーカーが無く全体を1セクションとして扱ったか,
+         "section_count": セクション数,
+         "split": split_sections_by_type の結果}
+    """
+    frontmatter_dict, body = parse_frontmatter(content)
+
+    # path_reference 行を環境別に書き換え（後でディレクトリごとに適用）
+    # ここでは一旦削除し、各ディレクトリ処理時に追加
+
+    # # @section マーカーでセクション抽出
+    sections = extract_sections_v2(body)
+
+    legacy = not sections
+    if legacy:
+        # マーカーがない場合は全体を_preambleとして扱う
+        sections = {"_preamble": {"content": body.strip(), "type": "default"}}
+
+    for sec_name in sections:
+        # 現行のスキル生成では「スキルが読めること（実用）」を優先し、
+        # 正規化・不要セクション削除・パス変換を適用する（preserve_content に関わらず同じ変換）。
+        content = sections[sec_name]["content"]
+        content = convert_mdc_paths_to_agent_paths(content)
+        content = normalize_yaml_fields(content)
+        content = remove_unnecessary_sections(content)
+        sections[sec_name]["content"] = content
+
+    return {
+        "description": frontmatter_dict.get('description'),
+        "legacy": legacy,
+        "section_count": len(sections),
+        "split": split_sections_by_type(sections),
+    }
+
+
+def _render_rule_skill(skill_name: str, raw: bytes | None, parsed: dict | None, script_names: frozenset) -> dict:
+    """
+    1つのルールを解析し（parsed が None の場合のみ raw から）、スキルの各出力をエンコード済みのバイト列まで組み立てる。
+    書き込みは行わないため、プロセスプールのワーカーで実行できる（引数・戻り値とも pickle 可能）。
+
+    Returns:
+        {"parsed": 今回解析した結果（キャッシュから渡された場合は None）, "description": 説明, "legacy": 旧形式か,
+         "section_count": セクション数, "split_counts": タイプ別のセクション数, "scripts": 参照スクリプト（名前順）,
+         "skill_md": 環境 → SKILL.md, "questions": 名前 → questions/*.md, "templates": 名前 → assets/*.md,
+         "error": 失敗時のメッセージ, "traceback": 失敗時のトレースバック}
+        失敗時も、それまでに求めた値（解析結果・セクション数など）は残す
+    """
+    result = {"parsed": None, "legacy": False, "section_count": 0, "split_counts": None, "error": None}
+    try:
+        if parsed is None:
+            parsed = _parse_mdc_for_skill(_decode_text(raw))
+            result["parsed"] = parsed
+
+        description = parsed["description"]
+        if description is None:
+            description = f'{skill_name} skill'
+        if not description:
+            description = f"Skill for {skill_name}"
+
+        result["legacy"] = parsed["legacy"]
+        result["section_count"] = parsed["section_count"]
+
+        # タイプ別に分割済みの結果
+        split_result = parsed["split"]
+        result["split_counts"] = {sec_type: len(split_result[sec_type]) for sec_type in ["questions", "template", "skill"]}
+
+        # 参照されているスクリプト（大元が存在するもののみ、名前順）
+        referenced_scripts = sorted(
+            {
+                script_name
+                for sections in split_result.values()
+                for text in sections.values()
+                for script_name in SCRIPT_REFERENCE_PATTERN.findall(text)
+            }.intersection(script_names)
+        )
+        result["scripts"] = referenced_scripts
+
+        # 環境に依存しない出力は1回だけ組み立て、SKILL.md のみ環境ごとに仕上げる
+        skill_template = render_skill_md_template(skill_name, description, split_result["skill"])
+        question_docs = {
+            q_name: _encode_text(build_single_question_md(skill_name, q_name, q_content))
+            for q_name, q_content in split_result["questions"].items()
+        }
+        template_docs = {
+            t_name: _encode_text(build_single_template_md(skill_name, t_name, t_content))
+            for t_name, t_content in split_result["template"].items()
+        }
+        question_files = [f"{q_name}.md" for q_name in question_docs]
+        template_files = [f"{t_name}.md" for t_name in template_docs]
+        result["skill_md"] = {
+            target_env: _encode_text(specialize_skill_md(
+                skill_template, skill_name, target_env,
+                has_questions=bool(split_result["questions"]),
+                has_templates=bool(split_result["template"]),
+                has_scripts=bool(referenced_scripts),
+                question_files=question_files,
+                template_files=template_files,
+                script_files=referenced_scripts
+            ))
+            for target_env in ("cursor", "claude", "codex")
+        }
+        result["questions"] = question_docs
+        result["templates"] = template_docs
+    except Exception as e:
+        import traceback
+
+        result["error"] = str(e)
+        result["traceback"] = traceback.format_exc()
+    return result
+
+
+def create_skills_from_mdc(
+    project_root: Path,
+    dry_run: bool = False,
+    target_rule: str = None,
+    preserve_content: bool = True,
+    refresh_mode: str = "reconcile",
+    parse_cache: bool = True,
+    link_mode: str = "copy",
+    jobs: int = 1,
+) -> bool:
+    """
+    .cursor/rules/*.mdc → .claude/skills/<skill-name>/ 変換（YAML形式検出）
+                       → .codex/skills/<skill-name>/ 変換
+
+    機能:
+    1. YAML形式セクション（xxx_template:, xxx_questions:等）による抽出
+    2. タイプ別ファイル分割（SKILL.md, questions/*.md, assets/*.md）
+    3. 使用スクリプトの検出・同梱
+    4. .claude/skills と .codex/skills の両方に転記
+
+    Args:
+        project_root: プロジェクトルートパス
+        dry_run: ドライラン（実際には書き込まない）
+        target_rule: 特定ルールのみ変換（例: "07_pmbok_executing"）
+        refresh_mode: 既存スキルの扱い（全ルール変換時のみ）
+            - reconcile: 生成物と差分のあるファイルのみ書き込み、生成されなかった孤児ファイルのみ削除（デフォルト）
+            - replace  : 既存スキルディレクトリを全削除してから生成（旧挙動）
+            - staged   : reconcile と同じ（ステージングからの差し替えは skills/commands 同期のみ）
+        parse_cache: .mdc の解析結果を .sync-cache/ にキャッシュし、内容が変わっていないルールは解析を省略する
+        link_mode: 同梱スクリプトの配置方法（"copy" / "reflink" / "hardlink"、_place_file を参照）
+        jobs: 並列数（1 なら逐次）。jobs > 1 の場合、ルールの解析と出力の組み立て（_render_rule_skill）を
+            プロセスプールで並列に行う。読み込み・キャッシュ・書き込み・表示はルール名の順に親プロセスで行うため、
+            並列でも結果・表示順は変わらない
+    """
+    if refresh_mode not in REFRESH_MODES:
+        raise ValueError(f"Unknown refresh mode: {refresh_mode}")
+
+    rules_dir = project_root / ".cursor" / "rules"
+    cursor_skills_dir = project_root / ".cursor" / "skills"
+    claude_skills_dir = project_root / ".claude" / "skills"
+    codex_skills_dir = project_root / ".codex" / "skills"
+    scripts_origin_dir = project_root / "scripts"
+
+    # 転記先ディレクトリのリスト
+    skills_dirs = [
+        (cursor_skills_dir, ".cursor/skills"),
+        (claude_skills_dir, ".claude/skills"),
+        (codex_skills_dir, ".codex/skills"),
+    ]
+
+    if not fs_is_dir(rules_dir):
+        print(f"❌ .cursor/rulesディレクトリが見つかりません: {rules_dir}")
+        return False
+
+    mdc_files = [f for f in fs_list_files(rules_dir) if f.suffix == ".mdc"]
+    if not mdc_files:
+        print("❌ .mdcファイルが見つかりません")
+        return False
+
+    # 特定ルールのみ対象にする場合
+    if target_rule:
+        mdc_files = [f for f in mdc_files if target_rule in f.stem]
+        if not mdc_files:
+            print(f"❌ 指定ルール '{target_rule}' が見つかりません")
+            return False
+
+    print(f"📋 {len(mdc_files)}個の.mdcファイルをスキルへ変換開始（V2: YAML形式検出）")
+    print(f"📁 転記先: {', '.join([name for _, name in skills_dirs])}")
+
+    # 既存のスキルディレクトリを全削除（リフレッシュ）
+    # スキルは「生成物」扱いとし、毎回の同期で完全一致させる（残骸を残さない）。
+    # reconcile では削除せず、生成後に孤児ファイルのみ削除する（mtime・ページキャッシュを保つ）
+    reconcile = refresh_mode != "replace"
+    if not dry_run and not target_rule and not reconcile:  # 特定ルール指定時は削除しない
+        for skills_dir, dir_name in skills_dirs:
+            entries = _fs_entries(skills_dir)
+            if entries is not None:
+                deleted_count = 0
+                for name in sorted(entries[1]):
+                    try:
+                        _fs_rmtree(skills_dir / name)
+                        print(f"🗑️  スキル削除 ({dir_name}): {name}")
+                        deleted_count += 1
+                    except Exception as e:
+                        print(f"⚠️  スキル削除失敗 ({dir_name}): {name}: {e}")
+                if deleted_count > 0:
                     print(f"🧹 {dir_name} リフレッシュ完了: {deleted_count}個削除")
 
     success_count = 0
     section_stats = {"total_sections": 0, "questions": 0, "template": 0, "skill": 0}
-
+    # 転記先ごとの「今回生成したファイル」（reconcile で孤児判定に使う）
+    expected_outputs = {skills_dir: set() for skills_dir, _ in skills_dirs}
+    write_stats = {"written": 0, "unchanged": 0}
+    cache_stats = {"hit": 0, "miss": 0}
+
+    # スクリプト名 → 大元のパス（実行ごとに1回だけ作る）
+    script_sources, _ = index_script_sources(project_root)
+
+    def write_output(path: Path, data: bytes, skills_dir: Path) -> None:
+        # replace では既存スキルを削除済みのため、常に書き込みになる
+        expected_outputs[skills_dir].add(path)
+        changed = _write_bytes_if_changed(path, data)
+        write_stats["written" if changed else "unchanged"] += 1
+
+    # ルールごとの読み込みと解析キャッシュの参照（ルール名の順）。読み込みの失敗は表示順を保つため後で報告する
+    rules = []
     for mdc_file in sorted(mdc_files):
-        try:
-            filename = mdc_file.name
-            stem = mdc_file.stem
+        filename = mdc_file.name
 
-            # パスファイル自体はスキル化しない
-            if "paths" in filename.lower():
-                continue
+        # パスファイル自体はスキル化しない
+        if "paths" in filename.lower():
+            continue
 
-            # 00_master_rules はスキル化しない
-            if "00" in filename:
-                continue
+        # 00_master_rules はスキル化しない
+        if "00" in filename:
+            continue
 
-            # スキル名の決定
-            clean_name = re.sub(r'^\d+_', '', stem)
-            skill_name = clean_name.replace('_', '-').lower()
+        # スキル名の決定
+        clean_name = re.sub(r'^\d+_', '', mdc_file.stem)
+        skill_name = clean_name.replace('_', '-').lower()
 
-            # コンテンツ読み込み
-            content = mdc_file.read_text(encoding='utf-8')
-            frontmatter_dict, body = parse_frontmatter(content)
-            description = frontmatter_dict.get('description', f'{skill_name} skill')
-            if not description:
-                description = f"Skill for {skill_name}"
-
-
-            # path_reference 行を環境別に書き換え（後でディレクトリごとに適用）
-            # ここでは一旦削除し、各ディレクトリ処理時に追加
-
-            # # @section マーカーでセクション抽出
-            sections = extract_sections_v2(body)
-
-            if not sections:
-                print(f"⚠️ セクションマーカーなし: {filename}（旧形式として処理）")
-                # マーカーがない場合は全体を_preambleとして扱う
-                sections = {"_preamble": {"content": body.strip(), "type": "default"}}
-
-            for sec_name in sections:
-                content = sections[sec_name]["content"]
-                if preserve_content:
-                    # 現行のスキル生成では「スキルが読めること（実用）」を優先し、
-                    # 正規化・不要セクション削除・パス変換を適用する。
-                    # ※ここでの preserve_content は、生成物の構造（分割/統合）を保つ意味で使う。
-                    content = convert_mdc_paths_to_agent_paths(content)
-                    content = normalize_yaml_fields(content)
-                    content = remove_unnecessary_sections(content)
-                else:
-                    # 旧挙動（同じ）
-                    content = convert_mdc_paths_to_agent_paths(content)
-                    content = normalize_yaml_fields(content)
-                    content = remove_unnecessary_sections(content)
-                sections[sec_name]["content"] = content
+        # 内容が前回と同じなら解析キャッシュを使う（ワーカーには解析済みの結果だけを渡す）
+        rule = {"mdc_file": mdc_file, "skill_name": skill_name, "raw": None, "parsed": None,
+                "cache_path": None, "error": None}
+        try:
+            raw = mdc_file.read_bytes()
+            rule["cache_path"] = _parse_cache_path(project_root, raw) if parse_cache else None
+            if rule["cache_path"] is not None:
+                rule["parsed"] = load_parse_cache(rule["cache_path"])
+            if rule["parsed"] is None:
+                rule["raw"] = raw
+        except Exception as e:
+            rule["error"] = e
+        rules.append(rule)
+
+    # 解析と出力の組み立て（書き込みなし）。jobs > 1 ならプロセスプールで並列に行う
+    pending = [rule for rule in rules if rule["error"] is None]
+    tasks = (
+        [rule["skill_name"] for rule in pending],
+        [rule["raw"] for rule in pending],
+        [rule["parsed"] for rule in pending],
+        [frozenset(script_sources)] * len(pending),
+    )
+    if jobs > 1 and len(pending) > 1:
+        from concurrent.futures import ProcessPoolExecutor
 
-            # セクション統計
-            section_stats["total_sections"] += len(sections)
+        workers = min(jobs, len(pending))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # ルール1件ごとの受け渡しはプロセス間通信の方が重くなるため、ワーカーあたり数回に分けて渡す
+            rendered = list(pool.map(_render_rule_skill, *tasks, chunksize=max(1, len(pending) // (workers * 4))))
+    else:
+        rendered = list(map(_render_rule_skill, *tasks))
+    for rule, result in zip(pending, rendered):
+        rule["result"] = result
+
+    for rule in rules:
+        mdc_file = rule["mdc_file"]
+        skill_name = rule["skill_name"]
+        result = rule.get("result")
+        try:
+            if rule["error"] is not None:
+                raise rule["error"]
 
-            # タイプ別に分割
-            split_result = split_sections_by_type(sections)
+            if result["parsed"] is not None:
+                cache_stats["miss"] += 1
+                if rule["cache_path"] is not None and not dry_run:
+                    save_parse_cache(rule["cache_path"], result["parsed"])
+            elif rule["parsed"] is not None:
+                cache_stats["hit"] += 1
 
-            for sec_type in ["questions", "template", "skill"]:
-                section_stats[sec_type] += len(split_result[sec_type])
+            if result["legacy"]:
+                print(f"⚠️ セクションマーカーなし: {mdc_file.name}（旧形式として処理）")
 
-            # スクリプト検索ディレクトリ（複数）
-            scripts_search_dirs = [
-                project_root / "scripts",
-                project_root / "commons_scripts",
-            ]
+            # セクション統計
+            section_stats["total_sections"] += result["section_count"]
+            split_counts = result["split_counts"]
+            if split_counts is not None:
+                for sec_type, count in split_counts.items():
+                    section_stats[sec_type] += count
 
-            # スクリプトをskillフォルダにコピー（パス表記は変えない）
-            def copy_referenced_scripts(text: str, target_skill_dir: Path) -> None:
-                """テキスト内で参照されているスクリプトをコピー"""
-                # scripts/ と commons_scripts/ 両方のパターンをマッチ
-                script_pattern = r'(?:scripts|commons_scripts)/([\w\-]+\.(?:py|sh|ps1))'
-                matches = re.findall(script_pattern, text)
-
-                for script_name in set(matches):
-                    # 複数のディレクトリから検索
-                    for search_dir in scripts_search_dirs:
-                        src_script = search_dir / script_name
-                        if src_script.exists():
-                            skill_scripts_dir = target_skill_dir / "scripts"
-                            if not dry_run:
-                                skill_scripts_dir.mkdir(parents=True, exist_ok=True)
-                                shutil.copy2(src_script, skill_scripts_dir / script_name)
-                            break
+            if result["error"] is not None:
+                raise RuntimeError(result["error"])
+
+            referenced_scripts = result["scripts"]
 
             # --- 各転記先ディレクトリに対して処理 ---
             for skills_dir, dir_name in skills_dirs:
                 skill_dir = skills_dir / skill_name
 
-                if not dry_run:
-                    skill_dir.mkdir(parents=True, exist_ok=True)
-
-                # 1. 参照されているスクリプトをコピー（パス表記は変えない）
-                copied_scripts = []
-                for sec_type in split_result:
-                    for sec_name in split_result[sec_type]:
-                        copy_referenced_scripts(split_result[sec_type][sec_name], skill_dir)
-
-                # コピーされたスクリプトファイル名を取得
-                scripts_dir_path = skill_dir / "scripts"
-                if scripts_dir_path.exists():
-                    copied_scripts = [f.name for f in scripts_dir_path.glob("*") if f.is_file()]
-
-                # 2. ファイルリストを事前に準備
-                question_files = [f"{q_name}.md" for q_name in split_result["questions"].keys()]
-                template_files = [f"{t_name}.md" for t_name in split_result["template"].keys()]
-
-                # 3. SKILL.md 生成（環境に応じたpath_referenceを設定、リソースパスも追加）
                 if dir_name == ".cursor/skills":
                     target_env = "cursor"
                 elif dir_name == ".claude/skills":
                     target_env = "claude"
                 else:
                     target_env = "codex"
-                skill_content = build_skill_md(
-                    skill_name, description, split_result["skill"], target_env,
-                    has_questions=bool(split_result["questions"]),
-                    has_templates=bool(split_result["template"]),
-                    has_scripts=bool(copied_scripts),
-                    question_files=question_files,
-                    template_files=template_files,
-                    script_files=copied_scripts
-                )
+
+                if not dry_run:
+                    _fs_mkdir(skill_dir)
+
+                # 1. 参照されているスクリプトをskillフォルダに配置（パス表記は変えない、内容が同じならスキップ）
+                if referenced_scripts and not dry_run:
+                    skill_scripts_dir = skill_dir / "scripts"
+                    _fs_mkdir(skill_scripts_dir)
+                    for script_name in referenced_scripts:
+                        dst_script = skill_scripts_dir / script_name
+                        expected_outputs[skills_dir].add(dst_script)
+                        _copy_file_if_changed(
+                            script_sources[script_name][0], dst_script, _link_mode_for_env(target_env, link_mode),
+                        )
+
+                # 2. SKILL.md 書き込み（環境に応じたpath_reference・リソースパスは組み立て済み）
                 skill_file = skill_dir / "SKILL.md"
 
                 if dry_run:
-                    print(f"  🔍 [DRY-RUN] ({dir_name}) SKILL.md: {len(split_result['skill'])}セクション")
+                    print(f"  🔍 [DRY-RUN] ({dir_name}) SKILL.md: {split_counts['skill']}セクション")
                 else:
-                    skill_file.write_text(skill_content, encoding='utf-8')
+                    write_output(skill_file, result["skill_md"][target_env], skills_dir)
 
-                # 4. questions/*.md 生成（質問セクションがあれば、個別ファイルに分割）
-                if split_result["questions"]:
+                # 3. questions/*.md 書き込み（質問セクションがあれば、個別ファイルに分割）
+                if result["questions"]:
                     questions_dir = skill_dir / "questions"
                     if not dry_run:
-                        questions_dir.mkdir(parents=True, exist_ok=True)
+                        _fs_mkdir(questions_dir)
 
-                    for q_name, q_content in split_result["questions"].items():
-                        q_file_content = build_single_question_md(skill_name, q_name, q_content)
+                    for q_name, q_file_content in result["questions"].items():
                         q_file = questions_dir / f"{q_name}.md"
 
                         if dry_run:
                             print(f"  🔍 [DRY-RUN] ({dir_name}) questions/{q_name}.md")
                         else:
-                            q_file.write_text(q_file_content, encoding='utf-8')
+                            write_output(q_file, q_file_content, skills_dir)
 
-                # 5. assets/*.md 生成（テンプレートセクションがあれば、個別ファイルに分割）
-                if split_result["template"]:
+                # 4. assets/*.md 書き込み（テンプレートセクションがあれば、個別ファイルに分割）
+                if result["templates"]:
                     assets_dir = skill_dir / "assets"
                     if not dry_run:
-                        assets_dir.mkdir(parents=True, exist_ok=True)
+                        _fs_mkdir(assets_dir)
 
-                    for t_name, t_content in split_result["template"].items():
-                        t_file_content = build_single_template_md(skill_name, t_name, t_content)
+                    for t_name, t_file_content in result["templates"].items():
                         t_file = assets_dir / f"{t_name}.md"
 
                         if dry_run:
                             print(f"  🔍 [DRY-RUN] ({dir_name}) assets/{t_name}.md")
                         else:
-                            t_file.write_text(t_file_content, encoding='utf-8')
+                            write_output(t_file, t_file_content, skills_dir)
 
-                # 6. 古い paths.md があれば削除（旧バージョンの残骸対応）
+                # 5. 古い paths.md があれば削除（旧バージョンの残骸対応）
                 old_paths_md = skill_dir / "paths.md"
-                if old_paths_md.exists() and not dry_run:
-                    old_paths_md.unlink()
+                if not dry_run and fs_is_file(old_paths_md):
+                    _fs_unlink(old_paths_md)
                     print(f"  🗑️  ({dir_name}) 旧paths.md削除: {skill_name}")
 
             # 成功メッセージ
             files_created = ["SKILL.md"]
-            if split_result["questions"]:
-                files_created.append(f"questions/({len(split_result['questions'])})")
-            if split_result["template"]:
-                files_created.append(f"assets/({len(split_result['template'])})")
+            if split_counts["questions"]:
+                files_created.append(f"questions/({split_counts['questions']})")
+            if split_counts["template"]:
+                files_created.append(f"assets/({split_counts['template']})")
 
             if dry_run:
                 print(f"✅ [DRY-RUN] {skill_name}: {', '.join(files_created)}")
@@ -2222,10 +2865,30 @@ def create_skills_from_mdc(
 
         except Exception as e:
             print(f"❌ スキル変換失敗 {mdc_file.name}: {e}")
-            import traceback
-            traceback.print_exc()
+            if result is not None and result.get("traceback"):
+                # ワーカーで発生した例外は、ワーカー側のトレースバックを表示する
+                import sys
+                print(result["traceback"], end="", file=sys.stderr)
+            else:
+                import traceback
+                traceback.print_exc()
+
+    # reconcile: 今回生成されなかったファイル（削除されたルールの残骸など）のみ削除
+    if reconcile and not dry_run and not target_rule:
+        for skills_dir, dir_name in skills_dirs:
+            if not fs_is_dir(skills_dir):
+                continue
+            removed, _ = _reconcile_tree(skills_dir, expected_outputs[skills_dir], keep_root_files=True, label=dir_name)
+            if removed:
+                print(f"🧹 {dir_name} 差分反映: 孤児ファイル{removed}個削除")
 
     # サマリー出力
+    if not dry_run:
+        print(f"\n✍️  書き込み: {write_stats['written']} / 変更なし: {write_stats['unchanged']}")
+    if parse_cache:
+        evicted = 0 if dry_run else prune_parse_cache(project_root)
+        print(f"🗃️  解析キャッシュ: ヒット {cache_stats['hit']} / ミス {cache_stats['miss']}"
+              + (f" / 古いエントリ {evicted} 件削除" if evicted else ""))
     print(f"\n📊 セクション統計:")
     print(f"   総セクション数: {section_stats['total_sections']}")
     print(f"   - skill (default+guide): {section_stats['skill']}")
@@ -2337,7 +3000,7 @@ def update_master_files_only(
             original = source_file.read_text(encoding="utf-8")
             ensured = ensure_cursor_frontmatter(original)
             if ensured != original:
-                source_file.write_text(ensured, encoding="utf-8")
+                write_text_if_changed(source_file, ensured)
                 print("✅ master_rules.mdc: alwaysApply: true を保証しました")
         except Exception as e:
             print(f"⚠️ master_rules.mdcのalwaysApply保証に失敗: {e}")
@@ -2436,13 +3099,13 @@ def update_master_files_only(
                 print(f"🔍 [DRY-RUN] 更新予定: {output_file.name}")
             else:
                 create_output_file_if_not_exists(output_file)
-                output_file.write_text(file_content, encoding='utf-8')
+                changed = write_text_if_changed(output_file, file_content)
                 
                 try:
                     relative_path = output_file.relative_to(project_root)
-                    print(f"✅ 更新完了: {relative_path}")
                 except ValueError:
-                    print(f"✅ 更新完了: {output_file}")
+                    relative_path = output_file
+                print(f"✅ 更新完了: {relative_path}" if changed else f"⏭️  変更なし: {relative_path}")
             success_count += 1
             
         except Exception as e:
@@ -2465,7 +3128,15 @@ def update_master_files_only(
     return success_count > 0
 
 
-def sync_skills_and_commands(project_root: Path, source_platform: str):
+def sync_skills_and_commands(
+    project_root: Path,
+    source_platform: str,
+    manifest: dict | None = None,
+    refresh_mode: str = "reconcile",
+    jobs: int = 1,
+    changed: set | None = None,
+    link_mode: str = "copy",
+):
     """
     起点プラットフォームから他プラットフォームへ skills と commands を同期する。
 
@@ -2477,8 +3148,14 @@ def sync_skills_and_commands(project_root: Path, source_platform: str):
     Args:
         project_root: プロジェクトルート
         source_platform: 起点プラットフォーム ("claude", "cursor", "codex")
+        manifest: 差分同期用マニフェスト（None の場合は毎回全件を比較/再生成）
+        refresh_mode: 同期先の更新方法（"reconcile": 差分反映 / "replace": 全削除して再作成）
+        jobs: 並列数。2以上なら独立した同期先（環境）とファイル書き込みをスレッドプールで並列処理する
+              （表示順・集計は逐次実行と同じ）
+        changed: 変更のあったソースパスの集合（watch モード）。指定時はその出力のみを更新する
+        link_mode: 変換しない出力の配置方法（"copy" / "reflink" / "hardlink"、_place_file を参照）
     """
-    import shutil
+    from concurrent.futures import ThreadPoolExecutor
 
     # プラットフォーム別ディレクトリマッピング
     # skills/commands は cursor/claude/codex/github 間で同期
@@ -2520,27 +3197,7 @@ def sync_skills_and_commands(project_root: Path, source_platform: str):
 
     print(f"\n📦 スキル/コマンド同期開始 (起点: {platform})")
 
-    # skills 同期
-    _sync_directory(
-        source_dir=source_dirs["skills"],
-        targets=[platform_dirs[tp]["skills"] for tp in target_platforms],
-        target_names=[f".{tp}/skills" for tp in target_platforms],
-        target_envs=target_platforms,
-        source_name=f".{platform}/skills",
-        project_root=project_root,
-    )
-
-    # commands 同期 (codex/github は prompts へ変換)
-    # flat_copy=True: 直下のファイルのみコピー（サブディレクトリは無視）
-    _sync_directory(
-        source_dir=source_dirs["commands"],
-        targets=[platform_dirs[tp]["commands"] for tp in target_platforms],
-        target_names=[f".{tp}/{'prompts' if tp in ('codex', 'github') else 'commands'}" for tp in target_platforms],
-        target_envs=target_platforms,
-        source_name=f".{platform}/{'prompts' if platform in ('codex', 'github') else 'commands'}",
-        project_root=project_root,
-        flat_copy=True,
-    )
+    totals = {"written": 0, "unchanged": 0, "skipped": 0, "removed": 0}
 
     # opencode 同期: skills/agents/commands を更新
     # - skills   : 起点skills → .opencode/skills
@@ -2552,189 +3209,3522 @@ def sync_skills_and_commands(project_root: Path, source_platform: str):
     opencode_agent_dir = project_root / ".opencode" / "agent"
     opencode_command_dir = project_root / ".opencode" / "command"
 
+    # 互いに独立な同期（同じ段の中は並列実行してよい）
+    # 同じソースを読む同期（起点skills → .opencode/skills、commands → .opencode/command）は
+    # 1回の呼び出しにまとめ、ソースの走査・読み込みを1回で済ませる。
+    skills_targets = [platform_dirs[tp]["skills"] for tp in target_platforms]
+    skills_names = [f".{tp}/skills" for tp in target_platforms]
+    skills_envs = list(target_platforms)
     # 起点skills → .opencode/skills
-    if source_dirs["skills"].exists():
-        _sync_directory(
+    if fs_is_dir(source_dirs["skills"]):
+        skills_targets.append(opencode_skills_dir)
+        skills_names.append(".opencode/skills")
+        skills_envs.append("opencode")
+
+    commands_targets = [platform_dirs[tp]["commands"] for tp in target_platforms]
+    commands_names = [f".{tp}/{'prompts' if tp in ('codex', 'github') else 'commands'}" for tp in target_platforms]
+    commands_envs = list(target_platforms)
+    # .claude/commands → .opencode/command
+    # .claude/commands は起点 commands そのもの、または起点 commands の環境別変換結果（フラット）なので、
+    # 起点 commands から直接 opencode 向けに変換した結果と一致する。
+    commands_cover_opencode = fs_is_dir(source_dirs["commands"])
+    if commands_cover_opencode:
+        commands_targets.append(opencode_command_dir)
+        commands_names.append(".opencode/command")
+        commands_envs.append("opencode")
+
+    independent = [
+        # skills 同期
+        dict(
             source_dir=source_dirs["skills"],
-            targets=[opencode_skills_dir],
-            target_names=[".opencode/skills"],
-            target_envs=["opencode"],
+            targets=skills_targets,
+            target_names=skills_names,
+            target_envs=skills_envs,
             source_name=f".{platform}/skills",
-            project_root=project_root,
-        )
-
+        ),
+        # commands 同期 (codex/github は prompts へ変換)
+        # flat_copy=True: 直下のファイルのみコピー（サブディレクトリは無視）
+        dict(
+            source_dir=source_dirs["commands"],
+            targets=commands_targets,
+            target_names=commands_names,
+            target_envs=commands_envs,
+            source_name=f".{platform}/{'prompts' if platform in ('codex', 'github') else 'commands'}",
+            flat_copy=True,
+        ),
+    ]
     # .claude/agents → .opencode/agent
-    if claude_agents_dir.exists():
-        _sync_directory(
+    if fs_is_dir(claude_agents_dir):
+        independent.append(dict(
             source_dir=claude_agents_dir,
             targets=[opencode_agent_dir],
             target_names=[".opencode/agent"],
             target_envs=["opencode"],
             source_name=".claude/agents",
-            project_root=project_root,
             flat_copy=True,
-        )
+        ))
+
+    io_pool = call_pool = None
+    if jobs > 1:
+        # 同期呼び出し用とファイルI/O用でプールを分ける（待ち合わせによるデッドロックを避ける）
+        io_pool = ThreadPoolExecutor(max_workers=jobs)
+        call_pool = ThreadPoolExecutor(max_workers=len(independent))
+
+    def run_stage(calls: list) -> None:
+        # 同期計画の記録中は、呼び出しごとの位置に操作を記録する（並列でも計画は逐次実行と同じ順に並ぶ）
+        stage = _plan_stage()
+
+        def run_call(index: int, call: dict, call_log: list | None = None) -> dict:
+            with _plan_scope(*stage, index):
+                return _sync_directory(
+                    **call, project_root=project_root, manifest=manifest, refresh_mode=refresh_mode,
+                    executor=io_pool, log=call_log, changed=changed, link_mode=link_mode,
+                )
 
-    # .claude/commands → .opencode/command
-    if claude_commands_dir.exists():
-        _sync_directory(
-            source_dir=claude_commands_dir,
-            targets=[opencode_command_dir],
-            target_names=[".opencode/command"],
-            target_envs=["opencode"],
-            source_name=".claude/commands",
-            project_root=project_root,
-            flat_copy=True,
-        )
+        if call_pool is None:
+            results = [run_call(index, call) for index, call in enumerate(calls)]
+        else:
+            logs = [[] for _ in calls]
+            futures = [
+                call_pool.submit(run_call, index, call, call_log)
+                for index, (call, call_log) in enumerate(zip(calls, logs))
+            ]
+            results = []
+            # 出力は呼び出し順に並べて表示する（逐次実行時と同じ順序）
+            for future, call_log in zip(futures, logs):
+                results.append(future.result())
+                for line in call_log:
+                    print(line)
+        for stats in results:
+            for k in totals:
+                totals[k] += stats[k]
 
+    try:
+        run_stage(independent)
+
+        # 起点 commands が無い場合のみ、既存の .claude/commands → .opencode/command を個別に同期
+        if not commands_cover_opencode and fs_is_dir(claude_commands_dir):
+            run_stage([dict(
+                source_dir=claude_commands_dir,
+                targets=[opencode_command_dir],
+                target_names=[".opencode/command"],
+                target_envs=["opencode"],
+                source_name=".claude/commands",
+                flat_copy=True,
+            )])
+    finally:
+        if io_pool is not None:
+            io_pool.shutdown()
+            call_pool.shutdown()
+
+    print(
+        f"⏭️  同期結果: 書き込み {totals['written']} / 内容同一 {totals['unchanged']}"
+        f" / 変更なしでスキップ {totals['skipped']} / 削除 {totals['removed']}"
+    )
 
-def _sync_directory(
-    source_dir: Path,
-    targets: list,
-    target_names: list,
-    target_envs: list,
-    source_name: str,
-    project_root: Path,
-    flat_copy: bool = False,
-):
-    """
-    単一ディレクトリの同期を実行する内部関数。
-    ファイル内の path_reference やスキルパス参照も環境別に変換する。
 
-    Args:
-        source_dir: 起点ディレクトリ
-        targets: 同期先ディレクトリのリスト
-        target_names: 表示用の同期先名のリスト
-        target_envs: 同期先の環境名リスト ("claude", "cursor", "codex")
-        source_name: 表示用の起点名
-        project_root: プロジェクトルート
-        flat_copy: Trueの場合、直下のファイルのみコピー（サブディレクトリ無視）
+PROFILE_REPORT_NAME = ".sync-profile.json"
+_PROFILE_COUNTERS = ("stat", "scandir", "mkdir", "open_read", "open_write", "unlink", "rmtree")
+
+# --profile 有効時のみ dict（無効時は None のままで、計測フックも入れない）
+_profile_state = None
+
+
+def _read_proc_io() -> dict:
+    """/proc/self/io の読み書きバイト数（Linux 以外では空）"""
+    try:
+        with _profile_state["open"]("/proc/self/io", encoding="ascii") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return {"bytes_read": int(values["rchar"]), "bytes_written": int(values["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def _profile_snapshot() -> dict:
+    snapshot = dict(_profile_state["counters"])
+    snapshot.update(_read_proc_io())
+    return snapshot
+
+
+def enable_profiling() -> None:
     """
+    計測を有効にする。stat/scandir/mkdir/open/unlink/rmtree の呼び出しを数えるフックを入れ、
+    フェーズ（profile_phase）と同期先ごとの時間を記録し始める。
+    """
+    global _profile_state
+    import io
     import shutil
+    import builtins
+    import threading
 
-    if not source_dir.exists():
-        print(f"  ⚠️ {source_name} が存在しないためスキップ")
+    if _profile_state is not None:
         return
+    lock = threading.Lock()
+    counters = {name: 0 for name in _PROFILE_COUNTERS}
+    originals = {
+        (os, "stat"): os.stat,
+        (os, "lstat"): os.lstat,
+        (os, "scandir"): os.scandir,
+        (os, "mkdir"): os.mkdir,
+        (os, "unlink"): os.unlink,
+        (os, "remove"): os.remove,
+        (shutil, "rmtree"): shutil.rmtree,
+        (builtins, "open"): builtins.open,
+        (io, "open"): io.open,
+    }
 
-    # ソースのファイル一覧を取得
-    if flat_copy:
-        # 直下のファイルのみ（サブディレクトリは無視）
-        source_files = [f for f in source_dir.iterdir() if f.is_file()]
-    else:
-        # サブディレクトリ含む全ファイル
-        source_files = [f for f in source_dir.rglob("*") if f.is_file()]
+    def counted(name: str, fn):
+        def wrapper(*args, **kwargs):
+            with lock:
+                counters[name] += 1
+            return fn(*args, **kwargs)
+        return wrapper
+
+    original_open = builtins.open
+
+    def counted_open(file, mode="r", *args, **kwargs):
+        with lock:
+            counters["open_write" if any(flag in mode for flag in "wax+") else "open_read"] += 1
+        return original_open(file, mode, *args, **kwargs)
+
+    _profile_state = {
+        "counters": counters,
+        "originals": originals,
+        "open": original_open,
+        "lock": lock,
+        "phases": {},
+        "targets": {},
+    }
+    _profile_state["start"] = (time.perf_counter(), time.process_time(), _profile_snapshot())
 
-    file_count = len(source_files)
+    os.stat = counted("stat", os.stat)
+    os.lstat = counted("stat", os.lstat)
+    os.scandir = counted("scandir", os.scandir)
+    os.mkdir = counted("mkdir", os.mkdir)
+    os.unlink = counted("unlink", os.unlink)
+    os.remove = counted("unlink", os.remove)
+    shutil.rmtree = counted("rmtree", shutil.rmtree)
+    builtins.open = counted_open
+    io.open = counted_open
 
-    if file_count == 0:
-        print(f"  ⚠️ {source_name} にファイルがないためスキップ")
-        return
 
-    print(f"  📁 {source_name} ({file_count} ファイル)")
+def disable_profiling() -> dict | None:
+    """
+    計測フックを外し、レポート（JSON に書ける dict）を返す。有効でなければ None（何度呼んでもよい）。
+    enable_profiling した呼び出し側は、例外・中断でも必ずこれ（または write_profile_report）を呼ぶこと
+    """
+    global _profile_state
+    state = _profile_state
+    if state is None:
+        return None
+    wall0, cpu0, io0 = state["start"]
+    total = {
+        "wall": time.perf_counter() - wall0,
+        "cpu": time.process_time() - cpu0,
+        **{key: value - io0.get(key, 0) for key, value in _profile_snapshot().items()},
+    }
+    for (module, name), fn in state["originals"].items():
+        setattr(module, name, fn)
+    _profile_state = None
+
+    def rows(table: dict) -> list:
+        return sorted(({"name": name, **values} for name, values in table.items()), key=lambda r: -r["wall"])
+
+    return {
+        "platform": platform.system(),
+        "total": total,
+        "phases": rows(state["phases"]),
+        "targets": rows(state["targets"]),
+    }
 
-    for target_dir, target_name, target_env in zip(targets, target_names, target_envs):
-        try:
-            # ターゲットディレクトリを完全リフレッシュ（既存を削除してから作成）
-            if target_dir.exists():
-                import shutil
-                shutil.rmtree(target_dir)
-                print(f"    🧹 {target_name} をリフレッシュ")
-            target_dir.mkdir(parents=True, exist_ok=True)
-
-            # ソースからターゲットへコピー（パス参照を変換）
-            copied_count = 0
-            for item in source_files:
-                if flat_copy:
-                    # フラットコピー: ファイル名のみ使用
-                    dest = target_dir / item.name
-                else:
-                    # 構造維持コピー: 相対パスを保持
-                    relative = item.relative_to(source_dir)
-                    dest = target_dir / relative
-                    dest.parent.mkdir(parents=True, exist_ok=True)
 
-                # テキストファイルの場合はパス参照を変換
-                if item.suffix in ['.md', '.mdc', '.yaml', '.yml', '.txt']:
-                    try:
-                        content = item.read_text(encoding='utf-8')
-                        # 環境別にパス参照を変換
-                        content = transform_skill_text(content, target_env)
-                        dest.write_text(content, encoding='utf-8')
-                    except Exception:
-                        # 読み取りエラーの場合はバイナリコピー
-                        shutil.copy2(item, dest)
-                else:
-                    shutil.copy2(item, dest)
-                copied_count += 1
+@contextlib.contextmanager
+def profile_phase(name: str):
+    """フェーズの wall/CPU 時間と I/O 呼び出し数を記録する（--profile 無効時は何もしない）"""
+    state = _profile_state
+    if state is None:
+        yield
+        return
+    wall0, cpu0, io0 = time.perf_counter(), time.process_time(), _profile_snapshot()
+    try:
+        yield
+    finally:
+        io1 = _profile_snapshot()
+        entry = state["phases"].setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        entry["wall"] += time.perf_counter() - wall0
+        entry["cpu"] += time.process_time() - cpu0
+        entry["calls"] += 1
+        for key, value in io1.items():
+            entry[key] = entry.get(key, 0) + value - io0.get(key, 0)
+
+
+def _profile_clock():
+    """同期先ごとの計測開始点（--profile 無効時は None）"""
+    if _profile_state is None:
+        return None
+    return time.perf_counter(), time.thread_time()
+
+
+def _profile_target(name: str, began, files: int = 1) -> None:
+    """_profile_clock() からの経過時間を同期先 name に加算する（スレッドごとの CPU 時間）"""
+    if began is None or _profile_state is None:
+        return
+    wall = time.perf_counter() - began[0]
+    cpu = time.thread_time() - began[1]
+    with _profile_state["lock"]:
+        entry = _profile_state["targets"].setdefault(name, {"wall": 0.0, "cpu": 0.0, "files": 0})
+        entry["wall"] += wall
+        entry["cpu"] += cpu
+        entry["files"] += files
+
+
+def write_profile_report(path: Path) -> dict | None:
+    """計測を終了し、要約を表示して JSON レポートを保存する"""
+    report = disable_profiling()
+    if report is None:
+        return None
+    print_profile_summary(report)
+    try:
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 プロファイル結果を保存しました: {path}")
+    except OSError as e:
+        print(f"⚠️ プロファイル結果の保存に失敗: {e}")
+    return report
+
+
+def print_profile_summary(report: dict) -> None:
+    """プロファイル結果の要約（時間の長い順）"""
+    total = report["total"]
+    wall_total = total["wall"] or 1e-9
+
+    def pad(text: str, width: int) -> str:
+        # 全角文字を2桁として揃える
+        import unicodedata
+        used = sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+        return text + " " * max(width - used, 0)
+
+    def io_text(values: dict) -> str:
+        text = " ".join(f"{key}={values.get(key, 0)}" for key in _PROFILE_COUNTERS)
+        if "bytes_read" in values:
+            text += f" 読込={values['bytes_read'] / 1e6:.2f}MB 書込={values['bytes_written'] / 1e6:.2f}MB"
+        return text
+
+    print(f"\n⏱️  プロファイル（合計 wall {total['wall']:.3f}s / CPU {total['cpu']:.3f}s）")
+    print(f"   I/O: {io_text(total)}")
+    for row in report["phases"]:
+        print(
+            f"   {row['wall'] / wall_total * 100:5.1f}%  {pad(row['name'], 24)} wall {row['wall']:.3f}s"
+            f" / CPU {row['cpu']:.3f}s  {io_text(row)}"
+        )
+    if report["targets"]:
+        print("   同期先別（ファイル単位の変換・書き込み時間の合計）:")
+        for row in report["targets"]:
+            print(
+                f"     {pad(row['name'], 36)} wall {row['wall']:.3f}s / CPU {row['cpu']:.3f}s"
+                f"  ({row['files']} 件)"
+            )
 
-            print(f"    ✅ → {target_name} ({copied_count} ファイル)")
-        except Exception as e:
-            print(f"    ❌ → {target_name} エラー: {e}")
 
-def main():
-    """
-    スクリプトのエントリーポイント
-    """
-    parser = argparse.ArgumentParser(description='起点別の単方向同期 + マスター波及スクリプト')
-    parser.add_argument(
-        '--source',
-        choices=['cursor', 'claude', 'codex'],
-        default='claude',
-        help='''同期の起点を指定（デフォルト: claude）:
-  claude  : .claude/{skills,commands} → .cursor/.codex + マスター波及（CLAUDE.md起点）
-  codex   : .codex/{skills,prompts}  → .cursor/.claude + マスター波及（AGENTS.md起点）
-  cursor  : .cursor/{skills,commands}→ .claude/.codex + マスター波及（master_rules.mdc起点）''',
-    )
-    parser.add_argument('--dry-run', action='store_true',
-                        help='実際の変換を行わず、処理内容を表示のみ')
-    parser.add_argument('--force', action='store_true',
-                        help='確認なしで実行')
-    parser.add_argument(
-        '--legacy-transform',
-        action='store_true',
-        help='旧来の正規化/不要セクション削除/パス書き換えを有効化（互換より変換優先）',
-    )
-    # 互換（過去の変換仕様）: 現状は preserve_content のみ切替に使用
+SYNC_MANIFEST_NAME = ".sync-manifest.json"
+# 出力内容に影響する変換ロジックを変更したら上げる（古いマニフェストを無効化するため）
+SYNC_MANIFEST_VERSION = 1
 
-    args = parser.parse_args()
 
-    # --source が未指定の場合は選択を促す
-    if args.source is None:
-        print("\n⚠️  起点（--source）が指定されていません。")
-        print("現在編集しているファイル群を起点として指定してください:\n")
-        print("  --source cursor : Cursor (.cursor/) を起点に他環境へ同期")
-        print("  --source claude : Claude (.claude/) を起点に他環境へ同期")
-        print("  --source codex  : Codex (.codex/) を起点に他環境へ同期")
-        print("\n例: python scripts/update_agent_master.py --source cursor --force")
-        return 1
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
-    try:
-        project_root = get_root_directory()
 
-        if not project_root.exists():
-            print(f"❌ プロジェクトルートディレクトリが存在しません: {project_root}")
-            return 1
+def _encode_text(text: str) -> bytes:
+    """write_text(encoding="utf-8") がディスクに書き出すのと同じバイト列を返す（改行コード変換を含む）"""
+    if os.linesep != "\n":
+        text = text.replace("\n", os.linesep)
+    return text.encode("utf-8")
 
-        print(f"\n🔄 起点別の同期・マスター波及スクリプト開始")
-        print(f"🖥️  プラットフォーム: {platform.system()}")
-        print(f"📍 変換方向: {args.source}")
-        print(f"🔍 ドライラン: {args.dry_run}")
-        preserve_content = not args.legacy_transform
 
-        if not args.force and not args.dry_run:
-            print(f"\n⚠️  既存ファイルが上書きされます。続行しますか？ (y/N): ", end="")
-            if input().lower() != 'y':
-                print("処理を中止しました。")
-                return 0
+def _manifest_key(project_root: Path, path: Path) -> str:
+    """マニフェストのキー（プロジェクトルートからの相対POSIXパス）"""
+    # 出力ごとに何度も呼ばれるため、よくある「ルート配下」の場合は文字列の前方一致で済ませる
+    root = os.fspath(project_root)
+    key = os.fspath(path)
+    if key.startswith(root) and key[len(root):len(root) + 1] == os.sep and not root.endswith(os.sep):
+        key = key[len(root) + 1:]
+        return key.replace(os.sep, "/") if os.sep != "/" else key
+    path = Path(path)
+    try:
+        return path.relative_to(project_root).as_posix()
+    except ValueError:
+        return path.as_posix()
 
-        success = False
 
-        def run_simple(origin: str) -> bool:
-            """
-            Claude / Codex / Cursor を起点に、他環境へ同期する。
-            - 先にマスター波及（起点マスターを明示）
-            - 次に skills/commands(prompts) を同期（非破壊上書き）
-            - 最後に埋め込みスクリプトを更新（codexは権限事情で除外）
+def load_sync_manifest(project_root: Path) -> dict:
+    """
+    差分同期用マニフェスト（.sync-manifest.json）を読み込む。
+    存在しない・壊れている・バージョン不一致の場合は空のマニフェストを返す（＝全件再生成）。
+
+    構造:
+        {
+          "version": 1,
+          "sources": {src_key: {"sha256", "size", "mtime_ns"}},
+          "outputs": {out_key: {"source", "source_sha256", "sha256", "size", "mtime_ns"}},
+        }
+    メモリ上では "dirty"（読み込み後に内容が変わったか）も持ち、save_sync_manifest は変更が無ければ書き出さない
+    """
+    empty = {"version": SYNC_MANIFEST_VERSION, "sources": {}, "outputs": {}}
+    manifest_path = project_root / SYNC_MANIFEST_NAME
+    if not manifest_path.exists():
+        return empty
+    try:
+        data = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ マニフェスト読み込み失敗（全件再生成します）: {e}")
+        return empty
+    if not isinstance(data, dict) or data.get("version") != SYNC_MANIFEST_VERSION:
+        return empty
+    data.setdefault("sources", {})
+    data.setdefault("outputs", {})
+    return data
+
+
+def save_sync_manifest(project_root: Path, manifest: dict) -> None:
+    """
+    マニフェストに変更があれば書き出す（一時ファイル経由で置き換え、参照されないソース情報は削除、区切りの空白なし）。
+    変更があっても、書き出す内容が既存ファイルと同じなら書き込まない。
+    同期計画の記録中は書き出さない（計画を適用した出力は size / mtime が記録と合わないため、次回の実行で比較し直される）
+    """
+    if _sync_plan is not None:
+        return
+    referenced = {entry.get("source") for entry in manifest["outputs"].values()}
+    sources = {k: v for k, v in manifest["sources"].items() if k in referenced}
+    if len(sources) != len(manifest["sources"]):
+        manifest["sources"] = sources
+        _manifest_mark_dirty(manifest)
+    if not manifest.get("dirty"):
+        return
+    manifest_path = project_root / SYNC_MANIFEST_NAME
+    data = json.dumps(
+        {"version": manifest["version"], "sources": manifest["sources"], "outputs": manifest["outputs"]},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")
+    # 出力と同じく、内容が同じなら書き込まない（mtime を変えない）
+    if _has_same_bytes(manifest_path, data):
+        manifest["dirty"] = False
+        return
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, manifest_path)
+        _fs_note_file(manifest_path)
+        manifest["dirty"] = False
+    except OSError as e:
+        print(f"⚠️ マニフェスト保存失敗: {e}")
+
+
+def _manifest_mark_dirty(manifest: dict) -> None:
+    """マニフェストに変更があったことを記録する（save_sync_manifest が書き出す）"""
+    manifest["dirty"] = True
+
+
+def _manifest_drop_output(manifest: dict, key: str) -> None:
+    """出力の記録を削除する（記録が無ければ何もしない）"""
+    if manifest["outputs"].pop(key, None) is not None:
+        _manifest_mark_dirty(manifest)
+
+
+def _manifest_source_hash(manifest: dict, project_root: Path, path: Path) -> str:
+    """
+    ソースファイルのハッシュを返す。
+    size と mtime_ns が前回と一致する場合は記録済みのハッシュを再利用し、読み込みを省略する。
+    """
+    key = _manifest_key(project_root, path)
+    st = fs_stat(path)
+    entry = manifest["sources"].get(key)
+    if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+        return entry["sha256"]
+    digest = _file_sha256(path)
+    manifest["sources"][key] = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    _manifest_mark_dirty(manifest)
+    return digest
+
+
+def _manifest_output_is_fresh(manifest: dict, project_root: Path, source: Path, source_hash: str, dest: Path) -> bool:
+    """出力が前回同期時から変わっておらず、ソースのハッシュも同じなら True"""
+    entry = manifest["outputs"].get(_manifest_key(project_root, dest))
+    if not entry:
+        return False
+    if entry.get("source") != _manifest_key(project_root, source) or entry.get("source_sha256") != source_hash:
+        return False
+    try:
+        st = fs_stat(dest)
+    except OSError:
+        return False
+    return st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+
+
+def _manifest_record_output(
+    manifest: dict,
+    project_root: Path,
+    source: Path,
+    source_hash: str,
+    dest: Path,
+    data: bytes | None = None,
+    written_path: Path | None = None,
+    sha256: str | None = None,
+) -> None:
+    """
+    書き込んだ出力をマニフェストに記録する（data・sha256 とも省略時は出力ファイルを読み直してハッシュを取る）。
+    written_path は実際に書き込んだパス（staged ではステージング側。rename 後も mtime は変わらない）
+    sha256 はストリーム変換した出力のように、内容をバイト列で持たない場合に渡す
+    """
+    written_path = written_path or dest
+    if sha256 is None:
+        sha256 = _sha256_bytes(data) if data is not None else _file_sha256(written_path)
+    st = fs_stat(written_path)
+    key = _manifest_key(project_root, dest)
+    entry = {
+        "source": _manifest_key(project_root, source),
+        "source_sha256": source_hash,
+        "sha256": sha256,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+    if manifest["outputs"].get(key) != entry:
+        manifest["outputs"][key] = entry
+        _manifest_mark_dirty(manifest)
+
+
+def _manifest_outputs_under(manifest: dict, project_root: Path, target_dir: Path) -> list[str]:
+    """target_dir 配下としてマニフェストに記録されている出力キーの一覧"""
+    prefix = _manifest_key(project_root, target_dir).rstrip("/") + "/"
+    # 並列同期中に他スレッドが追記しても壊れないよう、キー一覧を先に複製してから走査する
+    return [key for key in list(manifest["outputs"]) if key.startswith(prefix)]
+
+
+def _manifest_has_outputs_under(manifest: dict, project_root: Path, target_dir: Path) -> bool:
+    """target_dir 配下の出力がマニフェストに1件でも記録されているか（見つかった時点で打ち切る）"""
+    prefix = _manifest_key(project_root, target_dir).rstrip("/") + "/"
+    return any(key.startswith(prefix) for key in list(manifest["outputs"]))
+
+
+# 実行単位のファイルシステム索引（fs_index_begin 〜 fs_index_end の間だけ有効）。
+# 無効なとき（watch の待機中・ライブラリとしての利用時）は、各関数とも従来どおりファイルシステムを直接参照する
+_fs_index = None
+
+
+def fs_index_begin() -> None:
+    """
+    実行単位のファイルシステム索引を有効にする。
+
+    ディレクトリの一覧は最初に問い合わせたときに os.scandir で1回だけ読み、ファイルの stat も1回だけ取って保持する。
+    以降の走査（_scan_tree / fs_list_files）・存在確認（fs_is_dir / fs_is_file）・stat（fs_stat）は索引から返し、
+    mkdir も索引で存在が分かっているディレクトリには発行しない（_fs_mkdir）。
+    本スクリプト自身の書き込み・削除は _fs_note_file / _fs_note_removed / _fs_forget で索引に反映する。
+    実行中に外部（エディタや他プロセス）が加えた変更は反映しないため、有効にするのは1回の同期の間だけにする。
+    索引に対応していない関数（.cursor 側への逆変換など）は、索引が有効な間に呼ばないこと。
+    """
+    global _fs_index
+    # orphans: 親ディレクトリの一覧からたどれない登録済みパス（_fs_forget で配下を捨てるときに使う）
+    _fs_index = {"listings": {}, "orphans": set(), "lock": threading.RLock(), "scans": 0}
+
+
+def fs_index_end() -> dict | None:
+    """索引を無効にし、集計（走査したディレクトリ数）を返す。有効でなければ None"""
+    global _fs_index
+    index, _fs_index = _fs_index, None
+    if index is None:
+        return None
+    return {"scanned_dirs": index["scans"]}
+
+
+def _fs_read_dir(path) -> dict | None:
+    """
+    ディレクトリ1つを os.scandir で読む（存在しない・読めない場合は None）。
+    files: 通常ファイル（シンボリックリンク先を含む）名 → stat（未取得なら None）
+    dirs : サブディレクトリ名（シンボリックリンクは含まない）
+    other: それ以外（ディレクトリへのシンボリックリンク、リンク切れ等）
+    """
+    listing = {"files": {}, "dirs": set(), "other": set()}
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    listing["dirs"].add(entry.name)
+                elif entry.is_file():
+                    listing["files"][entry.name] = None
+                else:
+                    listing["other"].add(entry.name)
+    except OSError:
+        return None
+    return listing
+
+
+def _fs_listing(index: dict, key: str) -> dict | None:
+    """
+    索引上のディレクトリ key（パス文字列）の一覧（未読なら読み込んで登録する）。index["lock"] を保持して呼ぶ。
+    索引のキーは Path ではなく文字列にする（Path のハッシュ計算は走査全体で見ると無視できないため）
+    """
+    listings = index["listings"]
+    listing = listings.get(key, False)
+    if listing is False:
+        listing = listings[key] = _fs_read_dir(key)
+        index["scans"] += 1
+        parent_key, name = os.path.split(key)
+        parent = listings.get(parent_key)
+        if not parent or name not in parent["dirs"]:
+            index["orphans"].add(key)
+    return listing
+
+
+def _fs_entries(path) -> tuple[list, list, list] | None:
+    """path 直下の (ファイル名, ディレクトリ名, その他の名前) の一覧。ディレクトリでなければ None"""
+    index = _fs_index
+    if index is None:
+        listing = _fs_read_dir(path)
+        if listing is None:
+            return None
+        return list(listing["files"]), list(listing["dirs"]), list(listing["other"])
+    with index["lock"]:
+        listing = _fs_listing(index, os.fspath(path))
+        if listing is None:
+            return None
+        # 他スレッドの書き込みと競合しないよう、ロック内で複製して返す
+        return list(listing["files"]), list(listing["dirs"]), list(listing["other"])
+
+
+def _fs_walk(root: Path):
+    """root 以下の各ディレクトリについて (パス文字列, ファイル名, ディレクトリ名, その他の名前) を返す"""
+    stack = [os.fspath(root)]
+    while stack:
+        current = stack.pop()
+        entries = _fs_entries(current)
+        if entries is None:
+            continue
+        names, subdirs, others = entries
+        yield current, names, subdirs, others
+        stack.extend(os.path.join(current, name) for name in subdirs)
+
+
+def fs_list_files(root: Path, recursive: bool = False) -> list[Path]:
+    """
+    root 直下（recursive=True なら配下すべて）の通常ファイルをパス順に返す。
+    Path.iterdir() / rglob("*") に is_file() を掛けた結果と同じ（ディレクトリへのシンボリックリンクはたどらない）
+    """
+    if not recursive:
+        entries = _fs_entries(root)
+        return sorted(root / name for name in entries[0]) if entries else []
+    return sorted(
+        Path(os.path.join(current, name)) for current, names, _, _ in _fs_walk(root) for name in names
+    )
+
+
+def fs_is_dir(path: Path) -> bool:
+    """Path.is_dir() と同じ（索引が有効なら索引から答える）"""
+    index = _fs_index
+    if index is None:
+        return path.is_dir()
+    key = os.fspath(path)
+    with index["lock"]:
+        own = index["listings"].get(key, False)
+        if own is not False:
+            return own is not None
+        parent_key, name = os.path.split(key)
+        listing = _fs_listing(index, parent_key)
+        if listing is None:
+            return False
+        if name in listing["dirs"]:
+            return True
+    # ディレクトリへのシンボリックリンク等は実体を確認する
+    return name in listing["other"] and path.is_dir()
+
+
+def fs_is_file(path: Path) -> bool:
+    """Path.is_file() と同じ（索引が有効なら索引から答える）"""
+    index = _fs_index
+    if index is None:
+        return path.is_file()
+    parent_key, name = os.path.split(os.fspath(path))
+    with index["lock"]:
+        listing = _fs_listing(index, parent_key)
+        return listing is not None and name in listing["files"]
+
+
+def fs_stat(path: Path) -> os.stat_result:
+    """
+    path.stat() と同じ（存在しなければ FileNotFoundError）。
+    索引が有効なら通常ファイルの stat を1回だけ取得して保持し、本スクリプトが書き込むまで再利用する
+    """
+    index = _fs_index
+    if index is None:
+        return os.stat(path)
+    key = os.fspath(path)
+    parent_key, name = os.path.split(key)
+    with index["lock"]:
+        listing = _fs_listing(index, parent_key)
+        if listing is not None and name in listing["files"]:
+            st = listing["files"][name]
+            if st is None:
+                st = listing["files"][name] = os.stat(key)
+            return st
+        if listing is None or (name not in listing["dirs"] and name not in listing["other"]):
+            raise FileNotFoundError(2, "No such file or directory", key)
+    return os.stat(key)
+
+
+def _fs_note_file(path: Path) -> None:
+    """書き込んだ（またはメタデータを変えた）ファイルを索引に反映する。stat は次の問い合わせで取り直す"""
+    index = _fs_index
+    if index is None:
+        return
+    parent_key, name = os.path.split(os.fspath(path))
+    with index["lock"]:
+        listing = index["listings"].get(parent_key, False)
+        if listing is None:
+            # 索引外で作られたディレクトリ: 祖先の一覧に登録し、中身は次の問い合わせで読み直す
+            _fs_note_dir(path.parent)
+            _fs_forget(path.parent)
+        elif listing is not False:
+            if name in listing["dirs"]:
+                _fs_forget(path)
+            listing["dirs"].discard(name)
+            listing["other"].discard(name)
+            listing["files"][name] = None
+
+
+def _fs_note_dir(path: Path) -> None:
+    """作成したディレクトリ（mkdir -p で作られた祖先を含む）を索引に反映する"""
+    index = _fs_index
+    if index is None:
+        return
+    with index["lock"]:
+        listings = index["listings"]
+        key = os.fspath(path)
+        child = None
+        while True:
+            listing = listings.get(key, False)
+            if listing is None:
+                listing = listings[key] = {"files": {}, "dirs": set(), "other": set()}
+            if child is not None and listing is not False:
+                if child in listing["dirs"]:
+                    break
+                listing["files"].pop(child, None)
+                listing["other"].discard(child)
+                listing["dirs"].add(child)
+            parent_key, child = os.path.split(key)
+            if parent_key == key:
+                break
+            key = parent_key
+
+
+def _fs_note_removed(path: Path | str) -> None:
+    """削除したファイル・空ディレクトリを索引に反映する"""
+    index = _fs_index
+    if index is None:
+        return
+    key = os.fspath(path)
+    parent_key, name = os.path.split(key)
+    with index["lock"]:
+        listings = index["listings"]
+        listing = listings.get(parent_key)
+        if listing is not None:
+            listing["files"].pop(name, None)
+            listing["dirs"].discard(name)
+            listing["other"].discard(name)
+        if key in listings:
+            listings[key] = None
+            index["orphans"].add(key)
+
+
+def _fs_forget(path: Path) -> None:
+    """
+    path 配下の索引を捨て、path 自体は実体を確認し直す。
+    rename・rmtree のように、中身ごと動かした・消したツリーに使う
+    """
+    index = _fs_index
+    if index is None:
+        return
+    key = os.fspath(path)
+    parent_key, name = os.path.split(key)
+    with index["lock"]:
+        listings = index["listings"]
+        orphans = index["orphans"]
+        parent = listings.get(parent_key)
+        if parent is not None:
+            parent["files"].pop(name, None)
+            parent["dirs"].discard(name)
+            parent["other"].discard(name)
+            if os.path.isdir(key) and not os.path.islink(key):
+                parent["dirs"].add(name)
+            elif os.path.isfile(key):
+                parent["files"][name] = None
+            elif os.path.lexists(key):
+                parent["other"].add(name)
+        prefix = key + os.sep
+        stack = [key, *(orphan for orphan in orphans if orphan.startswith(prefix))]
+        while stack:
+            d = stack.pop()
+            orphans.discard(d)
+            listing = listings.pop(d, None)
+            if listing:
+                stack.extend(os.path.join(d, child) for child in listing["dirs"])
+
+
+def _fs_mkdir(path: Path) -> None:
+    """path.mkdir(parents=True, exist_ok=True)。索引で存在が分かっていれば mkdir を発行しない"""
+    if _fs_index is not None and fs_is_dir(path):
+        return
+    if _sync_plan is not None:
+        _plan_mkdir(path)
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    _fs_note_dir(path)
+
+
+def _fs_unlink(path: Path) -> None:
+    """path.unlink() して索引に反映する"""
+    if _sync_plan is not None:
+        _plan_record(path, "delete")
+        _plan_drop_content(path)
+    else:
+        path.unlink()
+    _fs_note_removed(path)
+
+
+def _fs_rmdir(path: Path | str) -> None:
+    """os.rmdir() して索引に反映する（空でなければ OSError）"""
+    import errno
+
+    if _sync_plan is not None:
+        entries = _fs_entries(path)
+        if entries is None:
+            raise FileNotFoundError(errno.ENOENT, "No such file or directory", os.fspath(path))
+        if any(entries):
+            raise OSError(errno.ENOTEMPTY, "Directory not empty", os.fspath(path))
+        _plan_record(path, "delete", kind="dir")
+    else:
+        os.rmdir(path)
+    _fs_note_removed(path)
+
+
+def _fs_read_bytes(path: Path) -> bytes:
+    """path.read_bytes() と同じ（同期計画の記録中は、書き込んだはずの内容を返す）"""
+    plan = _sync_plan
+    if plan is not None:
+        content = plan["contents"].get(os.fspath(path))
+        if content is not None:
+            return content if isinstance(content, bytes) else _fs_read_bytes(content)
+    return path.read_bytes()
+
+
+def _file_sha256(path: Path) -> str:
+    """
+    path の内容の SHA-256（COPY_CHUNK_SIZE ずつ読み、内容全体をメモリに載せない）。
+    _fs_read_bytes と同じく、同期計画の記録中は書き込んだはずの内容で計算する
+    """
+    plan = _sync_plan
+    if plan is not None:
+        content = plan["contents"].get(os.fspath(path))
+        if content is not None:
+            return _sha256_bytes(content) if isinstance(content, bytes) else _file_sha256(content)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(COPY_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fs_rmtree(path: Path, ignore_errors: bool = False) -> None:
+    """shutil.rmtree() して索引に反映する（途中で失敗しても、残った中身は次の問い合わせで読み直す）"""
+    import shutil
+
+    if _sync_plan is not None:
+        _plan_record(path, "delete", kind="tree")
+        _plan_forget(path)
+        return
+    try:
+        shutil.rmtree(path, ignore_errors=ignore_errors)
+    finally:
+        _fs_forget(path)
+
+
+REFRESH_MODES = ("reconcile", "replace", "staged")
+
+
+def _scan_tree(root: Path) -> tuple[set, set]:
+    """
+    root 配下のファイル・ディレクトリを1回の走査で列挙する（os.scandir。索引が有効なら索引から）。
+
+    Returns:
+        (ファイルパス集合, ディレクトリパス集合)  ※root 自身は含まない
+    """
+    files, dirs = _scan_tree_keys(root)
+    return {Path(key) for key in files}, {Path(key) for key in dirs}
+
+
+def _scan_tree_keys(root: Path) -> tuple[set, set]:
+    """_scan_tree のパス文字列版（大きなツリーで Path を作る手間を省く）"""
+    files, dirs = set(), set()
+    for current, names, subdirs, others in _fs_walk(root):
+        files.update(os.path.join(current, name) for name in names)
+        files.update(os.path.join(current, name) for name in others)
+        dirs.update(os.path.join(current, name) for name in subdirs)
+    return files, dirs
+
+
+def _reconcile_tree(
+    root: Path,
+    expected: set,
+    keep_root_files: bool = False,
+    label: str | None = None,
+    log=print,
+) -> tuple[int, set]:
+    """
+    root 配下を「expected のファイルだけが存在する状態」に寄せる（書き込み自体は呼び出し側が行う）。
+    - expected に含まれない既存ファイル（孤児）のみ削除する
+    - 残るファイル・expected のどちらも含まないディレクトリのみ削除する（深い階層から）
+    - keep_root_files=True の場合、root 直下のファイルは対象外（replace モードの互換）
+
+    Returns:
+        (削除したファイル数, 処理後に存在するディレクトリ集合（root が存在すれば root を含む）)
+    """
+    if not fs_is_dir(root):
+        return 0, set()
+    # 突き合わせはパス文字列で行い、Path は削除するもの・返すものだけに作る
+    files, dirs = _scan_tree_keys(root)
+    expected_keys = {os.fspath(path) for path in expected}
+    removed = 0
+    kept = []
+    for path in sorted(Path(key) for key in files - expected_keys):
+        if keep_root_files and path.parent == root:
+            kept.append(path)
+            continue
+        try:
+            _fs_unlink(path)
+            removed += 1
+        except OSError as e:
+            log(f"    ⚠️ 削除失敗 ({label or root}): {path.name}: {e}")
+            kept.append(path)
+
+    # 残すファイル・これから書くファイルの祖先ディレクトリは削除しない
+    root_key = os.fspath(root)
+    prefix = root_key if root_key.endswith(os.sep) else root_key + os.sep
+    needed = {root_key}
+    for key in expected_keys.union(os.fspath(path) for path in kept):
+        parent = os.path.dirname(key)
+        while parent not in needed and parent.startswith(prefix):
+            needed.add(parent)
+            parent = os.path.dirname(parent)
+
+    for d in sorted(dirs - needed, key=lambda d: (-d.count(os.sep), d)):
+        try:
+            _fs_rmdir(Path(d))
+            dirs.discard(d)
+        except OSError:
+            continue
+
+    return removed, {root, *(Path(d) for d in dirs)}
+
+
+def _ensure_dir(path: Path, known_dirs: set) -> None:
+    """known_dirs・索引に無いディレクトリのみ mkdir する（既存ディレクトリへの mkdir を省く）"""
+    if path in known_dirs:
+        return
+    _fs_mkdir(path)
+    known_dirs.add(path)
+
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# これ以上のサイズのテキストは str にデコードせず、mmap したバイト列をストリーム変換する（_stream_skill_bytes）
+STREAM_TRANSFORM_THRESHOLD = 8 * 1024 * 1024
+
+
+def _decode_text(raw: bytes) -> str:
+    """read_text(encoding="utf-8") と同じ結果になるよう、UTF-8 デコードと改行の正規化を行う"""
+    text = raw.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def _normalize_text_bytes(raw: bytes) -> bytes:
+    """
+    _encode_text(_decode_text(raw)) と同じバイト列（UTF-8 でなければ UnicodeDecodeError）。
+    改行の変換が要らなければデコードした str を作らず、raw をそのまま返す（prefilter で変換を省略したファイル用）
+    """
+    if b"\r" in raw or os.linesep != "\n":
+        return _encode_text(_decode_text(raw))
+    if not raw.isascii():
+        raw.decode("utf-8")
+    return raw
+
+
+def _is_utf8(view) -> bool:
+    """view が UTF-8 として正しければ True（COPY_CHUNK_SIZE ずつ検査し、ASCII だけのチャンクはデコードしない）"""
+    import codecs
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for start in range(0, len(view), COPY_CHUNK_SIZE):
+            chunk = view[start:start + COPY_CHUNK_SIZE]
+            if not chunk.isascii() or decoder.getstate()[0]:
+                decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _map_text_file(path: Path):
+    """
+    path を読み込み専用で mmap して返す（UTF-8 として正しくなければ閉じて None を返す）。
+    ストリーム変換（_stream_skill_bytes）用。閉じるのは呼び出し側
+    """
+    import mmap
+
+    with open(path, "rb") as f:
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if not _is_utf8(view):
+        view.close()
+        return None
+    return view
+
+
+def _scan_stream(chunks, path: Path | None = None) -> tuple[str, bool]:
+    """
+    chunks（バイト列のチャンク）の SHA-256 と、path の内容と同一かを返す（path が None なら比較せず False）。
+    path は chunks と同じ長さずつ並行して読み、違いが見つかった時点で読むのをやめる
+    """
+    digest = hashlib.sha256()
+    f = None
+    if path is not None:
+        try:
+            f = open(path, "rb")
+        except OSError:
+            f = None
+    same = f is not None
+    try:
+        for chunk in chunks:
+            digest.update(chunk)
+            if same and f.read(len(chunk)) != chunk:
+                same = False
+        if same and f.read(1):
+            same = False
+    finally:
+        if f is not None:
+            f.close()
+    return digest.hexdigest(), same
+
+
+def _write_stream(path: Path, chunks) -> str:
+    """chunks を path へ順に書き込み（内容全体をメモリに載せない）、内容の SHA-256 を返す"""
+    digest = hashlib.sha256()
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            digest.update(chunk)
+            f.write(chunk)
+    _fs_note_file(path)
+    return digest.hexdigest()
+
+
+def _write_stream_if_changed(path: Path, chunks) -> tuple[str, bool]:
+    """
+    chunks を path へ書き込み、(内容の SHA-256, 書き込んだか) を返す（chunks は1回だけ消費する）。
+    path が既にあれば同じディレクトリの一時ファイルへ書きながら path と並行して比較し、
+    内容が異なる場合だけ os.replace で置き換える（同一なら一時ファイルを消し、path は触らない）。
+    path が無ければ比較せずに直接書き込む
+    """
+    try:
+        current = open(path, "rb")
+    except OSError:
+        return _write_stream(path, chunks), True
+    digest = hashlib.sha256()
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    same = True
+    try:
+        with current, open(tmp_path, "wb") as f:
+            os.chmod(tmp_path, os.fstat(current.fileno()).st_mode & 0o7777)
+            for chunk in chunks:
+                digest.update(chunk)
+                f.write(chunk)
+                if same and current.read(len(chunk)) != chunk:
+                    same = False
+            if same and current.read(1):
+                same = False
+        if same:
+            os.unlink(tmp_path)
+        else:
+            # rename で置き換えるため、ハードリンクを共有していた実体（ソース側）は書き換わらない
+            os.replace(tmp_path, path)
+            _fs_note_file(path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return digest.hexdigest(), not same
+
+
+def _transform_skill_file_if_changed(src: Path, dst: Path, target_env: str) -> bool:
+    """
+    skills 配下のテキスト src を target_env 向けに変換して dst に書き込む（内容が同じなら書き込まない）。書き込んだ場合は True。
+    STREAM_TRANSFORM_THRESHOLD 以上のファイルは mmap して1回だけストリーム変換し、書きながら比較する
+    （_write_stream_if_changed。同期計画の記録中を除く）。置換対象の文字列を含まないファイル（skill_text_may_change）は変換を省略し、UTF-8 でないファイルは変換せずにコピーする
+    """
+    if _sync_plan is None and fs_stat(src).st_size >= STREAM_TRANSFORM_THRESHOLD:
+        view = _map_text_file(src)
+        if view is not None:
+            try:
+                _, written = _write_stream_if_changed(dst, _stream_skill_bytes(view, target_env))
+            finally:
+                view.close()
+            if written:
+                _count_writes(written=1)
+            else:
+                _count_writes(unchanged=1)
+            return written
+    else:
+        raw = _fs_read_bytes(src)
+        try:
+            if skill_text_may_change(raw, target_env):
+                data = _encode_text(transform_skill_text(_decode_text(raw), target_env))
+            else:
+                data = _normalize_text_bytes(raw)
+                _count_writes(prefiltered=1)
+        except UnicodeDecodeError:
+            data = None
+        if data is not None:
+            return _write_bytes_if_changed(dst, data)
+    return _copy_file_if_changed(src, dst)
+
+
+def _same_size_and_mtime(src: Path, dst: Path) -> bool:
+    """copy2 済みの出力かを size と mtime で判定する（rsync の quick check と同じ考え方）"""
+    try:
+        s_st = fs_stat(src)
+        d_st = fs_stat(dst)
+    except OSError:
+        return False
+    return s_st.st_size == d_st.st_size and s_st.st_mtime_ns == d_st.st_mtime_ns
+
+
+def _copy_to_many(src: Path, dests: list) -> None:
+    """
+    src を1回だけ読みながら複数の出力先へ書き込む（メタデータは shutil.copy2 と同様にコピー）。
+    dests のハードリンク共有は呼び出し側で解除しておく（_unshare_file）
+    """
+    import shutil
+    from contextlib import ExitStack
+
+    if _sync_plan is not None:
+        for dest in dests:
+            _plan_write(dest, source=src)
+        return
+    with ExitStack() as stack:
+        fsrc = stack.enter_context(open(src, "rb"))
+        fdsts = [stack.enter_context(open(dest, "wb")) for dest in dests]
+        while True:
+            chunk = fsrc.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            for fdst in fdsts:
+                fdst.write(chunk)
+    for dest in dests:
+        shutil.copystat(src, dest)
+        _fs_note_file(dest)
+
+
+def _has_same_bytes(path: Path, data: bytes) -> bool:
+    """既存ファイルの内容が data と同一なら True（サイズが違えば読み込まない）"""
+    try:
+        return fs_stat(path).st_size == len(data) and _fs_read_bytes(path) == data
+    except OSError:
+        return False
+
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    """path.write_bytes(data) して索引に反映する（同期計画の記録中は create / update として記録するだけ）"""
+    if _sync_plan is not None:
+        _plan_write(path, data=data)
+        return
+    path.write_bytes(data)
+    _fs_note_file(path)
+
+
+def _copy_stat(src: Path, dst: Path) -> None:
+    """shutil.copystat(src, dst) して索引に反映する（同期計画の記録中は dst の操作に記録するだけ）"""
+    import shutil
+
+    if _sync_plan is not None:
+        _plan_stat_from(dst, src)
+        return
+    shutil.copystat(src, dst)
+    _fs_note_file(dst)
+
+
+# 実行全体の書き込み集計（内容が同じで書き込みを省略したファイルも数える）
+# prefiltered: 置換対象の文字列を含まず、パス参照の変換を省略したソースファイル数（書き込み・内容同一とは別に数える）
+_write_counts = {"written": 0, "unchanged": 0, "prefiltered": 0}
+_write_counts_lock = threading.Lock()
+
+
+def _count_writes(written: int = 0, unchanged: int = 0, prefiltered: int = 0) -> None:
+    with _write_counts_lock:
+        _write_counts["written"] += written
+        _write_counts["unchanged"] += unchanged
+        _write_counts["prefiltered"] += prefiltered
+
+
+def take_write_counts() -> dict:
+    """前回の呼び出し以降の書き込み集計を返し、0 に戻す"""
+    with _write_counts_lock:
+        counts = dict(_write_counts)
+        for key in _write_counts:
+            _write_counts[key] = 0
+    return counts
+
+
+def print_write_counts(counts: dict) -> None:
+    print(
+        f"📝 書き込み集計: 書き込み {counts['written']} / 内容同一でスキップ {counts['unchanged']} ファイル"
+        f"（変換不要で省略 {counts['prefiltered']} ファイル）"
+    )
+
+
+def _write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    """既存ファイルと内容が異なる場合のみ書き込む。書き込んだ場合は True"""
+    if _has_same_bytes(path, data):
+        _plan_unchanged(path)
+        _count_writes(unchanged=1)
+        return False
+    _unshare_file(path)
+    _write_bytes(path, data)
+    _count_writes(written=1)
+    return True
+
+
+def write_text_if_changed(path: Path, text: str) -> bool:
+    """
+    write_text(encoding="utf-8") の代わりに使う共通の書き込み関数。
+    既存ファイルと同じバイト列になる場合は書き込まず（mtime を変えず）False を返す
+    """
+    return _write_bytes_if_changed(path, _encode_text(text))
+
+
+LINK_MODES = ("copy", "reflink", "hardlink")
+
+# link_mode を指定されても常にコピーで配置する環境。
+# Codex は skills 配下のファイルをその場で書き換えることがあり、inode を共有すると
+# 配置元（scripts/ や他環境の skills）まで書き換わってしまう
+COPY_ONLY_ENVS = ("codex",)
+
+
+def _link_mode_for_env(env: str, link_mode: str) -> str:
+    """env の同期先で実際に使う link_mode（COPY_ONLY_ENVS は常に "copy"）"""
+    return "copy" if env in COPY_ONLY_ENVS else link_mode
+
+# Linux の FICLONE ioctl（_IOW(0x94, 9, int)）: CoW 対応ファイルシステム（btrfs / XFS 等）でデータを共有した複製を作る
+_FICLONE = 0x40049409
+
+
+def _unshare_file(path: Path) -> None:
+    """
+    path が他のファイルとハードリンクを共有していれば削除しておく。
+    そのまま書き込むとリンク先（ソース側）まで書き換わるため、書き込み前に呼ぶ
+    （同期計画の記録中は何もしない。適用時に apply_sync_plan が解除する）
+    """
+    if _sync_plan is not None:
+        return
+    try:
+        if os.stat(path, follow_symlinks=False).st_nlink > 1:
+            os.unlink(path)
+            _fs_note_removed(path)
+    except FileNotFoundError:
+        pass
+
+
+def _clone_file(src: Path, dst: Path) -> str:
+    """
+    src の内容を dst へ複製し、使った方法を返す。
+    FICLONE（reflink）→ os.copy_file_range（カーネル内コピー）→ 通常の読み書き の順に試す
+    """
+    import shutil
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            import fcntl
+
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return "reflink"
+        except (ImportError, OSError):
+            pass
+        if hasattr(os, "copy_file_range"):
+            try:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return "copy_file_range"
+            except OSError:
+                pass
+            # 途中で失敗した場合は最初からやり直す
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+        shutil.copyfileobj(fsrc, fdst, COPY_CHUNK_SIZE)
+        return "copy"
+
+
+def _place_file(src: Path, dst: Path, link_mode: str = "copy") -> str:
+    """
+    src を dst に配置し（メタデータは shutil.copy2 と同様）、使った方法を返す。
+
+    link_mode:
+      - copy    : shutil.copy2
+      - reflink : _clone_file（reflink → copy_file_range → 通常コピー）
+      - hardlink: ハードリンク（別ファイルシステム等で作れない場合は reflink と同じ扱い）
+                  出力を直接編集するとソースも変わる点に注意
+    hardlink で dst が既に src と同じ実体なら何もせず "same" を返す
+    （copy / reflink では共有している実体を切り離してから配置する）。
+    """
+    import shutil
+
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link_mode}")
+    if _sync_plan is not None:
+        return _plan_place(src, dst, link_mode)
+    try:
+        dst_st = os.stat(dst, follow_symlinks=False)
+    except FileNotFoundError:
+        dst_st = None
+    if dst_st is not None:
+        src_st = os.stat(src)
+        if link_mode == "hardlink" and (dst_st.st_dev, dst_st.st_ino) == (src_st.st_dev, src_st.st_ino):
+            return "same"
+        if link_mode == "hardlink" or dst_st.st_nlink > 1:
+            os.unlink(dst)
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            # リンク数（st_nlink）が変わるため、ソース側の stat も取り直させる
+            _fs_note_file(src)
+            _fs_note_file(dst)
+            return "hardlink"
+        except OSError:
+            link_mode = "reflink"
+    if link_mode == "reflink":
+        method = _clone_file(src, dst)
+        shutil.copystat(src, dst)
+        _fs_note_file(dst)
+        return method
+    shutil.copy2(src, dst)
+    _fs_note_file(dst)
+    return "copy"
+
+
+def _same_file_content(src: Path, dst: Path, hash_cache: dict | None = None, shared_ok: bool = True) -> bool:
+    """
+    dst が src と同じ実体（ハードリンク）か同一内容なら True（どちらかが無ければ False）。
+    shared_ok=False では、同じ実体を共有している場合も False（切り離して置き直す必要がある）。
+    hash_cache（load_file_hash_cache）を渡すと、サイズが同じ場合の比較を記録済みのハッシュで行う
+    """
+    try:
+        src_st = fs_stat(src)
+        dst_st = fs_stat(dst)
+        if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+            return shared_ok
+        if src_st.st_size != dst_st.st_size:
+            return False
+        if hash_cache is not None:
+            return _cached_file_hash(hash_cache, src) == _cached_file_hash(hash_cache, dst)
+        return _fs_read_bytes(src) == _fs_read_bytes(dst)
+    except OSError:
+        return False
+
+
+def _copy_file_if_changed(src: Path, dst: Path, link_mode: str = "copy", hash_cache: dict | None = None) -> bool:
+    """
+    dst が src と同一内容でない場合のみ配置する（_place_file）。配置した場合は True。
+    hardlink 以外では、以前の hardlink で src と実体を共有している dst も置き直す。
+    hash_cache を渡すと内容をハッシュで比較し、配置した dst のハッシュも記録する（次回は読み込まない）
+    """
+    if _same_file_content(src, dst, hash_cache, shared_ok=link_mode == "hardlink"):
+        _plan_unchanged(dst)
+        _count_writes(unchanged=1)
+        return False
+    _place_file(src, dst, link_mode)
+    if hash_cache is not None:
+        _remember_file_hash(hash_cache, dst, _cached_file_hash(hash_cache, src))
+    _count_writes(written=1)
+    return True
+
+
+def _staging_dirs(target_dir: Path) -> tuple[Path, Path]:
+    """同期先と同じ親ディレクトリに置く (ステージング, 退避先) のパス（rename が同一ファイルシステム内で済むように）"""
+    return (
+        target_dir.with_name(f".{target_dir.name}.staging"),
+        target_dir.with_name(f".{target_dir.name}.trash"),
+    )
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    """変更のないファイルをステージングへ取り込む（ハードリンク、できなければ copy2）"""
+    import shutil
+
+    try:
+        os.link(src, dst, follow_symlinks=False)
+        _fs_note_file(src)
+    except OSError:
+        shutil.copy2(src, dst, follow_symlinks=False)
+    _fs_note_file(dst)
+
+
+def _swap_in(live: Path, staged: Path | None, trash: Path) -> None:
+    """
+    ステージング済みの staged を live の位置へ rename で差し替える（staged が None なら live を取り除く）。
+    ファイル同士は os.replace の1回で置き換わる。ディレクトリは live を退避先へ移してから staged を移すため、
+    live が見えなくなるのは2回の rename の間だけ（中身が書きかけの状態は見えない）。
+    """
+    try:
+        if staged is not None and staged.is_file() and live.is_file() and not live.is_symlink():
+            os.replace(staged, live)
+            return
+        if os.path.lexists(live):
+            trash.mkdir(parents=True, exist_ok=True)
+            os.rename(live, trash / live.name)
+        if staged is not None:
+            os.rename(staged, live)
+    finally:
+        for path in (live, staged, trash):
+            if path is not None:
+                _fs_forget(path)
+
+
+def _staging_unit(ctx: dict, path: Path) -> str:
+    """差し替えの単位（ターゲット直下のエントリ名）。ctx は _sync_directory の同期先ごとの作業内容"""
+    return path.relative_to(ctx["dir"]).parts[0]
+
+
+def _stage_output(ctx: dict, dest: Path) -> Path:
+    """dest に対応するステージング側のパス（親ディレクトリを作成し、差し替え対象として記録する）"""
+    rel = dest.relative_to(ctx["dir"])
+    path = ctx["staging"] / rel
+    _ensure_dir(path.parent, ctx["staging_dirs"])
+    ctx["dirty"].add(rel.parts[0])
+    ctx["staged"].add(dest)
+    return path
+
+
+def _prepare_staging(ctx: dict, expected: set, manifest: dict | None, project_root: Path) -> None:
+    """
+    refresh_mode が replace / staged の同期先を、全件同期の前に準備する（ライブ側のターゲットは触らない）。
+    - ターゲット全体を差し替える場合（stage_whole）: 空のステージングを作り、記録済みの出力をマニフェストから外す
+    - staged: 孤児ファイル（ctx["drop"]）と、不要なディレクトリを含む最上位エントリ（ctx["dirty"]）を差し替え対象にする
+    """
+    target_dir = ctx["dir"]
+    if ctx["stage_whole"]:
+        # 全出力をステージングに書き、最後にターゲットごと差し替える
+        if fs_is_dir(target_dir):
+            ctx["lines"].append(f"    🧹 {ctx['name']} をリフレッシュ")
+        for key in ctx["recorded"]:
+            _manifest_drop_output(manifest, key)
+        _ensure_dir(ctx["staging"], ctx["staging_dirs"])
+        return
+    files, dirs = _scan_tree(target_dir)
+    ctx["drop"] = files - expected
+    needed = set()
+    for path in expected:
+        parent = path.parent
+        while parent not in needed and target_dir in parent.parents:
+            needed.add(parent)
+            parent = parent.parent
+    ctx["dirty"].update(_staging_unit(ctx, d) for d in dirs - needed)
+    if manifest is not None:
+        for key in ctx["recorded"]:
+            if project_root / key not in expected:
+                _manifest_drop_output(manifest, key)
+
+
+def _publish_staging(ctx: dict) -> None:
+    """
+    ステージングした出力を rename でターゲットへ差し替え（_swap_in）、ステージング・退避先を片付ける。
+    ターゲット全体（stage_whole）はまとめて、staged は差し替え対象の最上位エントリごとに差し替える。
+    失敗した同期先（ctx["error"]）は公開せず、前回の状態のまま残す
+    """
+    staging = ctx["staging"]
+    if staging is None:
+        return
+    target_dir = ctx["dir"]
+    began = _profile_clock()
+    try:
+        if ctx["error"] is not None:
+            return
+        if ctx["stage_whole"]:
+            _swap_in(target_dir, staging, ctx["trash"])
+            ctx["swapped"] = 1
+            return
+        units = ctx["dirty"] | {_staging_unit(ctx, path) for path in ctx["drop"]}
+        for name in sorted(units):
+            live = target_dir / name
+            staged_unit = staging / name
+            if live.is_dir() and not live.is_symlink():
+                # 変更のないファイルをステージング側へ取り込み、エントリ全体を完成させてから差し替える
+                files, _ = _scan_tree(live)
+                for path in files:
+                    if path in ctx["staged"] or path in ctx["drop"]:
+                        continue
+                    linked = staging / path.relative_to(target_dir)
+                    _ensure_dir(linked.parent, ctx["staging_dirs"])
+                    _link_or_copy(path, linked)
+            _swap_in(live, staged_unit if os.path.lexists(staged_unit) else None, ctx["trash"])
+            ctx["swapped"] += 1
+        ctx["removed"] += len(ctx["drop"])
+    except Exception as e:
+        ctx["error"] = e
+    finally:
+        for leftover in (staging, ctx["trash"]):
+            if os.path.lexists(leftover):
+                _fs_rmtree(leftover, ignore_errors=True)
+        _profile_target(ctx["name"], began, files=0)
+
+
+SYNC_PLAN_NAME = ".sync-plan.json"
+SYNC_PLAN_VERSION = 1
+SYNC_PLAN_ACTIONS = ("create", "update", "link", "delete", "unchanged")
+
+# 実行単位の同期計画（sync_plan_begin 〜 sync_plan_end の間だけ有効）。
+# 有効な間は書き込み・削除をディスクに行わず、操作として記録して索引（_fs_index）にだけ反映する
+_sync_plan = None
+# スレッドごとの、記録する操作の並び位置（_plan_scope）
+_plan_local = threading.local()
+
+
+def sync_plan_begin(project_root: Path) -> None:
+    """
+    同期計画の記録を開始する（fs_index_begin の後に呼ぶ）。
+
+    記録中は、本スクリプトの書き込み・削除（_write_bytes / _copy_to_many / _place_file / _fs_unlink / _fs_rmdir /
+    _fs_rmtree / _fs_mkdir）がディスクに触れず、出力ごとの操作（create / update / link / delete / unchanged）として残る。
+    結果は索引に反映し、書き込んだはずの内容は _fs_read_bytes で読めるため、後のフェーズ（埋め込みスクリプト同期・
+    空ディレクトリ掃除）も実際の実行と同じ判定になる。dry-run 専用の分岐は通らず、実際の実行と同じコードで計画する。
+    ステージング（refresh_mode の replace / staged）は計画できないため、呼び出し側で reconcile を使うこと。
+    """
+    import itertools
+
+    global _sync_plan
+    if _fs_index is None:
+        raise RuntimeError("sync_plan_begin() は fs_index_begin() の後に呼んでください")
+    # ops: 出力ごとの操作（同じパスへの操作は1件にまとめる） / contents: 書き込んだはずの内容（バイト列かコピー元）
+    # order: 操作ごとの並び位置（(_plan_scope の位置, 記録順)） / stage: スコープ外の操作の位置（_plan_stage）
+    _sync_plan = {
+        "root": project_root, "ops": {}, "contents": {}, "inodes": itertools.count(1), "lock": threading.RLock(),
+        "order": {}, "seq": itertools.count(), "stage": 0,
+    }
+
+
+def sync_plan_end() -> dict | None:
+    """記録を終了し、計画（JSON に書き出せる dict）を返す。有効でなければ None"""
+    global _sync_plan
+    plan, _sync_plan = _sync_plan, None
+    if plan is None:
+        return None
+    order = plan["order"]
+    return {
+        "version": SYNC_PLAN_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "root": str(plan["root"]),
+        "operations": [op for _, op in sorted(plan["ops"].items(), key=lambda item: order[item[0]])],
+    }
+
+
+def _plan_stage() -> tuple:
+    """
+    並列に記録する区間の位置（_plan_scope に渡す key の先頭）を確保して返す（記録中でなければ ()）。
+    以降にスコープ外で記録した操作は、区間内の操作より後に並ぶ
+    """
+    plan = _sync_plan
+    if plan is None:
+        return ()
+    with plan["lock"]:
+        plan["stage"] += 2
+        return (plan["stage"] - 1,)
+
+
+def _plan_position() -> tuple:
+    """このスレッドで記録する操作の位置（_plan_scope の外では現在の段）"""
+    scope = getattr(_plan_local, "scope", None)
+    return scope if scope is not None else (_sync_plan["stage"],)
+
+
+def _plan_call_scope() -> tuple:
+    """呼び出し元が _plan_scope で与えた位置（無ければ新しい区間を確保する。記録中でなければ ()）"""
+    if _sync_plan is None:
+        return ()
+    scope = getattr(_plan_local, "scope", None)
+    return scope if scope is not None else _plan_stage()
+
+
+@contextlib.contextmanager
+def _plan_scope(*key):
+    """
+    with の間、このスレッドで記録する操作を key の位置に並べる（記録中でなければ何もしない）。
+    計画の操作は (位置, 記録順) の順に並ぶため、並列に記録しても、位置を逐次実行の順序
+    （区間 → 呼び出し → 同期先の準備 / ソースファイル → …）で与えておけば --jobs によらず同じ計画になる
+    """
+    if _sync_plan is None:
+        yield
+        return
+    previous = getattr(_plan_local, "scope", None)
+    _plan_local.scope = tuple(key)
+    try:
+        yield
+    finally:
+        _plan_local.scope = previous
+
+
+def _plan_state(path) -> list | None:
+    """計画時点のディスク上のファイルの [size, mtime_ns]（無ければ None）。適用時に変更の有無を確かめる"""
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _plan_record(path, action: str, kind: str = "file", **payload) -> None:
+    """
+    操作を1件記録する。同じパスへの操作は1件にまとめる（最初の位置を保ち、内容は最後の操作で置き換える）。
+
+    action: "write"（payload に内容）/ "link" / "delete" / "unchanged"
+    kind  : "file" / "dir"（空ディレクトリの削除）/ "tree"（ディレクトリごとの削除）
+    - 書き込み: 計画前にファイルが無ければ create、あれば update（link はリンク/複製での配置）
+    - 計画内で作ったファイル・ディレクトリの削除は、作成ごと取り消す
+    - unchanged は、先に記録した書き込み・削除があればそちらを残す
+    """
+    plan = _sync_plan
+    rel = _manifest_key(plan["root"], path)
+    key = rel if kind == "file" else rel + "/"
+    with plan["lock"]:
+        ops = plan["ops"]
+        prev = ops.get(key)
+        if prev is None:
+            plan["order"][key] = (_plan_position(), next(plan["seq"]))
+        if action == "unchanged":
+            if prev is None:
+                ops[key] = {"action": "unchanged", "path": rel}
+            return
+        if kind != "file":
+            if action == "delete" and not os.path.isdir(path):
+                ops.pop(key, None)
+                return
+            if kind == "tree":
+                # 配下に記録済みの操作はディレクトリごとの削除に含まれる
+                for sub in [k for k in ops if k.startswith(rel + "/")]:
+                    del ops[sub]
+            ops[key] = {"action": action, "path": rel, "kind": kind}
+            return
+        before = prev["before"] if prev is not None and "before" in prev else _plan_state(path)
+        if action == "delete":
+            if before is None:
+                ops.pop(key, None)
+                return
+            ops[key] = {"action": "delete", "path": rel, "kind": "file", "before": before}
+            return
+        if action == "write":
+            action = "create" if before is None else "update"
+        ops[key] = {"action": action, "path": rel, "before": before, **payload}
+
+
+def _plan_unchanged(path: Path) -> None:
+    """書き込み不要だった出力を記録する（計画の記録中のみ）"""
+    if _sync_plan is not None:
+        _plan_record(path, "unchanged")
+
+
+def _plan_stat(size: int, mtime_ns: int) -> os.stat_result:
+    """計画上のファイルの stat（索引に載せる。inode は計画内で一意の番号）"""
+    import stat
+
+    seconds = mtime_ns // 1_000_000_000
+    fields = [stat.S_IFREG | 0o644, -next(_sync_plan["inodes"]), 0, 1, 0, 0, size, seconds, seconds, seconds]
+    return os.stat_result(fields, {"st_atime_ns": mtime_ns, "st_mtime_ns": mtime_ns, "st_ctime_ns": mtime_ns})
+
+
+def _plan_note_file(path: Path, st: os.stat_result) -> None:
+    """計画上で書き込んだファイルを索引に載せる（以降の fs_stat / 走査はこの stat を返す）"""
+    index = _fs_index
+    parent_key, name = os.path.split(os.fspath(path))
+    with index["lock"]:
+        listing = _fs_listing(index, parent_key)
+        if listing is None:
+            _plan_mkdir(path.parent)
+            listing = index["listings"][parent_key]
+        if name in listing["dirs"]:
+            _plan_forget(path)
+        listing["dirs"].discard(name)
+        listing["other"].discard(name)
+        listing["files"][name] = st
+
+
+def _plan_mkdir(path: Path) -> None:
+    """計画上でディレクトリを作る（mkdir -p 相当。索引にだけ反映する）"""
+    if fs_is_dir(path):
+        return
+    if path.parent != path:
+        _plan_mkdir(path.parent)
+    index = _fs_index
+    key = os.fspath(path)
+    parent_key, name = os.path.split(key)
+    with index["lock"]:
+        parent = _fs_listing(index, parent_key)
+        parent["files"].pop(name, None)
+        parent["other"].discard(name)
+        parent["dirs"].add(name)
+        index["listings"][key] = {"files": {}, "dirs": set(), "other": set()}
+    with _sync_plan["lock"]:
+        # 同じ計画の中で先に記録した空ディレクトリの削除は取り消す
+        dir_key = _manifest_key(_sync_plan["root"], path) + "/"
+        if _sync_plan["ops"].get(dir_key, {}).get("kind") == "dir":
+            del _sync_plan["ops"][dir_key]
+
+
+def _plan_forget(path: Path) -> None:
+    """計画上で path（配下を含む）を削除したことを索引・書き込み内容に反映する"""
+    index = _fs_index
+    key = os.fspath(path)
+    prefix = key + os.sep
+    _fs_note_removed(path)
+    with index["lock"]:
+        listings = index["listings"]
+        for sub in [k for k in listings if k.startswith(prefix)]:
+            del listings[sub]
+    with _sync_plan["lock"]:
+        contents = _sync_plan["contents"]
+        for sub in [k for k in contents if k == key or k.startswith(prefix)]:
+            del contents[sub]
+
+
+def _plan_drop_content(path: Path) -> None:
+    """計画上で削除したファイルの内容を忘れる"""
+    with _sync_plan["lock"]:
+        _sync_plan["contents"].pop(os.fspath(path), None)
+
+
+def _plan_write(path: Path, data: bytes | None = None, source: Path | None = None, link_mode: str = "copy") -> None:
+    """
+    計画上で path を書き込む（data のバイト列、または source からのコピー / link_mode での配置）。
+    内容は _fs_read_bytes で読めるようにし、索引には実際に書き込んだ場合と同じ size / mtime の stat を載せる
+    """
+    root = _sync_plan["root"]
+    if source is not None:
+        # 計画内で書いた出力からの配置は、その出力の元（コピー元のファイルか、書き込む内容）に置き換える
+        with _sync_plan["lock"]:
+            planned = _sync_plan["contents"].get(os.fspath(source))
+        if isinstance(planned, bytes):
+            data, source = planned, None
+        elif planned is not None:
+            source = planned
+    if data is not None:
+        try:
+            payload = {"text": data.decode("utf-8")}
+        except UnicodeDecodeError:
+            import base64
+
+            payload = {"base64": base64.b64encode(data).decode("ascii")}
+        st = _plan_stat(len(data), time.time_ns())
+        _plan_record(path, "write", **payload)
+    else:
+        src_st = fs_stat(source)
+        payload = {"source": _manifest_key(root, source), "source_state": [src_st.st_size, src_st.st_mtime_ns]}
+        if link_mode == "hardlink":
+            st = src_st
+            _plan_record(path, "link", link_mode=link_mode, **payload)
+        else:
+            # copy2 / reflink はソースの mtime を引き継ぐ
+            st = _plan_stat(src_st.st_size, src_st.st_mtime_ns)
+            if link_mode == "copy":
+                _plan_record(path, "write", **payload)
+            else:
+                _plan_record(path, "link", link_mode=link_mode, **payload)
+    with _sync_plan["lock"]:
+        _sync_plan["contents"][os.fspath(path)] = data if data is not None else source
+    _plan_note_file(path, st)
+
+
+def _plan_stat_from(dst: Path, src: Path) -> None:
+    """計画上で dst に src のメタデータ（mtime 等）をコピーする（shutil.copystat 相当）"""
+    plan = _sync_plan
+    key = _manifest_key(plan["root"], dst)
+    with plan["lock"]:
+        op = plan["ops"].get(key)
+        if op is None or op["action"] not in ("create", "update"):
+            return
+        op["stat_from"] = _manifest_key(plan["root"], src)
+    src_st = fs_stat(src)
+    _plan_note_file(dst, _plan_stat(fs_stat(dst).st_size, src_st.st_mtime_ns))
+
+
+def _plan_place(src: Path, dst: Path, link_mode: str) -> str:
+    """_place_file の計画版（戻り値も同じ）"""
+    try:
+        src_st = fs_stat(src)
+        dst_st = fs_stat(dst)
+        if (dst_st.st_dev, dst_st.st_ino) == (src_st.st_dev, src_st.st_ino):
+            return "same"
+    except OSError:
+        pass
+    _plan_write(dst, source=src, link_mode=link_mode)
+    return "copy" if link_mode == "copy" else link_mode
+
+
+def save_sync_plan(path: Path, plan: dict) -> None:
+    """計画を JSON で保存する（書き込む内容はテキストならそのまま、バイナリは base64 で含む）"""
+    path.write_text(json.dumps(plan, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def load_sync_plan(path: Path) -> dict:
+    """save_sync_plan で保存した計画を読み込む（バージョンが違えば ValueError）"""
+    plan = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(plan, dict) or plan.get("version") != SYNC_PLAN_VERSION:
+        raise ValueError(f"同期計画のバージョンが違います: {path}")
+    return plan
+
+
+def count_sync_plan(plan: dict) -> dict:
+    """操作ごとの件数"""
+    counts = {action: 0 for action in SYNC_PLAN_ACTIONS}
+    for op in plan["operations"]:
+        counts[op["action"]] += 1
+    return counts
+
+
+def print_sync_plan(plan: dict, verbose: bool = True) -> None:
+    """計画の内容（unchanged 以外の操作）と件数を表示する"""
+    if verbose:
+        for op in plan["operations"]:
+            if op["action"] == "unchanged":
+                continue
+            target = op["path"] + ("/" if op.get("kind", "file") != "file" else "")
+            origin = f" <= {op['source']}" if "source" in op else ""
+            print(f"🔍 [DRY-RUN] {op['action']}: {target}{origin}")
+    counts = count_sync_plan(plan)
+    print("📋 同期計画: " + " / ".join(f"{action} {counts[action]}" for action in SYNC_PLAN_ACTIONS))
+
+
+def check_sync_plan(project_root: Path, plan: dict, jobs: int | None = None) -> list[dict]:
+    """
+    --check: 同期計画から、ディスク上の出力が期待と異なるもの（ずれ）を返す（パス順）。
+
+    - create（出力が無い）・delete（余分な出力）はそのままずれとする
+    - update / link は、期待する内容（書き込む内容、またはコピー元）とディスク上の出力のハッシュを
+      スレッドプール（jobs 並列、None なら ThreadPoolExecutor の既定値）で比較し、
+      内容が同じもの（mtime や配置方法だけの違い）は除く
+    - 空ディレクトリの削除は対象外（git は空ディレクトリを管理しないため）
+    """
+    import base64
+    from concurrent.futures import ThreadPoolExecutor
+
+    def file_hash(path: Path) -> str | None:
+        try:
+            return _file_sha256(path)
+        except OSError:
+            return None
+
+    # 同じコピー元（埋め込みスクリプト等）は1回だけ読む
+    source_hash = functools.lru_cache(maxsize=None)(file_hash)
+
+    def differs(op: dict) -> bool:
+        if "source" in op:
+            expected = source_hash(project_root / op["source"])
+        elif "text" in op:
+            expected = _sha256_bytes(op["text"].encode("utf-8"))
+        else:
+            expected = _sha256_bytes(base64.b64decode(op["base64"]))
+        return expected is None or expected != file_hash(project_root / op["path"])
+
+    drifted = []
+    candidates = []
+    for op in plan["operations"]:
+        if op["action"] == "unchanged" or op.get("kind") == "dir":
+            continue
+        if op["action"] in ("update", "link"):
+            candidates.append(op)
+        else:
+            drifted.append(op)
+    if candidates:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            drifted.extend(op for op, changed in zip(candidates, pool.map(differs, candidates)) if changed)
+    return sorted(drifted, key=lambda op: op["path"])
+
+
+def print_check_result(drifted: list[dict]) -> None:
+    """--check の結果（ずれている出力の一覧と件数）を表示する"""
+    labels = {"create": "出力なし", "delete": "余分な出力", "update": "内容が異なる", "link": "内容が異なる"}
+    if not drifted:
+        print("✅ 同期チェック: 派生環境はすべて起点と一致しています")
+        return
+    for op in drifted:
+        target = op["path"] + ("/" if op.get("kind", "file") != "file" else "")
+        origin = f" <= {op['source']}" if "source" in op else ""
+        print(f"  ❌ {labels[op['action']]}: {target}{origin}")
+    print(f"❌ 同期チェック: {len(drifted)} 件の出力が起点とずれています（--force で同期してください）")
+
+
+CHECK_STAMP_NAME = "check-stamp.json"
+CHECK_STAMP_VERSION = 1
+
+
+def _check_fingerprint(project_root: Path, roots: list[str], options: dict) -> tuple[str, int]:
+    """
+    同期の結果を --check で使い回せるかを判定する指紋と、対象ファイルの最新の mtime_ns を返す。
+    指紋は roots（プロジェクトルートからの相対パス）配下の全ファイルの (inode, size, mtime_ns)、
+    プロジェクト直下のエントリ名（同期用のファイルを除く。新しい環境のディレクトリ等で同期先が増える場合に備える）、
+    出力を左右する options（起点・変換方式・本スクリプト自身の stat）の SHA-256。ファイル内容は読まない
+    """
+    snapshot = _stat_snapshot([project_root / root for root in roots], inode=True)
+    names = sorted(name for name in os.listdir(project_root) if not name.startswith(".sync"))
+    digest = hashlib.sha256(json.dumps([options, names], sort_keys=True).encode("utf-8", "surrogateescape"))
+    for path in sorted(snapshot):
+        digest.update(f"{path}\0{snapshot[path]}\n".encode("utf-8", "surrogateescape"))
+    latest = max((stamp[2] for stamp in snapshot.values()), default=0)
+    return digest.hexdigest(), latest
+
+
+def _sync_roots(project_root: Path, origin: str) -> list[str]:
+    """
+    指紋を取る範囲: 同期の出力先（SYNC_MASTER_LOCATIONS / SYNC_OUTPUT_LOCATIONS）と起点の入力（_watch_roots）の
+    プロジェクト直下のエントリ名。直下の単位で取るため、配下にファイルが増えても（新しいソース・余分な出力）指紋が変わる
+    """
+    watched = _watch_roots(project_root, origin)
+    roots = {location.split("/", 1)[0] for location in (*SYNC_MASTER_LOCATIONS, *SYNC_OUTPUT_LOCATIONS)}
+    for path in [watched["master"], *watched["sync"], *watched["scripts"], watched["rules"]]:
+        if path is not None:
+            roots.add(_manifest_key(project_root, path).split("/", 1)[0])
+    return sorted(roots)
+
+
+def _sync_inputs(project_root: Path, origin: str) -> list[str]:
+    """
+    起点の入力（_watch_roots）のうち、同期自身が書き込まないもの。
+    Cursor起点の .claude/agents は .cursor/rules から生成し、Claude起点以外の .claude/commands は同期の出力になる
+    """
+    watched = _watch_roots(project_root, origin)
+    generated = {project_root / ".claude" / "agents"} if origin == "cursor" else set()
+    if origin != "claude":
+        generated.add(project_root / ".claude" / "commands")
+    inputs = [watched["master"], *watched["sync"], *watched["scripts"], watched["rules"]]
+    return [_manifest_key(project_root, path) for path in inputs if path is not None and path not in generated]
+
+
+def check_stamp_matches(project_root: Path, options: dict) -> bool:
+    """
+    前回の同期（save_check_stamp）から、対象ファイルの (inode, size, mtime_ns) も options も変わっていなければ True
+    （--check で計画の作成・変換を丸ごと省略してよい）。記録が無い・壊れていれば False。読むだけで書き込まない
+    """
+    try:
+        stamp = json.loads((project_root / PARSE_CACHE_DIR / CHECK_STAMP_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return False
+    if not isinstance(stamp, dict) or stamp.get("version") != CHECK_STAMP_VERSION:
+        return False
+    return stamp.get("fingerprint") == _check_fingerprint(project_root, stamp.get("roots", []), options)[0]
+
+
+def save_check_stamp(project_root: Path, origin: str, options: dict, started_ns: int) -> None:
+    """
+    全件の同期が成功した後の指紋を記録する（.sync-cache/check-stamp.json。失敗しても処理は続行）。
+    1回の同期で --check の期待する出力に揃うため、次の --check はこの記録と照合するだけで済む。
+    同期中（started_ns 以降）に入力（_sync_inputs）が変更されていれば、出力に反映されたとは限らないため記録しない
+    """
+    if _check_fingerprint(project_root, _sync_inputs(project_root, origin), options)[1] >= started_ns:
+        return
+    roots = _sync_roots(project_root, origin)
+    fingerprint, _ = _check_fingerprint(project_root, roots, options)
+    path = project_root / PARSE_CACHE_DIR / CHECK_STAMP_NAME
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"version": CHECK_STAMP_VERSION, "roots": roots, "fingerprint": fingerprint}), encoding="utf-8"
+        )
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 同期チェックの記録保存失敗: {e}")
+
+
+def apply_sync_plan(project_root: Path, plan: dict) -> dict:
+    """
+    同期計画（sync_plan_end / load_sync_plan）を project_root に適用する。
+
+    操作は種類ごとにまとめて、次の順に実行する:
+      1. ファイルの削除 → 2. ディレクトリごとの削除 → 3. 書き込み（create / update / link。親ディレクトリは1回だけ作成）
+      → 4. 書き込みのコピー元になっているファイルの削除 → 5. 空ディレクトリの削除（深い順。空でなくなっていれば残す）
+    計画後に出力が変わっていたもの（size / mtime が計画時と違う、create なのに既にある）や、
+    コピー元が変わっていたものは上書きせず stale として数える（再度計画し直せば反映される）。
+    マニフェストは更新しない（次回の実行で出力を比較し直して記録する）。
+
+    Returns:
+        {操作: 実行数, ..., "stale": 変更があり実行しなかった数, "failed": 失敗数}
+    """
+    import shutil
+
+    counts = {action: 0 for action in SYNC_PLAN_ACTIONS}
+    counts["stale"] = counts["failed"] = 0
+    operations = plan["operations"]
+    known_dirs = set()
+
+    def run(op: dict, fn) -> None:
+        path = project_root / op["path"]
+        if "before" in op and _plan_state(path) != op["before"]:
+            print(f"⚠️  計画後に変更されているためスキップ: {op['path']}")
+            counts["stale"] += 1
+            return
+        if "source_state" in op and _plan_state(project_root / op["source"]) != op["source_state"]:
+            print(f"⚠️  コピー元が計画後に変更されているためスキップ: {op['path']} <= {op['source']}")
+            counts["stale"] += 1
+            return
+        try:
+            fn(path, op)
+        except OSError as e:
+            print(f"❌ {op['action']} 失敗: {op['path']}: {e}")
+            counts["failed"] += 1
+            return
+        counts[op["action"]] += 1
+
+    def delete_file(path: Path, op: dict) -> None:
+        path.unlink()
+
+    def delete_tree(path: Path, op: dict) -> None:
+        shutil.rmtree(path)
+
+    def write(path: Path, op: dict) -> None:
+        _ensure_dir(path.parent, known_dirs)
+        if "source" in op:
+            _place_file(project_root / op["source"], path, op.get("link_mode", "copy"))
+            return
+        if "text" in op:
+            data = op["text"].encode("utf-8")
+        else:
+            import base64
+
+            data = base64.b64decode(op["base64"])
+        _unshare_file(path)
+        path.write_bytes(data)
+        if "stat_from" in op:
+            shutil.copystat(project_root / op["stat_from"], path)
+
+    sources = {op["source"] for op in operations if "source" in op}
+    file_deletes = [op for op in operations if op["action"] == "delete" and op.get("kind", "file") == "file"]
+    for op in file_deletes:
+        if op["path"] not in sources:
+            run(op, delete_file)
+    for op in operations:
+        if op["action"] == "delete" and op.get("kind") == "tree":
+            run(op, delete_tree)
+    for op in operations:
+        if op["action"] in ("create", "update", "link"):
+            run(op, write)
+        elif op["action"] == "unchanged":
+            counts["unchanged"] += 1
+    for op in file_deletes:
+        if op["path"] in sources:
+            run(op, delete_file)
+    empty_dirs = [op for op in operations if op["action"] == "delete" and op.get("kind") == "dir"]
+    for op in sorted(empty_dirs, key=lambda op: op["path"].count("/"), reverse=True):
+        try:
+            os.rmdir(project_root / op["path"])
+            counts["delete"] += 1
+        except OSError:
+            continue
+    return counts
+
+
+def _sync_directory(
+    source_dir: Path,
+    targets: list,
+    target_names: list,
+    target_envs: list,
+    source_name: str,
+    project_root: Path,
+    flat_copy: bool = False,
+    manifest: dict | None = None,
+    refresh_mode: str = "reconcile",
+    executor=None,
+    log: list | None = None,
+    changed: set | None = None,
+    link_mode: str = "copy",
+) -> dict:
+    """
+    単一ディレクトリの同期を実行する内部関数。
+    ファイル内の path_reference やスキルパス参照も環境別に変換する。
+
+    refresh_mode:
+      - reconcile: 期待される出力と既存ファイルの差分だけを反映する（デフォルト）
+                   内容が変わったファイルのみ書き込み、孤児ファイルのみ削除し、無いディレクトリのみ作成する
+      - replace  : マニフェストに出力の記録が無い場合（初回・--full-refresh）は、全ファイルを同階層の
+                   ステージングディレクトリ（.<名前>.staging）に書き直し、最後にターゲットごと rename で差し替える。
+                   記録があれば、ソースが変わった出力だけを比較せずに直接書き直し、孤児ファイル（マニフェスト外の
+                   残骸も含む）を reconcile と同じく削除する
+      - staged   : reconcile と同じ差分判定を行い、変更のあった最上位エントリ（スキル単位のディレクトリ、
+                   またはフラット配置のファイル）だけをステージングで組み立てて rename で差し替える。
+                   変更のないファイルはハードリンクで取り込む。ターゲットが無い場合は replace と同じく丸ごと公開する
+    いずれも最終状態は同じ（ソースと完全一致）。
+    staged と replace の全件更新では書きかけのツリーがターゲットに現れず、途中で失敗した同期先は前回の状態のまま残る
+    （ステージングは破棄し、次回実行時にも残骸を片付ける）。
+
+    manifest が渡され、かつ同期先の出力がマニフェストに記録済みの場合は差分同期となる:
+    ソースのハッシュが変わったファイルのみ読み込み・変換・書き込みを行い、
+    ソースが消えた出力とマニフェスト外の残骸（孤児ファイル）のみ削除する（ターゲットの全削除は行わない）。
+
+    各ソースファイルは1回だけ読み込み、全同期先向けの変換結果をまとめて書き込む（read-once / transform-many）。
+    STREAM_TRANSFORM_THRESHOLD 以上のテキストは読み込まずに mmap し、同期先ごとにバイト列のままストリーム変換して
+    チャンク単位で比較・書き込みを行う（ファイルサイズによらずメモリ使用量は一定。同期計画の記録中を除く）。
+    どの同期先向けのルールの needle も含まないテキスト（skill_text_may_change）はデコード・変換を省略し、
+    読み込んだバイト列をそのまま全同期先へ出力する（省略した数は書き込み集計の prefiltered に数える）。
+    テキスト以外のファイルは1回の読み込みを全出力先へストリーム書き込みし、
+    reconcile では size と mtime が一致する出力（copy2 済み）を変更なしとみなす。
+
+    executor（ThreadPoolExecutor）が渡された場合、同期先ごとの準備とファイル単位の書き込みを並列に行う。
+    出力メッセージは同期先の順に並べてから出すため、並列でも表示順・集計は変わらない。
+
+    link_mode が "copy" 以外の場合、テキスト変換しないファイルと、変換してもソースと同じバイト列になる
+    テキスト出力は _place_file（hardlink / reflink / copy_file_range）でソースから配置する。
+    同じソースから複数の同期先へ同一内容を出力する場合は、先に書いた出力から配置する。
+    COPY_ONLY_ENVS の同期先は link_mode にかかわらずコピーで配置する。
+
+    ソース・同期先の走査と stat は、実行単位の索引（fs_index_begin）が有効ならそこから取得する。
+
+    changed（watch モード）が渡された場合は、そのうち source_dir 配下のパスだけを対象にする:
+    存在するものは再変換・書き込みし、消えたものは全同期先の出力を削除する。
+    ソースツリー全体の走査・孤児検査は行わない（対象が無ければ何も出力せずに戻る）。
+
+    Args:
+        source_dir: 起点ディレクトリ
+        targets: 同期先ディレクトリのリスト
+        target_names: 表示用の同期先名のリスト
+        target_envs: 同期先の環境名リスト ("claude", "cursor", "codex")
+        source_name: 表示用の起点名
+        project_root: プロジェクトルート
+        flat_copy: Trueの場合、直下のファイルのみコピー（サブディレクトリ無視）
+        manifest: 差分同期用マニフェスト（load_sync_manifest の戻り値）。None なら毎回全件を比較/再生成
+        refresh_mode: "reconcile" | "replace" | "staged"（REFRESH_MODES）
+        executor: ファイルI/Oを並列実行するスレッドプール（None なら逐次）
+        log: 出力メッセージの格納先（None なら直接 print する）
+        changed: 変更のあったソースパス（絶対パス）の集合。None なら全件を同期
+        link_mode: 出力の配置方法（LINK_MODES。"copy" 以外は書き込みの代わりにリンク/複製を使う）
+
+    Returns:
+        {"written": 書き込み数, "unchanged": 内容が同一で書き込み不要だった数,
+         "skipped": マニフェストにより読み込み自体を省略した数, "removed": 削除した出力数}
+    """
+    import threading
+
+    if refresh_mode not in REFRESH_MODES:
+        raise ValueError(f"Unknown refresh mode: {refresh_mode}")
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link_mode}")
+
+    out = print if log is None else log.append
+    stats = {"written": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+    # 同期計画の記録中の位置。ワーカースレッドでは、同期先の準備・ソースファイルごとの位置に細分化して記録する
+    scope = _plan_call_scope()
+
+    def run_all(fn, tasks: list) -> list:
+        if executor is None:
+            return [fn(task) for task in tasks]
+        return list(executor.map(fn, tasks))
+
+    source_prefix = os.path.join(os.fspath(source_dir), "")
+
+    def dest_for(target_dir: Path, item: Path) -> Path:
+        if flat_copy:
+            # フラットコピー: ファイル名のみ使用
+            return target_dir / item.name
+        # 構造維持コピー: 相対パスを保持（ソース配下なら relative_to を使わず文字列で切り出す）
+        key = os.fspath(item)
+        if key.startswith(source_prefix):
+            return Path(os.path.join(os.fspath(target_dir), key[len(source_prefix):]))
+        return target_dir / item.relative_to(source_dir)
+
+    vanished = []
+    if changed is not None:
+        # watch モード: 変更のあったソースのみを対象にする
+        in_scope = sorted(
+            p for p in changed
+            if (p.parent == source_dir if flat_copy else source_dir in p.parents)
+        )
+        source_files = [p for p in in_scope if p.is_file()]
+        vanished = [p for p in in_scope if not p.exists()]
+        if not source_files and not vanished:
+            return stats
+        out(f"  📁 {source_name} (変更 {len(source_files)} / 削除 {len(vanished)})")
+    else:
+        if not fs_is_dir(source_dir):
+            out(f"  ⚠️ {source_name} が存在しないためスキップ")
+            return stats
+
+        # ソースのファイル一覧を取得
+        # flat_copy: 直下のファイルのみ（サブディレクトリは無視） / それ以外: サブディレクトリ含む全ファイル
+        source_files = fs_list_files(source_dir, recursive=not flat_copy)
+
+        file_count = len(source_files)
+
+        if file_count == 0:
+            out(f"  ⚠️ {source_name} にファイルがないためスキップ")
+            return stats
+
+        out(f"  📁 {source_name} ({file_count} ファイル)")
+
+    # ソースのハッシュは全ターゲットで共通なので1回だけ計算する
+    source_hashes = {}
+    if manifest is not None:
+        for item, digest in zip(source_files, run_all(
+            lambda item: _manifest_source_hash(manifest, project_root, item), source_files
+        )):
+            source_hashes[item] = digest
+
+    # 同期先ごとの作業内容（マニフェストの参照は並列化前にここで済ませる）
+    contexts = []
+    for rank, (target_dir, target_name, target_env) in enumerate(zip(targets, target_names, target_envs)):
+        planned = [(item, dest_for(target_dir, item)) for item in source_files]
+        target_exists = fs_is_dir(target_dir)
+        if manifest is None:
+            recorded = []
+            incremental = False
+        elif changed is not None:
+            # watch モードでは記録済みの出力の一覧は使わないため、有無だけを調べる（全出力キーを走査しない）
+            recorded = []
+            incremental = target_exists and _manifest_has_outputs_under(manifest, project_root, target_dir)
+        else:
+            recorded = _manifest_outputs_under(manifest, project_root, target_dir)
+            incremental = bool(recorded) and target_exists
+        # ターゲット全体をステージングで作り直して差し替えるか（replace の全件更新 / staged の初回）
+        stage_whole = changed is None and (
+            (refresh_mode == "replace" and not incremental)
+            or (refresh_mode == "staged" and not target_exists)
+        )
+        staging, trash = _staging_dirs(target_dir)
+        contexts.append({
+            "rank": rank,
+            "dir": target_dir,
+            "name": target_name,
+            "env": target_env,
+            "link_mode": _link_mode_for_env(target_env, link_mode),
+            # 以前の hardlink 実行でソースと実体を共有したままの出力を切り離すか（COPY_ONLY_ENVS を直接書き込む場合）
+            "unshare": link_mode == "hardlink" and target_env in COPY_ONLY_ENVS and not stage_whole
+                       and refresh_mode != "staged",
+            "recorded": recorded,
+            "incremental": incremental,
+            "planned": planned,
+            "known_dirs": set(),
+            "removed": 0,
+            "lines": [],
+            "error": None,
+            # staged / replace 用: ステージング先と、差し替えが必要な最上位エントリ
+            "staging": staging if stage_whole or refresh_mode == "staged" else None,
+            "trash": trash,
+            "stage_whole": stage_whole,
+            "compare": refresh_mode == "reconcile" or (refresh_mode == "staged" and not stage_whole),
+            "staging_dirs": set(),
+            "staged": set(),
+            "dirty": set(),
+            "drop": set(),
+            "swapped": 0,
+            "linked": 0,
+        })
+    link_lock = threading.Lock()
+
+    def remove_output(ctx: dict, stale: Path) -> bool:
+        """出力を1件削除し、空になった親ディレクトリも片付ける（全件リフレッシュ時と同じ状態にする）"""
+        target_dir = ctx["dir"]
+        try:
+            if fs_is_file(stale):
+                _fs_unlink(stale)
+                ctx["removed"] += 1
+        except OSError as e:
+            ctx["lines"].append(f"    ⚠️ 削除失敗 ({ctx['name']}): {_manifest_key(project_root, stale)}: {e}")
+            return False
+        parent = stale.parent
+        while parent != target_dir and target_dir in parent.parents:
+            try:
+                _fs_rmdir(parent)
+            except OSError:
+                break
+            parent = parent.parent
+        return True
+
+    def prepare_target(ctx: dict) -> None:
+        """孤児の削除（reconcile / replace の差分同期）、またはステージングの準備（_prepare_staging）を行う"""
+        with _plan_scope(*scope, 0, ctx["rank"]):
+            prepare_target_in_scope(ctx)
+
+    def prepare_target_in_scope(ctx: dict) -> None:
+        target_dir = ctx["dir"]
+        target_name = ctx["name"]
+        recorded = ctx["recorded"]
+        began = _profile_clock()
+        try:
+            expected = {dest for _, dest in ctx["planned"]}
+            if ctx["staging"] is not None:
+                # 前回中断したときのステージング・退避先が残っていれば片付ける
+                for leftover in (ctx["staging"], ctx["trash"]):
+                    if os.path.lexists(leftover):
+                        _fs_rmtree(leftover)
+            if changed is not None:
+                # watch モード: 消えたソースの出力のみ削除
+                for item in vanished:
+                    stale = dest_for(target_dir, item)
+                    if ctx["staging"] is not None:
+                        # staged: 削除も含めて最上位エントリごと差し替える
+                        if fs_is_file(stale):
+                            ctx["drop"].add(stale)
+                    elif not remove_output(ctx, stale):
+                        continue
+                    if manifest is not None:
+                        _manifest_drop_output(manifest, _manifest_key(project_root, stale))
+            elif ctx["staging"] is not None:
+                _prepare_staging(ctx, expected, manifest, project_root)
+                if ctx["stage_whole"]:
+                    return
+            else:
+                # reconcile、および replace の差分同期（全件更新は stage_whole でステージングする）:
+                # 孤児ファイルのみ削除（マニフェスト外の残骸も含む）
+                ctx["removed"], ctx["known_dirs"] = _reconcile_tree(
+                    target_dir, expected, label=target_name, log=ctx["lines"].append
+                )
+                if manifest is not None:
+                    for key in recorded:
+                        if project_root / key not in expected:
+                            _manifest_drop_output(manifest, key)
+            _ensure_dir(target_dir, ctx["known_dirs"])
+        except Exception as e:
+            ctx["error"] = e
+        finally:
+            _profile_target(target_name, began, files=0)
+
+    def publish_target(ctx: dict) -> None:
+        """ステージングした出力を rename でターゲットへ差し替え、ステージング・退避先を片付ける"""
+        with _plan_scope(*scope, 2, ctx["rank"]):
+            _publish_staging(ctx)
+
+    text_suffixes = {'.md', '.mdc', '.yaml', '.yml', '.txt'}
+
+    def output_path(ctx: dict, dest: Path) -> Path:
+        """dest を書き込む実際のパス（staged / replace ではステージング側）"""
+        if ctx["staging"] is not None:
+            return _stage_output(ctx, dest)
+        _ensure_dir(dest.parent, ctx["known_dirs"])
+        _unshare_file(dest)
+        return dest
+
+    def put_file(ctx: dict, dest: Path, origin: Path) -> Path:
+        """origin（ソース、または同じ内容の出力）を ctx の link_mode で dest に配置し、配置したパスを返す"""
+        path = output_path(ctx, dest)
+        if _place_file(origin, path, ctx["link_mode"]) != "copy":
+            with link_lock:
+                ctx["linked"] += 1
+        return path
+
+    def put_bytes(ctx: dict, dest: Path, data: bytes, origin: Path | None = None) -> Path | None:
+        """
+        data を出力し、書き込んだパスを返す（既存と同一内容で省略した場合は None）。
+        origin（内容が data と同じファイル）が渡されれば、書き込みの代わりに put_file で配置する
+        """
+        if ctx["compare"] and _has_same_bytes(dest, data):
+            return None
+        if origin is not None:
+            return put_file(ctx, dest, origin)
+        path = output_path(ctx, dest)
+        _write_bytes(path, data)
+        return path
+
+    def put_stream(ctx: dict, dest: Path, view, placed: dict) -> tuple[Path | None, str]:
+        """
+        put_bytes のストリーム版: view を ctx の環境向けにストリーム変換（_stream_skill_bytes）して出力し、
+        (書き込んだパス（省略した場合は None）, 出力内容の SHA-256) を返す。
+        比較・配置元の照合は内容の代わりに SHA-256 で行う（placed: SHA-256 → 同じ内容のファイル）
+        """
+        def chunks():
+            return _stream_skill_bytes(view, ctx["env"])
+
+        if ctx["compare"] and ctx["staging"] is None and link_mode == "copy":
+            # 配置元の照合が要らなければ、1回の変換で書きながら比較する（同一なら既存の出力は触らない）
+            _ensure_dir(dest.parent, ctx["known_dirs"])
+            digest, written = _write_stream_if_changed(dest, chunks())
+            return (dest if written else None), digest
+        if ctx["compare"] or link_mode != "copy":
+            digest, same = _scan_stream(chunks(), dest if ctx["compare"] else None)
+            if same:
+                return None, digest
+            if digest in placed:
+                return put_file(ctx, dest, placed[digest]), digest
+        path = output_path(ctx, dest)
+        return path, _write_stream(path, chunks())
+
+    def sync_source(index: int) -> None:
+        """
+        1つのソースファイルを1回だけ読み込み、全同期先向けの変換・書き込みを行う。
+        結果（written/unchanged/skipped/failed）は各同期先の outcomes[index] に記録する。
+        """
+        with _plan_scope(*scope, 1, index):
+            sync_source_in_scope(index)
+
+    def sync_source_in_scope(index: int) -> None:
+        item = source_files[index]
+        pending = []
+        for ctx in contexts:
+            dest = ctx["planned"][index][1]
+            if ctx["unshare"]:
+                # 削除しておけば、内容が同じでも書き直される
+                _unshare_file(dest)
+            if ctx["error"] is not None:
+                ctx["outcomes"][index] = "failed"
+            elif ctx["incremental"] and _manifest_output_is_fresh(manifest, project_root, item, source_hashes.get(item), dest):
+                ctx["outcomes"][index] = "skipped"
+                _plan_unchanged(dest)
+            else:
+                pending.append((ctx, dest))
+        if not pending:
+            return
+
+        def record(ctx: dict, dest: Path, path: Path | None, written: bytes | None, digest: str | None = None) -> None:
+            """path: 書き込み先（書き込みを省略した場合は None）"""
+            if manifest is not None:
+                _manifest_record_output(manifest, project_root, item, source_hashes[item], dest, written, path, digest)
+            if path is None:
+                _plan_unchanged(dest)
+            ctx["outcomes"][index] = "written" if path is not None else "unchanged"
+
+        def fail(ctx: dict, e: Exception) -> None:
+            if ctx["error"] is None:
+                ctx["error"] = e
+            ctx["outcomes"][index] = "failed"
+
+        # テキストファイルはバイト列を1回だけ読み込み、環境ごとにパス参照を変換する
+        # （STREAM_TRANSFORM_THRESHOLD 以上は読み込まずに mmap し、str にデコードせずストリーム変換する）
+        # 置換対象の文字列をどの同期先向けにも含まないファイル（prefilter）はデコード・変換せず、
+        # 全同期先へ同じバイト列（plain）を出力する（link_mode ではソースから配置できる）
+        raw = None
+        text = None
+        plain = None
+        view = None
+        began = _profile_clock()
+        if item.suffix in text_suffixes:
+            try:
+                if _sync_plan is None and fs_stat(item).st_size >= STREAM_TRANSFORM_THRESHOLD:
+                    view = _map_text_file(item)
+                else:
+                    # 同期計画の記録中は、先のフェーズで書き込んだはずの内容（埋め込みスクリプト等）を読む
+                    raw = _fs_read_bytes(item)
+                    if any(skill_text_may_change(raw, ctx["env"]) for ctx, _ in pending):
+                        text = _decode_text(raw)
+                    else:
+                        plain = _normalize_text_bytes(raw)
+                        _count_writes(prefiltered=1)
+            except UnicodeDecodeError:
+                # 読み取りエラーの場合はバイナリコピー
+                text = None
+            except Exception as e:
+                for ctx, _ in pending:
+                    fail(ctx, e)
+                return
+        _profile_target(f"{source_name}（読み込み）", began)
+
+        binary_dests = []
+        # link_mode: 出力済みのバイト列 → 配置元（同じ内容の出力を2回書かずにリンク/複製する）
+        placed = {raw: item} if raw is not None and link_mode != "copy" else {}
+        if view is not None and link_mode != "copy":
+            placed = {source_hashes.get(item) or _file_sha256(item): item}
+        for ctx, dest in pending:
+            began = _profile_clock()
+            try:
+                if view is not None:
+                    path, digest = put_stream(ctx, dest, view, placed)
+                    if link_mode != "copy":
+                        placed.setdefault(digest, path or dest)
+                    record(ctx, dest, path, None, digest)
+                elif text is not None or plain is not None:
+                    # 環境別にパス参照を変換
+                    written = plain if plain is not None else _encode_text(transform_skill_text(text, ctx["env"]))
+                    path = put_bytes(ctx, dest, written, placed.get(written))
+                    if link_mode != "copy":
+                        placed.setdefault(written, path or dest)
+                    record(ctx, dest, path, written)
+                elif raw is not None:
+                    # 読み込み済みのバイト列をそのまま書き、メタデータは copy2 と同様にコピー
+                    path = put_bytes(ctx, dest, raw, placed.get(raw))
+                    if path is not None:
+                        _copy_stat(item, path)
+                    record(ctx, dest, path, raw)
+                elif ctx["compare"] and _same_size_and_mtime(item, dest):
+                    record(ctx, dest, None, None)
+                elif ctx["link_mode"] != "copy":
+                    record(ctx, dest, put_file(ctx, dest, item), None)
+                else:
+                    binary_dests.append((ctx, dest, output_path(ctx, dest)))
+            except Exception as e:
+                fail(ctx, e)
+            _profile_target(ctx["name"], began)
+        if view is not None:
+            view.close()
+
+        if binary_dests:
+            # 非テキストファイルは1回の読み込みを全出力先へストリーム書き込み
+            began = _profile_clock()
+            try:
+                _copy_to_many(item, [path for _, _, path in binary_dests])
+            except Exception as e:
+                for ctx, _, _ in binary_dests:
+                    fail(ctx, e)
+                return
+            finally:
+                _profile_target(f"{source_name}（バイナリ一括コピー）", began)
+            for ctx, dest, path in binary_dests:
+                try:
+                    record(ctx, dest, path, None)
+                except Exception as e:
+                    fail(ctx, e)
+
+    run_all(prepare_target, contexts)
+    # ソースからターゲットへコピー（パス参照を変換）
+    for ctx in contexts:
+        ctx["outcomes"] = [None] * len(source_files)
+    run_all(sync_source, list(range(len(source_files))))
+    run_all(publish_target, contexts)
+
+    for ctx in contexts:
+        outcome = ctx["outcomes"]
+        for line in ctx["lines"]:
+            out(line)
+        if ctx["error"] is not None:
+            out(f"    ❌ → {ctx['name']} エラー: {ctx['error']}")
+            continue
+
+        copied_count = outcome.count("written")
+        unchanged_count = outcome.count("unchanged")
+        skipped_count = outcome.count("skipped")
+        linked = f" / うちリンク {ctx['linked']}" if link_mode != "copy" else ""
+        if refresh_mode == "staged":
+            out(
+                f"    ✅ → {ctx['name']} (書き込み {copied_count}{linked} / 変更なし {unchanged_count + skipped_count}"
+                f" / 削除 {ctx['removed']} / 差し替え {ctx['swapped']})"
+            )
+        elif ctx["incremental"] or refresh_mode == "reconcile" or changed is not None:
+            out(
+                f"    ✅ → {ctx['name']} (書き込み {copied_count}{linked} / 変更なし {unchanged_count + skipped_count}"
+                f" / 削除 {ctx['removed']})"
+            )
+        else:
+            out(f"    ✅ → {ctx['name']} ({copied_count} ファイル{linked})")
+        stats["written"] += copied_count
+        stats["unchanged"] += unchanged_count
+        stats["skipped"] += skipped_count
+        stats["removed"] += ctx["removed"]
+
+    _count_writes(stats["written"], stats["unchanged"] + stats["skipped"])
+    return stats
+
+WATCH_INTERVAL = 0.05
+# watch でマニフェストを書き出すまでの待ち時間（秒）。最後の反映からこの間に変更が無ければ書き出す（終了時にも書き出す）
+WATCH_MANIFEST_SAVE_DELAY = 2.0
+# inotify で監視する場合に、取りこぼしの保険として監視対象全体を走査し直す間隔（秒）
+WATCH_RESCAN_INTERVAL = 10.0
+
+
+def _stat_snapshot(roots: list, listings: dict | None = None, inode: bool = False) -> dict:
+    """
+    監視対象（ファイルまたはディレクトリ）配下の全ファイルの (mtime_ns, size) を、パス文字列をキーにして取得する。
+    ファイル内容は読まない。inode=True なら (inode, size, mtime_ns) を取得する（--check の記録用）。
+
+    listings（ディレクトリ → (mtime_ns, ファイル一覧, サブディレクトリ一覧)）を渡すと、前回から mtime が変わっていない
+    ディレクトリは一覧を読み直さず（os.scandir を省略し）、既知のファイルの stat だけを取る。
+    ファイルの追加・削除・rename はディレクトリの mtime を変えるため、一覧を使い回しても取りこぼさない。
+    """
+    snapshot = {}
+    visited = set()
+    for root in roots:
+        root = os.fspath(root)
+        try:
+            st = os.stat(root)
+        except OSError:
+            continue
+        if not os.path.isdir(root):
+            snapshot[root] = (st.st_ino, st.st_size, st.st_mtime_ns) if inode else (st.st_mtime_ns, st.st_size)
+            continue
+        stack = [(root, st.st_mtime_ns)]
+        while stack:
+            current, mtime_ns = stack.pop()
+            visited.add(current)
+            cached = listings.get(current) if listings is not None else None
+            if cached is not None and cached[0] == mtime_ns:
+                _, files, dirs = cached
+            else:
+                files, dirs = [], []
+                try:
+                    with os.scandir(current) as it:
+                        for entry in it:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    dirs.append(entry.path)
+                                elif entry.is_file():
+                                    files.append(entry.path)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                if listings is not None:
+                    listings[current] = (mtime_ns, files, dirs)
+            for path in files:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_ino, st.st_size, st.st_mtime_ns) if inode else (st.st_mtime_ns, st.st_size)
+            for path in dirs:
+                if listings is None:
+                    # 一覧を使い回さないなら、ディレクトリの mtime は要らない
+                    stack.append((path, None))
+                    continue
+                try:
+                    stack.append((path, os.stat(path, follow_symlinks=False).st_mtime_ns))
+                except OSError:
+                    continue
+    if listings is not None and len(listings) > len(visited):
+        # 消えたディレクトリの一覧を捨てる
+        for stale in listings.keys() - visited:
+            del listings[stale]
+    return snapshot
+
+
+def _diff_snapshots(before: dict, after: dict) -> set:
+    """追加・変更・削除されたファイルのパス集合を返す"""
+    changed = {path for path, stamp in after.items() if before.get(path) != stamp}
+    changed.update(path for path in before if path not in after)
+    return changed
+
+
+def _restat_paths(paths: set, snapshot: dict) -> set:
+    """
+    paths（パス文字列）だけを stat し直して snapshot を更新し、追加・変更・削除されたファイルのパス集合を返す。
+    ディレクトリは配下をまとめて比べる（作成・rename で現れた / 削除で消えたディレクトリ）
+    """
+    changed = set()
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is not None and not os.path.isdir(path):
+            stamp = (st.st_mtime_ns, st.st_size)
+            if snapshot.get(path) != stamp:
+                snapshot[path] = stamp
+                changed.add(path)
+            continue
+        prefix = os.path.join(path, "")
+        before = {key: stamp for key, stamp in snapshot.items() if key == path or key.startswith(prefix)}
+        after = _stat_snapshot([path]) if st is not None else {}
+        for key in _diff_snapshots(before, after):
+            if key in after:
+                snapshot[key] = after[key]
+            else:
+                del snapshot[key]
+            changed.add(key)
+    return changed
+
+
+# inotify（Linux）のイベント
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ISDIR = 0x40000000
+_INOTIFY_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+
+def _inotify_open(roots: list) -> dict | None:
+    """
+    監視対象を inotify で監視する（Linux のみ）。使えない場合（他の OS・監視数の上限など）は None を返し、
+    呼び出し側は _stat_snapshot のポーリングで監視する。
+    ディレクトリは配下のディレクトリごとに、ファイル（マスター）は親ディレクトリを監視してイベントを絞り込む
+    """
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        inotify_init1, inotify_add_watch = libc.inotify_init1, libc.inotify_add_watch
+    except (ImportError, OSError, AttributeError):
+        return None
+    fd = inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        return None
+    watcher = {"fd": fd, "add_watch": inotify_add_watch, "wds": {}, "dirs": {},
+               "roots": [os.fspath(root) for root in roots]}
+    if not _inotify_watch_roots(watcher):
+        _inotify_close(watcher)
+        return None
+    return watcher
+
+
+def _inotify_add(watcher: dict, path: str) -> bool:
+    """ディレクトリ path を監視に加える（監視済みなら何もしない。上限に達した場合は False）"""
+    if path in watcher["dirs"]:
+        return True
+    wd = watcher["add_watch"](watcher["fd"], os.fsencode(path), _INOTIFY_MASK)
+    if wd < 0:
+        import ctypes
+        import errno
+
+        # 監視中に消えたディレクトリは無視する（削除イベントで検出される）
+        return ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR)
+    # rename されたディレクトリは同じ wd が返るため、古いパスの対応を捨てる
+    previous = watcher["wds"].get(wd)
+    if previous is not None and previous != path:
+        watcher["dirs"].pop(previous, None)
+    watcher["wds"][wd] = path
+    watcher["dirs"][path] = wd
+    return True
+
+
+def _inotify_watch_tree(watcher: dict, root: str) -> bool:
+    """root 配下の全ディレクトリを監視に加える"""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        if not _inotify_add(watcher, current):
+            return False
+        try:
+            with os.scandir(current) as it:
+                stack.extend(entry.path for entry in it if entry.is_dir(follow_symlinks=False))
+        except OSError:
+            continue
+    return True
+
+
+def _inotify_watch_roots(watcher: dict) -> bool:
+    """監視対象のうち、存在するディレクトリ（配下を含む）と、ファイル・未作成のディレクトリの親を監視に加える"""
+    for root in watcher["roots"]:
+        if os.path.isdir(root):
+            ok = _inotify_watch_tree(watcher, root)
+        else:
+            parent = os.path.dirname(root)
+            ok = not os.path.isdir(parent) or _inotify_add(watcher, parent)
+        if not ok:
+            return False
+    return True
+
+
+def _inotify_relevant(watcher: dict, path: str) -> bool:
+    """path が監視対象（ファイルそのもの、またはディレクトリ配下）に含まれるか"""
+    return any(path == root or path.startswith(os.path.join(root, "")) for root in watcher["roots"])
+
+
+def _inotify_read(watcher: dict, timeout: float) -> set | None:
+    """
+    最大 timeout 秒イベントを待ち、届いたイベントのパス（監視対象のもののみ）の集合を返す。
+    作成・rename で現れたディレクトリは配下ごと監視に加える。
+    イベントを取りこぼした（キューあふれ・監視数の上限）場合は None を返す（呼び出し側で全体を走査し直す）
+    """
+    import select
+    import struct
+
+    fd = watcher["fd"]
+    if not select.select([fd], [], [], timeout)[0]:
+        return set()
+    touched = set()
+    overflow = False
+    while True:
+        try:
+            data = os.read(fd, 1 << 16)
+        except BlockingIOError:
+            break
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = struct.unpack_from("iIII", data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b"\0")
+            offset += 16 + length
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            parent = watcher["wds"].get(wd)
+            if parent is None:
+                continue
+            if mask & _IN_IGNORED:
+                # 監視していたディレクトリが消えた
+                del watcher["wds"][wd]
+                watcher["dirs"].pop(parent, None)
+                continue
+            path = os.path.join(parent, os.fsdecode(name)) if name else parent
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO) and os.path.isdir(path):
+                if path in watcher["roots"] or _inotify_relevant(watcher, path):
+                    overflow = not _inotify_watch_tree(watcher, path) or overflow
+            if _inotify_relevant(watcher, path):
+                touched.add(path)
+    return None if overflow else touched
+
+
+def _inotify_close(watcher: dict) -> None:
+    try:
+        os.close(watcher["fd"])
+    except OSError:
+        pass
+
+
+def _watch_roots(project_root: Path, origin: str) -> dict:
+    """
+    起点ごとの監視対象を返す。
+    起点以外の環境（同期の出力先）は監視しない（自分の書き込みで同期が循環しないようにする）。
+    """
+    origin_dirs = {
+        "claude": (".claude/skills", ".claude/commands", "CLAUDE.md"),
+        "cursor": (".cursor/skills", ".cursor/commands", ".cursor/rules/master_rules.mdc"),
+        "codex": (".codex/skills", ".codex/prompts", "AGENTS.md"),
+    }[origin]
+    skills_dir, commands_dir, master = (project_root / p for p in origin_dirs)
+    return {
+        "master": master,
+        "sync": [skills_dir, commands_dir, project_root / ".claude" / "agents", project_root / ".claude" / "commands"],
+        "scripts": [project_root / "scripts", project_root / "commons_scripts"],
+        "rules": project_root / ".cursor" / "rules" if origin == "cursor" else None,
+    }
+
+
+def apply_watch_changes(
+    project_root: Path,
+    origin: str,
+    changed: set,
+    manifest: dict,
+    preserve_content: bool = True,
+    refresh_mode: str = "reconcile",
+    jobs: int = 1,
+    link_mode: str = "copy",
+) -> bool:
+    """
+    watch モードで検出した変更を、そのパスから派生する出力だけに反映する。
+    - 起点マスター → 他マスター（update_master_files_only）
+    - 起点 skills/commands、.claude/agents → 他環境の対応ファイルのみ（sync_skills_and_commands）
+    - .cursor/rules（Cursor起点） → .claude/agents（create_agents_from_mdc）
+    - scripts/, commons_scripts/ → 同名の埋め込みスクリプトのみ（sync_embedded_skill_scripts）
+    manifest は反映したエントリだけを更新し、書き出さない（呼び出し側で save_sync_manifest する）
+    """
+    roots = _watch_roots(project_root, origin)
+    ok = True
+
+    if roots["master"] in changed and roots["master"].exists():
+        print(f"\n📋 マスターファイル更新（起点: {roots['master'].name}）")
+        ok = update_master_files_only(
+            project_root,
+            preserve_content=preserve_content,
+            preferred_source_name=roots["master"].name,
+            sync_after_master=False,
+        ) and ok
+
+    sync_changed = {p for p in changed if any(root in p.parents for root in roots["sync"])}
+    if sync_changed:
+        sync_skills_and_commands(
+            project_root, origin, manifest=manifest, refresh_mode=refresh_mode, jobs=jobs, changed=sync_changed,
+            link_mode=link_mode,
+        )
+
+    if roots["rules"] is not None and any(roots["rules"] in p.parents for p in changed):
+        ok = create_agents_from_mdc(preserve_content=preserve_content) and ok
+
+    script_names = {p.name for p in changed if p.parent in roots["scripts"]}
+    if script_names:
+        print(f"\n🧩 埋め込みスクリプト同期: {', '.join(sorted(script_names))}")
+        ok = sync_embedded_skill_scripts(
+            project_root, envs=list(EMBEDDED_SCRIPT_ENVS), names=script_names, link_mode=link_mode,
+        ) and ok
+
+    return ok
+
+
+# マスター波及で読み書きされるマスターファイル（--since / --changed-only でどれかが変わればマスター波及を行う）
+SYNC_MASTER_LOCATIONS = (
+    "AGENTS.md",
+    "CLAUDE.md",
+    ".cursor/rules/master_rules.mdc",
+    ".gemini/GEMINI.md",
+    ".kiro/steering/KIRO.md",
+    ".github/copilot-instructions.md",
+)
+# skills/commands 同期の出力先（マニフェストに記録される）
+SYNC_OUTPUT_LOCATIONS = (
+    ".claude/skills",
+    ".cursor/skills",
+    ".codex/skills",
+    ".opencode/skills",
+    ".claude/commands",
+    ".cursor/commands",
+    ".codex/prompts",
+    ".opencode/command",
+    ".claude/agents",
+    ".opencode/agent",
+)
+
+
+def git_changed_paths(project_root: Path, since: str | None = None) -> set[Path] | None:
+    """
+    ローカルの git でプロジェクトルート配下の変更パスを集める（削除されたパスも含む）。
+    - since 指定時: git diff --name-only <since>（since 以降のコミット + 未コミットの変更）
+    - 常に: git status --porcelain（ステージ済み・未ステージ・未追跡）
+    git が無い・リポジトリでない・ref が不正な場合は None
+    """
+    import subprocess
+
+    def git(*git_args: str) -> bytes | None:
+        try:
+            result = subprocess.run(["git", *git_args], cwd=project_root, capture_output=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            stderr = getattr(e, "stderr", None)
+            detail = stderr.decode("utf-8", "replace").strip() if stderr else str(e)
+            print(f"⚠️  git {git_args[0]} に失敗しました: {detail}")
+            return None
+        return result.stdout
+
+    # status --porcelain のパスはリポジトリのルートからの相対（プロジェクトルートがサブディレクトリでも）
+    prefix = git("rev-parse", "--show-prefix")
+    if prefix is None:
+        return None
+    prefix = os.fsdecode(prefix.strip())
+
+    names = []
+    if since is not None:
+        out = git("diff", "--name-only", "--no-renames", "--relative", "-z", since, "--")
+        if out is None:
+            return None
+        names.extend(os.fsdecode(name) for name in out.split(b"\0") if name)
+    out = git("status", "--porcelain", "--no-renames", "--untracked-files=all", "-z", "--", ".")
+    if out is None:
+        return None
+    for entry in out.split(b"\0"):
+        # "XY path" 形式
+        name = os.fsdecode(entry[3:])
+        if name.startswith(prefix):
+            names.append(name[len(prefix):])
+    return {project_root / name for name in names if name}
+
+
+def select_changed_sources(project_root: Path, origin: str, changed: set, manifest: dict) -> tuple[set, str | None]:
+    """
+    変更パスのうち、起点から派生する出力へ差分で反映できるもの（apply_watch_changes に渡すもの）を選ぶ。
+
+    - 起点の skills/commands・.claude/agents・scripts/（Cursor起点なら .cursor/rules も） → そのまま反映対象
+    - マスターファイルのどれか → 起点マスターからのマスター波及
+    - 同期先の出力 → 前回の同期で書き込んだまま（マニフェストの size / mtime と一致）なら無視
+    - それ以外のパス（ドキュメント、他環境向けの .mdc 等）は同期に関係しないため無視
+    直接編集・削除された出力や変換スクリプト自体の変更など、差分では反映しきれない変更があれば
+    理由を返す（呼び出し側は全件同期に切り替える）。
+
+    Returns:
+        (反映対象の変更パス, 全件同期が必要な理由。不要なら None)
+    """
+    roots = _watch_roots(project_root, origin)
+    sources = [*roots["sync"], *roots["scripts"]]
+    if roots["rules"] is not None:
+        sources.append(roots["rules"])
+    masters = {project_root / p for p in SYNC_MASTER_LOCATIONS}
+    outputs = [project_root / p for p in SYNC_OUTPUT_LOCATIONS]
+    script = Path(__file__).resolve()
+
+    def under(path: Path, bases: list) -> bool:
+        return any(base == path or base in path.parents for base in bases)
+
+    selected = set()
+    for path in sorted(changed):
+        key = _manifest_key(project_root, path)
+        if path.resolve() == script:
+            return set(), f"変換スクリプト自体の変更（{key}）"
+        if path in masters:
+            if not fs_is_file(roots["master"]):
+                # 起点マスターが無いと、マスター波及は別のマスターを起点に選ぶ
+                return set(), f"起点マスターが無い状態でのマスター変更（{key}）"
+            selected.add(roots["master"])
+            continue
+        if under(path, sources):
+            selected.add(path)
+            continue
+        if not under(path, outputs):
+            continue
+        entry = manifest["outputs"].get(key)
+        try:
+            st = fs_stat(path)
+        except OSError:
+            st = None
+        if entry is None and st is None:
+            # 前回の同期で削除した出力
+            continue
+        if entry is None or st is None or st.st_size != entry.get("size") or st.st_mtime_ns != entry.get("mtime_ns"):
+            return set(), f"同期先の出力の変更（{key}）"
+    return selected, None
+
+
+def detect_changed_sources(project_root: Path, origin: str, since: str | None = None) -> tuple[set, dict] | None:
+    """
+    --since / --changed-only: git の変更から、差分だけで反映できるソースの変更を求める。
+    全件同期が必要な場合（git が使えない・前回の同期結果が無い・対応付けが曖昧）は理由を表示して None を返す
+
+    Returns:
+        (反映するソースの変更パス, マニフェスト)
+    """
+    changed = git_changed_paths(project_root, since)
+    if changed is None:
+        print("ℹ️  git の変更を取得できないため、全件同期します")
+        return None
+    manifest = load_sync_manifest(project_root)
+    if not manifest["outputs"]:
+        print(f"ℹ️  前回の同期結果（{SYNC_MANIFEST_NAME}）が無いため、全件同期します")
+        return None
+    selected, reason = select_changed_sources(project_root, origin, changed, manifest)
+    if reason is not None:
+        print(f"ℹ️  {reason}があるため、全件同期します")
+        return None
+    return selected, manifest
+
+
+def apply_changed_sources(
+    project_root: Path,
+    origin: str,
+    sources: set,
+    manifest: dict,
+    preserve_content: bool = True,
+    refresh_mode: str = "reconcile",
+    jobs: int = 1,
+    link_mode: str = "copy",
+) -> bool:
+    """
+    select_changed_sources で選んだ変更を反映する（apply_watch_changes）。
+    scripts/ の変更は起点 skills 内の埋め込みスクリプトも書き換えるため、書き換えた埋め込みスクリプトを
+    起点の変更として続けて他環境へ反映する（--watch では次回のポーリングで拾う連鎖を、1回の実行で済ませる）
+    """
+    options = dict(preserve_content=preserve_content, refresh_mode=refresh_mode, jobs=jobs, link_mode=link_mode)
+    ok = apply_watch_changes(project_root, origin, sources, manifest, **options)
+
+    roots = _watch_roots(project_root, origin)
+    script_names = {p.name for p in sources if p.parent in roots["scripts"]}
+    if script_names and origin in EMBEDDED_SCRIPT_ENVS:
+        skills_dir = roots["sync"][0]
+        entries = _fs_entries(skills_dir)
+        embedded = {
+            skills_dir / skill / "scripts" / name
+            for skill in (entries[1] if entries else [])
+            for name in script_names
+            if fs_is_file(skills_dir / skill / "scripts" / name)
+        }
+        if embedded:
+            ok = apply_watch_changes(project_root, origin, embedded, manifest, **options) and ok
+    save_sync_manifest(project_root, manifest)
+    return ok
+
+
+def watch_and_sync(
+    project_root: Path,
+    origin: str,
+    preserve_content: bool = True,
+    refresh_mode: str = "reconcile",
+    jobs: int = 1,
+    interval: float = WATCH_INTERVAL,
+    link_mode: str = "copy",
+) -> None:
+    """
+    起点のソースツリーを監視し、変更のあったファイルだけを同期し続ける。
+
+    - Linux では inotify でイベントのあったパスだけを stat し直す（待機中は走査しない）。
+      取りこぼしの保険として WATCH_RESCAN_INTERVAL 秒ごとに全体を走査し直す
+    - inotify が使えない場合は interval 秒ごとに stat スナップショット（_stat_snapshot）を取り、前回との差分を検出する
+      （mtime の変わらないディレクトリは一覧を読み直さない）
+    - 連続した保存（バースト）は、interval の間に新たな変化が無くなるまで待ってからまとめて反映する
+    - 反映による書き込みは次回の検出で拾われ、派生先（例: .claude/agents → .opencode/agent）へ
+      連鎖的に反映される（各同期は内容が同じなら書き込まないため、連鎖は必ず止まる）
+    - マニフェストは反映したエントリだけを更新し、最後の反映から WATCH_MANIFEST_SAVE_DELAY 秒たったときと終了時に書き出す
+    Ctrl+C で終了する。
+    """
+    import time
+
+    roots = _watch_roots(project_root, origin)
+    watched = [roots["master"], *roots["sync"], *roots["scripts"]]
+    if roots["rules"] is not None:
+        watched.append(roots["rules"])
+
+    manifest = load_sync_manifest(project_root) or {"version": SYNC_MANIFEST_VERSION, "sources": {}, "outputs": {}}
+    # ディレクトリの一覧は mtime が変わったときだけ読み直す（_stat_snapshot）
+    listings = {}
+    snapshot = _stat_snapshot(watched, listings)
+    watcher = _inotify_open(watched)
+    take_write_counts()
+    method = "inotify" if watcher is not None else f"間隔 {interval * 1000:.0f} ms"
+    print(f"\n👀 変更監視を開始しました（{len(snapshot)} ファイル / {method}、Ctrl+C で終了）")
+
+    next_rescan = time.monotonic() + WATCH_RESCAN_INTERVAL
+    last_applied = None
+
+    def poll(timeout: float) -> set:
+        """最大 timeout 秒待ち、前回から追加・変更・削除されたファイルのパス文字列の集合を返す"""
+        nonlocal snapshot, next_rescan
+        if watcher is not None:
+            touched = _inotify_read(watcher, timeout)
+            if touched is not None and time.monotonic() < next_rescan:
+                return _restat_paths(touched, snapshot)
+            # 取りこぼしの保険: 全体を走査し直し、監視できていないディレクトリ（後から作られた監視対象など）を加える
+            next_rescan = time.monotonic() + WATCH_RESCAN_INTERVAL
+            _inotify_watch_roots(watcher)
+        else:
+            time.sleep(timeout)
+        current = _stat_snapshot(watched, listings)
+        changed = _diff_snapshots(snapshot, current)
+        snapshot = current
+        return changed
+
+    try:
+        while True:
+            changed = poll(interval)
+            if not changed:
+                # マニフェストは反映が落ち着いてから書き出す（反映ごとに全体を書き直さない）
+                if last_applied is not None and time.monotonic() - last_applied >= WATCH_MANIFEST_SAVE_DELAY:
+                    save_sync_manifest(project_root, manifest)
+                    last_applied = None
+                continue
+
+            # デバウンス: 変化が落ち着くまで待ってからまとめて反映する
+            while True:
+                more = poll(interval)
+                if not more:
+                    break
+                changed |= more
+
+            started = time.perf_counter()
+            changed = {Path(path) for path in changed}
+            print(f"\n🔔 変更検出: {len(changed)} ファイル")
+            for path in sorted(changed)[:10]:
+                print(f"  - {_manifest_key(project_root, path)}")
+            if len(changed) > 10:
+                print(f"  ... 他 {len(changed) - 10} ファイル")
+            try:
+                ok = apply_watch_changes(
+                    project_root, origin, changed, manifest,
+                    preserve_content=preserve_content, refresh_mode=refresh_mode, jobs=jobs, link_mode=link_mode,
+                )
+            except Exception as e:
+                print(f"💥 反映中にエラーが発生しました: {e}")
+                ok = False
+            last_applied = time.monotonic()
+            elapsed = (time.perf_counter() - started) * 1000
+            counts = take_write_counts()
+            print(
+                f"{'⚡' if ok else '⚠️'} 反映完了（{elapsed:.0f} ms、書き込み {counts['written']}"
+                f" / 内容同一 {counts['unchanged']} / 変換不要 {counts['prefiltered']}）"
+            )
+    except KeyboardInterrupt:
+        print("\n👋 変更監視を終了しました")
+    finally:
+        if watcher is not None:
+            _inotify_close(watcher)
+        save_sync_manifest(project_root, manifest)
+
+
+def expand_batch_roots(patterns: list) -> list[Path]:
+    """
+    --batch の指定をプロジェクトルートの一覧にする（指定順、重複は除く）。
+    各指定はディレクトリ、または glob（例: ~/agents/*）。.cursor/rules が無いディレクトリは対象外
+    """
+    import glob
+
+    roots = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        matches = sorted(glob.glob(pattern)) if any(c in pattern for c in "*?[") else [pattern]
+        if not matches:
+            print(f"⚠️  一致するディレクトリがありません: {pattern}")
+        for match in matches:
+            root = Path(match).resolve()
+            if not root.is_dir() or root in roots:
+                continue
+            if not (root / ".cursor" / "rules").is_dir():
+                print(f"⚠️  プロジェクトルートではないため対象外（.cursor/rules なし）: {root}")
+                continue
+            roots.append(root)
+    return roots
+
+
+def _batch_worker(root: str, args: argparse.Namespace) -> dict:
+    """
+    --batch の1リポジトリ分の同期（プロセスプールのワーカーで実行する）。
+    カレントディレクトリを root に移して main を呼び、表示は捨てて（失敗時は末尾だけ）結果を返す
+    """
+    import io
+
+    output = io.StringIO()
+    summary = {}
+    cwd = os.getcwd()
+    started = time.perf_counter()
+    take_write_counts()
+    try:
+        os.chdir(root)
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            returncode = main(args=args, summary=summary)
+    except BaseException as e:
+        output.write(f"\n💥 {type(e).__name__}: {e}\n")
+        returncode = 1
+    finally:
+        os.chdir(cwd)
+        # 途中で失敗しても、同じワーカーの次のリポジトリに索引・計画を持ち越さない
+        sync_plan_end()
+        fs_index_end()
+    result = {"root": root, "returncode": returncode, "seconds": round(time.perf_counter() - started, 3), **summary}
+    if returncode:
+        result["output_tail"] = output.getvalue()[-2000:]
+    return result
+
+
+def _batch_counts_text(result: dict) -> str:
+    if "drifted" in result:
+        return f"ずれ {len(result['drifted'])} 件"
+    if "plan" in result:
+        return " / ".join(f"{action} {n}" for action, n in result["plan"].items() if n)
+    if "applied" in result:
+        return " / ".join(f"{action} {n}" for action, n in result["applied"].items() if n)
+    if "written" in result:
+        return f"書き込み {result['written']} / 内容同一 {result['unchanged']} / 変換不要 {result['prefiltered']}"
+    return ""
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    """
+    複数のプロジェクトルートを、プロセスプールで並列に同期する（--batch）。
+
+    各リポジトリは別プロセスで main と同じ処理を行う（リポジトリごとに Python を起動し直さない）。
+    結果（成否・所要時間・書き込み数、--plan / --dry-run では計画の件数）をまとめて表示し、
+    --batch-report を指定すれば JSON に保存する。--fail-fast なら最初の失敗で未着手のリポジトリを取り消す。
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    roots = expand_batch_roots(args.batch)
+    if not roots:
+        print("❌ 同期対象のプロジェクトルートがありません")
+        return 1
+    jobs = args.batch_jobs or min(len(roots), os.cpu_count() or 1)
+    # 各リポジトリでは確認を出さない（確認は起動時に1回だけ行う）
+    repo_args = argparse.Namespace(**{**vars(args), "batch": None, "force": True})
+
+    print(f"\n📦 バッチ同期: {len(roots)} リポジトリ / {jobs} プロセス（起点: {args.source}）")
+    results = {}
+
+    def collect(future, root: Path) -> dict:
+        try:
+            result = future.result()
+        except Exception as e:
+            # ワーカープロセス自体の異常終了など
+            result = {"root": str(root), "returncode": 1, "seconds": None, "output_tail": f"💥 {e}"}
+        results[str(root)] = result
+        status = "✅" if result["returncode"] == 0 else "❌"
+        print(f"{status} {result['root']} ({result['seconds']}s) {_batch_counts_text(result)}")
+        if result["returncode"]:
+            print(result.get("output_tail", ""))
+        return result
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_batch_worker, str(root), repo_args): root for root in roots}
+        for future in as_completed(futures):
+            if collect(future, futures[future])["returncode"] and args.fail_fast:
+                cancelled = sum(f.cancel() for f in futures)
+                print(f"⏹️  --fail-fast: 未着手の {cancelled} リポジトリを取り消しました")
+                break
+        # 取り消す前に実行中だった分も結果に含める
+        for future, root in futures.items():
+            if str(root) not in results and not future.cancelled():
+                collect(future, root)
+    elapsed = time.perf_counter() - started
+
+    report = [results.get(str(root), {"root": str(root), "returncode": None, "seconds": None}) for root in roots]
+    succeeded = sum(r["returncode"] == 0 for r in report)
+    failed = sum(bool(r["returncode"]) for r in report)
+    skipped = sum(r["returncode"] is None for r in report)
+    written = sum(r.get("written", 0) for r in report)
+    print(
+        f"\n📊 バッチ同期結果: 成功 {succeeded} / 失敗 {failed} / 未実行 {skipped}"
+        f"（{elapsed:.2f}s、書き込み {written} ファイル）"
+    )
+    if args.batch_report:
+        path = Path(args.batch_report)
+        path.write_text(json.dumps({
+            "source": args.source,
+            "jobs": jobs,
+            "seconds": round(elapsed, 3),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "results": report,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 バッチ結果を保存しました: {path}")
+    return 0 if failed == 0 and skipped == 0 else 1
+
+
+def main(argv: list | None = None, args: argparse.Namespace | None = None, summary: dict | None = None):
+    """
+    スクリプトのエントリーポイント
+
+    Args:
+        argv: コマンドライン引数（None なら sys.argv）
+        args: 解析済みの引数（--batch の各リポジトリ用。指定時は argv を使わない）
+        summary: 渡された場合、書き込み集計（--plan / --dry-run では計画の件数、--apply では適用結果）を格納する
+    """
+    parser = argparse.ArgumentParser(description='起点別の単方向同期 + マスター波及スクリプト')
+    parser.add_argument(
+        '--source',
+        choices=['cursor', 'claude', 'codex'],
+        default='claude',
+        help='''同期の起点を指定（デフォルト: claude）:
+  claude  : .claude/{skills,commands} → .cursor/.codex + マスター波及（CLAUDE.md起点）
+  codex   : .codex/{skills,prompts}  → .cursor/.claude + マスター波及（AGENTS.md起点）
+  cursor  : .cursor/{skills,commands}→ .claude/.codex + マスター波及（master_rules.mdc起点）''',
+    )
+    parser.add_argument('--dry-run', action='store_true',
+                        help='実際の変換を行わず、同期計画（作成・更新・リンク・削除する出力）を表示のみ')
+    parser.add_argument('--force', action='store_true',
+                        help='確認なしで実行')
+    parser.add_argument(
+        '--legacy-transform',
+        action='store_true',
+        help='旧来の正規化/不要セクション削除/パス書き換えを有効化（互換より変換優先）',
+    )
+    parser.add_argument(
+        '--full-refresh',
+        action='store_true',
+        help=f'差分同期マニフェスト（{SYNC_MANIFEST_NAME}）を使わず、同期先を全件再生成する',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='同期先（環境）とファイル書き込みを N スレッドで並列処理する（デフォルト: 1 = 逐次）',
+    )
+    parser.add_argument(
+        '--refresh-mode',
+        choices=list(REFRESH_MODES),
+        default='reconcile',
+        help='''同期先の更新方法（デフォルト: reconcile）:
+  reconcile : 差分のあるファイルのみ書き込み、孤児ファイルのみ削除（mtimeを保つ）
+  replace   : 同期先をステージングで再作成し、丸ごと差し替える（マニフェストに記録がある2回目以降は、
+              ソースが変わったファイルだけを比較せずに書き直し、孤児ファイルを削除する）
+  staged    : reconcile と同じ差分判定で、変更のあったスキル/ファイル単位だけをステージングから差し替える
+              （skills/commands 同期のみ。ルールからのスキル生成・コマンド同期は reconcile と同じ）''',
+    )
+    parser.add_argument(
+        '--link-mode',
+        choices=list(LINK_MODES),
+        default='copy',
+        help='''変換しないファイル（アセット・埋め込みスクリプト、変換後もソースと同一のテキスト）の配置方法（デフォルト: copy）:
+  copy     : 通常のコピー（shutil.copy2）
+  reflink  : CoW 複製（FICLONE）→ copy_file_range → 通常コピーの順に自動フォールバック
+  hardlink : ハードリンク（作れない場合は reflink と同じ）。出力を直接編集するとソースも変わる
+.codex への出力はソースと実体を共有しないよう、常に copy で配置する''',
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=PROFILE_REPORT_NAME,
+        default=None,
+        metavar='JSON',
+        help=f'フェーズ・同期先ごとの時間と I/O 回数を計測し、要約を表示して JSON に保存する（デフォルト: {PROFILE_REPORT_NAME}）',
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='同期後も起点のソースを監視し、変更のあったファイルの派生先だけを同期し続ける（Ctrl+C で終了）',
+    )
+    parser.add_argument(
+        '--watch-interval',
+        type=float,
+        default=WATCH_INTERVAL,
+        metavar='SEC',
+        help=f'--watch のポーリング間隔（秒）。連続保存はこの間隔だけ変化が止まってから反映する（デフォルト: {WATCH_INTERVAL}）',
+    )
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='書き込みを行わずに、派生環境（マスター・skills・commands・agents・埋め込みスクリプト）が起点と一致するか検査する。'
+             'ずれている出力を一覧表示し、あれば終了コード 1（pre-commit / CI 用）。'
+             '全件の同期が成功したときに各ファイルの (inode, size, mtime_ns) の指紋を .sync-cache/check-stamp.json に記録し、'
+             '--check はそれと照合して、変わっていなければ検査を省略する（--full-refresh で検査し直す。--check 自体は何も書き込まない）',
+    )
+    parser.add_argument(
+        '--since',
+        default=None,
+        metavar='REF',
+        help='git の REF 以降に変更されたソース（未コミット・未追跡の変更を含む）から派生する出力だけを同期する（対応付けが曖昧なら全件同期）',
+    )
+    parser.add_argument(
+        '--changed-only',
+        action='store_true',
+        help='未コミットの変更（git status）があるソースから派生する出力だけを同期する（対応付けが曖昧なら全件同期）',
+    )
+    parser.add_argument(
+        '--plan',
+        nargs='?',
+        const=SYNC_PLAN_NAME,
+        default=None,
+        metavar='JSON',
+        help=f'書き込みを行わずに同期計画（create/update/link/delete/unchanged）を作り、JSON に保存する（デフォルト: {SYNC_PLAN_NAME}）',
+    )
+    parser.add_argument(
+        '--apply',
+        default=None,
+        metavar='JSON',
+        help='--plan で保存した同期計画を実行する（計画後に変更された出力はスキップ）。--dry-run 併用時は内容の表示のみ',
+    )
+    parser.add_argument(
+        '--batch',
+        nargs='+',
+        default=None,
+        metavar='ROOT',
+        help='複数のプロジェクトルート（ディレクトリ、または ~/agents/* のような glob）をプロセスプールでまとめて同期する',
+    )
+    parser.add_argument(
+        '--batch-jobs',
+        type=int,
+        default=0,
+        metavar='N',
+        help='--batch のプロセス数（デフォルト: CPU 数とリポジトリ数の小さい方）',
+    )
+    parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        help='--batch で失敗したリポジトリがあれば、未着手のリポジトリを実行せずに終了する（デフォルト: 続行）',
+    )
+    parser.add_argument(
+        '--batch-report',
+        default=None,
+        metavar='JSON',
+        help='--batch のリポジトリごとの結果（成否・所要時間・書き込み数）を JSON に保存する',
+    )
+    # 互換（過去の変換仕様）: 現状は preserve_content のみ切替に使用
+
+    if args is None:
+        args = parser.parse_args(argv)
+
+    # --source が未指定の場合は選択を促す
+    if args.source is None:
+        print("\n⚠️  起点（--source）が指定されていません。")
+        print("現在編集しているファイル群を起点として指定してください:\n")
+        print("  --source cursor : Cursor (.cursor/) を起点に他環境へ同期")
+        print("  --source claude : Claude (.claude/) を起点に他環境へ同期")
+        print("  --source codex  : Codex (.codex/) を起点に他環境へ同期")
+        print("\n例: python scripts/update_agent_master.py --source cursor --force")
+        return 1
+
+    if args.watch and (args.dry_run or args.plan or args.apply or args.check):
+        print("❌ --watch は --dry-run / --plan / --apply / --check と併用できません")
+        return 1
+    if args.check and (args.plan or args.apply):
+        print("❌ --check は --plan / --apply と併用できません")
+        return 1
+    if args.plan and args.apply:
+        print("❌ --plan と --apply は併用できません")
+        return 1
+    changed_only = args.since is not None or args.changed_only
+    if changed_only and (args.full_refresh or args.apply):
+        print("❌ --since / --changed-only は --full-refresh / --apply と併用できません")
+        return 1
+    # dry-run は「計画のみ」: 実際の実行と同じ処理で同期計画を作り、書き込みは行わない
+    # --check も同期計画を作り、計画と出力の内容を比べるだけ（書き込みなし）
+    planning = args.dry_run or args.plan is not None or args.check
+
+    if args.batch:
+        if args.watch:
+            print("❌ --batch は --watch と併用できません")
+            return 1
+        if not args.force and not planning:
+            print(f"\n⚠️  各リポジトリの既存ファイルが上書きされます。続行しますか？ (y/N): ", end="")
+            if input().lower() != 'y':
+                print("処理を中止しました。")
+                return 0
+        return run_batch(args)
+
+    try:
+        project_root = get_root_directory()
+
+        if not project_root.exists():
+            print(f"❌ プロジェクトルートディレクトリが存在しません: {project_root}")
+            return 1
+
+        print(f"\n🔄 起点別の同期・マスター波及スクリプト開始")
+        print(f"🖥️  プラットフォーム: {platform.system()}")
+        print(f"📍 変換方向: {args.source}")
+        print(f"🔍 ドライラン: {args.dry_run}")
+        preserve_content = not args.legacy_transform
+        if args.profile:
+            enable_profiling()
+
+        if not args.force and not planning:
+            print(f"\n⚠️  既存ファイルが上書きされます。続行しますか？ (y/N): ", end="")
+            if input().lower() != 'y':
+                print("処理を中止しました。")
+                return 0
+
+        if args.apply:
+            plan_path = project_root / args.apply
+            plan = load_sync_plan(plan_path)
+            print(f"\n📋 同期計画: {plan_path}（{plan['created']} 作成）")
+            if args.dry_run:
+                print_sync_plan(plan)
+                return 0
+            counts = apply_sync_plan(project_root, plan)
+            print("🎯 同期計画の適用完了: " + " / ".join(f"{k} {v}" for k, v in counts.items()))
+            if summary is not None:
+                summary["applied"] = counts
+            return 1 if counts["failed"] else 0
+
+        # --check: 前回の全件同期からファイルの (inode, size, mtime_ns) が変わっていなければ、計画を作らずに済ませる
+        # （記録は全件の同期が保存し、--check は読むだけ。--since / --changed-only は一部だけの同期・検査、
+        # --full-refresh の --check は記録を使わずに検査し直す）
+        check_options = None
+        check_started_ns = time.time_ns()
+        if not changed_only and (args.check or not planning):
+            script_st = os.stat(__file__)
+            check_options = {
+                "source": args.source,
+                "preserve_content": preserve_content,
+                "script": [script_st.st_ino, script_st.st_size, script_st.st_mtime_ns],
+            }
+            if args.check and not args.full_refresh:
+                with profile_phase("同期チェック（記録の照合）"):
+                    unchanged = check_stamp_matches(project_root, check_options)
+                if unchanged:
+                    print("\n✅ 同期チェック: 前回の同期から変更がありません（--full-refresh で検査し直します）")
+                    if summary is not None:
+                        summary["drifted"] = []
+                    if args.profile:
+                        write_profile_report(project_root / args.profile)
+                    return 0
+
+        refresh_mode = args.refresh_mode
+        if planning and refresh_mode != "reconcile":
+            # ステージングでの差し替えは計画できない（最終状態は reconcile と同じ）
+            print(f"ℹ️  同期計画は reconcile で作成します（--refresh-mode {refresh_mode} は適用時に使われません）")
+            refresh_mode = "reconcile"
+
+        success = False
+        plan = None
+        # 今回の実行中は、各フェーズの走査・stat・mkdir 判定を1つの索引で共有する（watch の待機中は無効）
+        fs_index_begin()
+        if planning:
+            sync_plan_begin(project_root)
+
+        def run_simple(origin: str) -> bool:
+            """
+            Claude / Codex / Cursor を起点に、他環境へ同期する。
+            - 先にマスター波及（起点マスターを明示）
+            - 埋め込みスクリプトを更新（codexは権限事情で除外）し、Cursor起点なら agents を生成する
+            - skills/commands(prompts) を同期（非破壊上書き）
+            起点の skills / .claude/agents を書き換える処理は同期より先に済ませ、1回の実行で他環境まで揃える
+            （後にすると、他環境への反映が次回の実行までずれる）。Codex起点では起点の埋め込みスクリプトを
+            書き換えないため、従来どおり同期の後で他環境の埋め込みスクリプトを scripts/ に揃える
             """
             preferred_master = {
                 "claude": "CLAUDE.md",
@@ -2743,35 +6733,73 @@ def main():
             }[origin]
 
             print(f"\n📋 マスターファイル更新（起点: {preferred_master}）")
-            master_ok = update_master_files_only(
-                project_root,
-                args.dry_run,
-                preserve_content=preserve_content,
-                preferred_source_name=preferred_master,
-                sync_after_master=False,
-            )
+            with profile_phase("マスター波及"):
+                master_ok = update_master_files_only(
+                    project_root,
+                    preserve_content=preserve_content,
+                    preferred_source_name=preferred_master,
+                    sync_after_master=False,
+                )
 
-            if args.dry_run:
-                print(f"\n🔍 [DRY-RUN] {origin}起点: スキル/コマンドの同期予定")
-                sync_ok = True
-            else:
-                sync_skills_and_commands(project_root, origin)
-                sync_ok = True
+            def sync_embedded() -> bool:
+                print(f"\n🧩 埋め込みスクリプト同期開始（scripts/ + commons_scripts/ → skills/*/scripts）")
+                with profile_phase("埋め込みスクリプト同期"):
+                    return sync_embedded_skill_scripts(
+                        project_root, envs=list(EMBEDDED_SCRIPT_ENVS), link_mode=args.link_mode,
+                    )
+
+            embedded_ok = sync_embedded() if origin in EMBEDDED_SCRIPT_ENVS else True
 
             agents_ok = True
             if origin == "cursor":
                 # Cursor起点の場合のみ、Claude側の agents（master_rules）を生成して揃える
-                if args.dry_run:
-                    print("\n🤖 [DRY-RUN] Cursor起点: .cursor/rules → .claude/agents 同期予定")
-                else:
+                with profile_phase("agents 生成"):
                     agents_ok = create_agents_from_mdc(preserve_content=preserve_content)
 
-            print(f"\n🧩 埋め込みスクリプト同期開始（scripts/ + commons_scripts/ → skills/*/scripts）")
-            embedded_ok = sync_embedded_skill_scripts(project_root, args.dry_run, envs=["claude", "cursor"])
+            # 差分同期: 前回の同期結果（マニフェスト）と比較し、変更のあったソースのみ再生成
+            with profile_phase("マニフェスト読み込み"):
+                manifest = None if args.full_refresh else load_sync_manifest(project_root)
+            if manifest is None:
+                # 全件再生成でも、次回の差分同期に備えて結果は記録する
+                manifest = {"version": SYNC_MANIFEST_VERSION, "sources": {}, "outputs": {}}
+            with profile_phase("skills/commands 同期"):
+                sync_skills_and_commands(
+                    project_root, origin, manifest=manifest, refresh_mode=refresh_mode, jobs=args.jobs,
+                    link_mode=args.link_mode,
+                )
+            with profile_phase("マニフェスト保存"):
+                save_sync_manifest(project_root, manifest)
+            sync_ok = True
+
+            if origin not in EMBEDDED_SCRIPT_ENVS:
+                embedded_ok = sync_embedded()
 
             return master_ok and sync_ok and agents_ok and embedded_ok
 
-        if args.source == 'claude':
+        # --since / --changed-only: git の変更から派生する出力だけを同期する（曖昧なら全件同期）
+        changed_sources = None
+        if changed_only:
+            with profile_phase("git 変更検出"):
+                changed_sources = detect_changed_sources(project_root, args.source, args.since)
+
+        if changed_sources is not None:
+            sources, manifest = changed_sources
+            if not sources:
+                print(f"\n✨ 同期が必要な変更はありません")
+                success = True
+            else:
+                print(f"\n⚡ 変更のあったソースのみ同期: {len(sources)} ファイル")
+                for path in sorted(sources)[:10]:
+                    print(f"  - {_manifest_key(project_root, path)}")
+                if len(sources) > 10:
+                    print(f"  ... 他 {len(sources) - 10} ファイル")
+                with profile_phase("変更分の同期"):
+                    success = apply_changed_sources(
+                        project_root, args.source, sources, manifest,
+                        preserve_content=preserve_content, refresh_mode=refresh_mode, jobs=args.jobs,
+                        link_mode=args.link_mode,
+                    )
+        elif args.source == 'claude':
             print(f"\n📥 Claude起点: .claude/commands, .claude/skills → .cursor/.codex")
             success = run_simple("claude")
         elif args.source == 'codex':
@@ -2782,12 +6810,62 @@ def main():
             success = run_simple("cursor")
 
         if success:
-            if args.dry_run:
+            if args.check:
+                print(f"\n🔎 期待する出力の計算が完了しました（書き込みなし）。")
+            elif args.dry_run:
                 print(f"\n🎉 変換処理の確認が完了しました（ドライラン）。")
+            elif planning:
+                print(f"\n🎉 同期計画の作成が完了しました（書き込みなし）。")
             else:
                 print(f"\n🎉 変換処理が正常に完了しました。")
-            print(f"\n🧹 空ディレクトリ掃除開始")
-            cleanup_empty_dirs_after_run(project_root, dry_run=args.dry_run)
+            # 変更分だけの同期では、ソースの削除が無ければ空ディレクトリは増えない（--check は空ディレクトリを見ない）
+            if not args.check and (
+                changed_sources is None or any(not os.path.lexists(p) for p in changed_sources[0])
+            ):
+                print(f"\n🧹 空ディレクトリ掃除開始")
+                with profile_phase("空ディレクトリ掃除"):
+                    cleanup_empty_dirs_after_run(project_root)
+            if planning:
+                plan = sync_plan_end()
+            fs_index_end()
+            drifted = []
+            if plan is not None and args.check:
+                print()
+                with profile_phase("同期チェック"):
+                    drifted = check_sync_plan(project_root, plan, jobs=args.jobs if args.jobs > 1 else None)
+                print_check_result(drifted)
+                if summary is not None:
+                    summary["drifted"] = [op["path"] for op in drifted]
+            elif plan is not None:
+                print()
+                print_sync_plan(plan, verbose=args.dry_run)
+                if args.plan:
+                    save_sync_plan(project_root / args.plan, plan)
+                    print(f"💾 同期計画を保存しました: {project_root / args.plan}")
+                if summary is not None:
+                    summary["plan"] = count_sync_plan(plan)
+            else:
+                counts = take_write_counts()
+                print_write_counts(counts)
+                if summary is not None:
+                    summary.update(counts)
+                if check_options is not None:
+                    with profile_phase("同期チェックの記録"):
+                        save_check_stamp(project_root, args.source, check_options, check_started_ns)
+            if args.profile:
+                write_profile_report(project_root / args.profile)
+            if drifted:
+                return 1
+            if args.watch:
+                watch_and_sync(
+                    project_root,
+                    args.source,
+                    preserve_content=preserve_content,
+                    refresh_mode=args.refresh_mode,
+                    jobs=args.jobs,
+                    interval=args.watch_interval,
+                    link_mode=args.link_mode,
+                )
         else:
             print(f"\n💥 変換処理中にエラーが発生しました。")
             return 1
@@ -2800,6 +6878,9 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        # 失敗・中断・途中の return でも計測フックを必ず外す（正常終了時は write_profile_report で外し済み）
+        disable_profiling()
 
     return 0
 